@@ -173,6 +173,43 @@ else:
         },
     }
 
+# Cache Django (partagé entre workers si Redis est disponible)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Durée de cache des statistiques du tableau de bord (secondes)
+STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 10))
+
+# Rapports PDF : au-delà de ce nombre de lignes produits, rendu en arrière-plan
+REPORT_PDF_ASYNC_ROWS = int(os.environ.get('REPORT_PDF_ASYNC_ROWS', 500))
+
+# Alertes de stock bas : délai de regroupement avant l'envoi de l'email (secondes)
+LOW_STOCK_DIGEST_DELAY = int(os.environ.get('LOW_STOCK_DIGEST_DELAY', 300))
+
+# Sauvegardes (core.backups) : complète tous les N jours, incrémentale sinon
+BACKUP_DIR = Path(os.environ.get('BACKUP_DIR', BASE_DIR / 'backups'))
+BACKUP_FULL_INTERVAL_DAYS = int(os.environ.get('BACKUP_FULL_INTERVAL_DAYS', 7))
+# Nombre de sauvegardes complètes conservées (avec leurs incrémentales)
+BACKUP_KEEP_FULL = int(os.environ.get('BACKUP_KEEP_FULL', 4))
+
+# Cache code-barres du scan POS (mémoire par processus + Redis si REDIS_URL)
+BARCODE_CACHE_SIZE = int(os.environ.get('BARCODE_CACHE_SIZE', 50000))
+BARCODE_CACHE_TTL = int(os.environ.get('BARCODE_CACHE_TTL', 300))  # secondes
+# Invalidations des autres workers : génération Redis relue toutes les N secondes ;
+# sans Redis, durée de vie des entrées en mémoire (secondes)
+BARCODE_CACHE_SYNC_INTERVAL = float(os.environ.get('BARCODE_CACHE_SYNC_INTERVAL', 1))
+BARCODE_CACHE_LOCAL_TTL = int(os.environ.get('BARCODE_CACHE_LOCAL_TTL', 5))
+
+# Autocomplétion du POS (index en mémoire) : relecture des produits modifiés
+# par les autres processus, et reconstruction complète (secondes)
+AUTOCOMPLETE_SYNC_INTERVAL = float(os.environ.get('AUTOCOMPLETE_SYNC_INTERVAL', 5))
+AUTOCOMPLETE_REBUILD_INTERVAL = float(os.environ.get('AUTOCOMPLETE_REBUILD_INTERVAL', 3600))
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL)
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', REDIS_URL)
@@ -240,5 +277,17 @@ SPECTACULAR_SETTINGS = {
 # For cloud server: set IS_CLOUD_SERVER=True
 CLOUD_API_URL = os.environ.get('CLOUD_API_URL', '')  # e.g., 'https://librairie-api.onrender.com/api'
 SYNC_TOKEN = os.environ.get('SYNC_TOKEN', '')  # Shared secret for sync authentication
+SYNC_CHUNK_SIZE = int(os.environ.get('SYNC_CHUNK_SIZE', 200))  # Enregistrements par lot envoyé
+STORE_CODE = os.environ.get('STORE_CODE', 'main')  # Identifiant du magasin local (clé d'idempotence côté cloud)
 IS_CLOUD_SERVER = os.environ.get('IS_CLOUD_SERVER', 'False') == 'True'
+# Format des envois : 'msgpack' (colonnes, repli JSON si indisponible) ou 'json'
+SYNC_WIRE_FORMAT = os.environ.get('SYNC_WIRE_FORMAT', 'msgpack')
+# Compression des envois : 'zstd' (paquet zstandard requis), 'gzip' ou 'identity'
+SYNC_WIRE_ENCODING = os.environ.get('SYNC_WIRE_ENCODING', 'gzip')
+# Démon de synchronisation (manage.py run_sync_daemon), en secondes
+SYNC_DAEMON_POLL_INTERVAL = float(os.environ.get('SYNC_DAEMON_POLL_INTERVAL', 2))
+SYNC_DAEMON_PULL_INTERVAL = float(os.environ.get('SYNC_DAEMON_PULL_INTERVAL', 300))
+SYNC_DAEMON_MAX_BACKOFF = float(os.environ.get('SYNC_DAEMON_MAX_BACKOFF', 300))
+# Retard de réplication (secondes) au-delà duquel /sync/metrics/ signale une alerte
+SYNC_LAG_ALERT_SECONDS = float(os.environ.get('SYNC_LAG_ALERT_SECONDS', 600))
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, AppSettings
+from .models import User, AppSettings, Store
 
 
 @admin.register(User)
@@ -33,3 +33,11 @@ class AppSettingsAdmin(admin.ModelAdmin):
     
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(Store)
+class StoreAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'active', 'created_at')
+    list_filter = ('active',)
+    search_fields = ('code', 'name')
+    readonly_fields = ('sync_token', 'created_at')
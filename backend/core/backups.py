@@ -0,0 +1,281 @@
+"""
+Sauvegardes de la base de données (tâche quotidienne et commande
+`restore_backup`).
+
+Chaque sauvegarde est un dossier de BACKUP_DIR contenant un fichier JSON
+Lines compressé (gzip) par table et un manifest.json. Les lignes sont lues
+par blocs (`.iterator(chunk_size=...)`) et écrites au fil de l'eau : la
+mémoire utilisée ne dépend pas de l'historique.
+
+- full : toutes les lignes (au plus tous les BACKUP_FULL_INTERVAL_DAYS
+  jours) ; sous SQLite, une copie de la base par l'API de sauvegarde en
+  ligne (database.sqlite3.gz) y est jointe ;
+- incremental : les lignes créées (clé primaire) ou modifiées
+  (updated_at) depuis la sauvegarde précédente, d'après les marques
+  enregistrées dans son manifest.
+
+Les suppressions ne sont pas suivies : elles sont prises en compte à la
+sauvegarde complète suivante. Une restauration charge la dernière
+sauvegarde complète puis ses incrémentales, dans l'ordre (les versions
+les plus récentes remplacent les précédentes).
+"""
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+CHUNK_SIZE = 2000
+
+FULL = 'full'
+INCREMENTAL = 'incremental'
+
+MANIFEST = 'manifest.json'
+SQLITE_COPY = 'database.sqlite3.gz'
+
+# (fichier, modèle, suivi) dans l'ordre de restauration (clés étrangères) :
+# - updated : lignes nouvelles ou modifiées (updated_at) ;
+# - append : lignes jamais modifiées, seules les nouvelles clés primaires ;
+# - full : table courte, toujours sauvegardée entièrement.
+TABLES = (
+    ('users', 'core.User', 'full'),
+    ('categories', 'inventory.Category', 'updated'),
+    ('suppliers', 'inventory.Supplier', 'updated'),
+    ('products', 'inventory.Product', 'updated'),
+    ('sales', 'sales.Sale', 'updated'),
+    ('sale_items', 'sales.SaleItem', 'append'),
+)
+
+
+def backup_dir():
+    return Path(getattr(settings, 'BACKUP_DIR', settings.BASE_DIR / 'backups'))
+
+
+# ---- Inventaire des sauvegardes ----
+
+def list_backups(root=None):
+    """Manifests des sauvegardes terminées, de la plus ancienne à la plus récente."""
+    root = Path(root or backup_dir())
+    if not root.is_dir():
+        return []
+    manifests = []
+    for path in sorted(root.iterdir()):
+        manifest = path / MANIFEST
+        if manifest.is_file():
+            with open(manifest, encoding='utf-8') as f:
+                manifests.append({**json.load(f), 'path': path})
+    return manifests
+
+
+def restore_chain(backup_id=None, root=None):
+    """Sauvegarde complète et incrémentales à charger pour restaurer `backup_id` (la dernière par défaut)."""
+    backups = list_backups(root)
+    if backup_id is not None:
+        ids = [b['id'] for b in backups]
+        if backup_id not in ids:
+            raise LookupError(backup_id)
+        backups = backups[:ids.index(backup_id) + 1]
+    chain = []
+    for backup in reversed(backups):
+        chain.insert(0, backup)
+        if backup['kind'] == FULL:
+            return chain
+    raise LookupError('No full backup')
+
+
+# ---- Sauvegarde ----
+
+def _model(label):
+    return apps.get_model(label)
+
+
+def _has_updated_at(model):
+    return any(f.name == 'updated_at' for f in model._meta.concrete_fields)
+
+
+def _marks(model):
+    """Marques hautes de la table au début de la sauvegarde."""
+    return {'pk': model.objects.aggregate(m=Max('pk'))['m'] or 0}
+
+
+def _changed_rows(model, mode, previous):
+    queryset = model._default_manager.order_by('pk')
+    if previous is None or mode == 'full':
+        return queryset
+    since = Q(pk__gt=previous['pk'])
+    if mode == 'updated' and previous.get('updated_at'):
+        since |= Q(updated_at__gte=parse_datetime(previous['updated_at']))
+    return queryset.filter(since)
+
+
+def _write_rows(path, queryset):
+    """Écrit les lignes en JSON Lines compressé ; retourne leur nombre."""
+    count = 0
+
+    def rows():
+        nonlocal count
+        for obj in queryset.iterator(chunk_size=CHUNK_SIZE):
+            count += 1
+            yield obj
+
+    serializer = serializers.get_serializer('jsonl')()
+    with gzip.open(path, 'wt', encoding='utf-8') as stream:
+        serializer.serialize(rows(), stream=stream)
+    return count
+
+
+def _copy_sqlite(path):
+    """Copie cohérente de la base SQLite (API de sauvegarde en ligne), compressée."""
+    connection.ensure_connection()
+    with tempfile.NamedTemporaryFile(suffix='.sqlite3') as tmp:
+        target = sqlite3.connect(tmp.name)
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
+        with open(tmp.name, 'rb') as src, gzip.open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _due_full(previous, now):
+    interval = timedelta(days=getattr(settings, 'BACKUP_FULL_INTERVAL_DAYS', 7))
+    last_full = next((b for b in reversed(previous) if b['kind'] == FULL), None)
+    return last_full is None or now - parse_datetime(last_full['created_at']) >= interval
+
+
+def run_backup(kind=None, root=None):
+    """
+    Crée une sauvegarde (complète si `kind` vaut FULL ou si elle est due,
+    incrémentale sinon) puis applique la rétention. Retourne le manifest.
+    """
+    root = Path(root or backup_dir())
+    root.mkdir(parents=True, exist_ok=True)
+    now = timezone.now()
+    previous = list_backups(root)
+    if kind is None:
+        kind = FULL if _due_full(previous, now) else INCREMENTAL
+    base = previous[-1] if kind == INCREMENTAL and previous else None
+    if base is None:
+        kind = FULL
+
+    backup_id = f"{timezone.localtime(now).strftime('%Y%m%d-%H%M%S')}-{kind}"
+    # Écrit dans un dossier temporaire : une sauvegarde interrompue n'est jamais listée
+    work = Path(tempfile.mkdtemp(prefix=f'.{backup_id}-', dir=root))
+    try:
+        tables = {}
+        for name, label, mode in TABLES:
+            model = _model(label)
+            marks = _marks(model)
+            if _has_updated_at(model):
+                marks['updated_at'] = now.isoformat()
+            since = base['tables'][name]['marks'] if base and name in base['tables'] else None
+            filename = f'{name}.jsonl.gz'
+            rows = _write_rows(work / filename, _changed_rows(model, mode, since))
+            tables[name] = {'model': label, 'file': filename, 'rows': rows, 'marks': marks}
+
+        manifest = {
+            'id': backup_id,
+            'kind': kind,
+            'created_at': now.isoformat(),
+            'base': base['id'] if base else None,
+            'tables': tables,
+        }
+        if kind == FULL and connection.vendor == 'sqlite':
+            _copy_sqlite(work / SQLITE_COPY)
+            manifest['sqlite'] = SQLITE_COPY
+        with open(work / MANIFEST, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(work, root / backup_id)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+
+    apply_retention(root)
+    return {**manifest, 'path': root / backup_id}
+
+
+def apply_retention(root=None, keep_full=None):
+    """Garde les `keep_full` dernières sauvegardes complètes et leurs incrémentales."""
+    if keep_full is None:
+        keep_full = getattr(settings, 'BACKUP_KEEP_FULL', 4)
+    backups = list_backups(root)
+    fulls = [i for i, b in enumerate(backups) if b['kind'] == FULL]
+    if len(fulls) <= keep_full:
+        return []
+    first_kept = fulls[-keep_full] if keep_full else len(backups)
+    removed = []
+    for backup in backups[:first_kept]:
+        shutil.rmtree(backup['path'], ignore_errors=True)
+        removed.append(backup['id'])
+    return removed
+
+
+# ---- Restauration ----
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def _saved_timestamps(model):
+    """Conserve les dates sauvegardées (auto_now / auto_now_add désactivés pendant le chargement)."""
+    fields = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    flags = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in flags:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def _load_table(path, model, batch_size):
+    update_fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+    count = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as stream, _saved_timestamps(model):
+        for batch in _batches(serializers.deserialize('jsonl', stream), batch_size):
+            objects = [item.object for item in batch]
+            if hasattr(model, 'build_search_key'):
+                # Sauvegardes antérieures à la clé de recherche
+                for obj in objects:
+                    obj.search_key = obj.build_search_key()
+            model._default_manager.bulk_create(
+                objects,
+                update_conflicts=True,
+                unique_fields=[model._meta.pk.name],
+                update_fields=update_fields,
+            )
+            for item in batch:
+                for field, values in (item.m2m_data or {}).items():
+                    getattr(item.object, field).set(values)
+            count += len(batch)
+    return count
+
+
+def restore(backup_id=None, root=None, batch_size=1000):
+    """Recharge la chaîne de sauvegardes jusqu'à `backup_id` ; retourne {table: lignes}."""
+    chain = restore_chain(backup_id, root)
+    counts = {name: 0 for name, _, _ in TABLES}
+    with transaction.atomic():
+        for backup in chain:
+            for name, label, _ in TABLES:
+                table = backup['tables'].get(name)
+                if table:
+                    counts[name] += _load_table(backup['path'] / table['file'], _model(label), batch_size)
+    return counts
@@ -22,3 +22,31 @@ class StockConsumer(AsyncWebsocketConsumer):
             'type': 'stock_update',
             'message': message
         }))
+
+    async def low_stock_alert(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'low_stock_alert',
+            'message': event['message']
+        }))
+
+
+class ImportJobConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.group_name = 'import_jobs'
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+
+    async def import_progress(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'import_progress',
+            'message': event['message']
+        }))
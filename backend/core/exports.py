@@ -0,0 +1,291 @@
+"""
+Export de la base de données (sauvegarde) en flux continu.
+
+Chaque feuille est décrite par un générateur de lignes parcourant la base
+avec `.iterator(chunk_size=...)` : la mémoire utilisée ne dépend pas du
+nombre de ventes exportées.
+
+Deux formats, tous deux des archives ZIP produites et envoyées pendant la
+génération (le téléchargement commence immédiatement) :
+- xlsx : classeur SpreadsheetML écrit directement, une feuille par entrée
+  de l'archive, chaînes en ligne (inlineStr) pour ne rien garder en
+  mémoire ;
+- zip  : un CSV par feuille.
+
+L'index central d'une archive ZIP est écrit à la fin : chaque entrée est
+suivie d'un descripteur de données, ce qui permet l'écriture sans retour
+en arrière (voir _StreamBuffer).
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+User = get_user_model()
+
+
+def _yes_no(value):
+    return 'Oui' if value else 'Non'
+
+
+def _local(dt):
+    return timezone.localtime(dt).strftime('%Y-%m-%d %H:%M') if dt else ''
+
+
+def product_rows():
+    from inventory.models import Product
+    products = Product.objects.order_by('pk').values_list(
+        'id', 'name', 'barcode', 'category__name', 'supplier__name',
+        'purchase_price', 'sale_price_ht', 'tva', 'stock', 'min_stock', 'active'
+    )
+    for pk, name, barcode, category, supplier, purchase, sale, tva, stock, min_stock, active in \
+            products.iterator(chunk_size=CHUNK_SIZE):
+        yield [pk, name, barcode, category or '', supplier or '', float(purchase),
+               float(sale), float(tva), stock, min_stock, _yes_no(active)]
+
+
+def category_rows():
+    from inventory.models import Category
+    for row in Category.objects.order_by('pk').values_list('id', 'name', 'description').iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        yield list(row)
+
+
+def supplier_rows():
+    from inventory.models import Supplier
+    for row in Supplier.objects.order_by('pk').values_list(
+        'id', 'name', 'contact_name', 'email', 'phone', 'address', 'notes'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        yield list(row)
+
+
+def sale_rows():
+    """Une ligne par article vendu, toutes les ventes (plus de limite)."""
+    from sales.models import SaleItem
+    items = SaleItem.objects.order_by('-sale__created_at', 'sale_id', 'pk').values_list(
+        'sale_id', 'sale__created_at', 'sale__total_ttc', 'sale__payment_method',
+        'sale__user__username', 'product_name', 'quantity', 'unit_price_ht', 'total_price_ht'
+    )
+    for sale_id, created_at, total, payment, cashier, name, quantity, unit_price, line_total in \
+            items.iterator(chunk_size=CHUNK_SIZE):
+        yield [sale_id, _local(created_at), float(total), payment, cashier or '',
+               name or 'Produit supprimé', quantity, float(unit_price), float(line_total)]
+
+
+def user_rows():
+    for user in User.objects.order_by('pk').iterator(chunk_size=CHUNK_SIZE):
+        yield [user.id, user.username, user.email, user.first_name, user.last_name, user.role,
+               user.phone, _yes_no(user.is_active), _yes_no(user.can_view_stock),
+               _yes_no(user.can_manage_stock)]
+
+
+def settings_rows():
+    from .models import AppSettings
+    settings = AppSettings.get_settings()
+    return [
+        ['Nom de la boutique', settings.store_name],
+        ['Adresse', settings.store_address],
+        ['Téléphone', settings.store_phone],
+        ['Email', settings.store_email],
+        ['Devise', settings.currency],
+        ['Symbole devise', settings.currency_symbol],
+        ['TVA par défaut', f"{settings.default_tva}%"],
+        ['Date export', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+    ]
+
+
+# (paramètre, titre de la feuille, en-têtes, générateur de lignes)
+SHEETS = [
+    ('products', 'Produits',
+     ['ID', 'Nom', 'Code-barres', 'Catégorie', 'Fournisseur', 'Prix Achat', 'Prix Vente', 'TVA %', 'Stock', 'Seuil', 'Actif'],
+     product_rows),
+    ('categories', 'Catégories', ['ID', 'Nom', 'Description'], category_rows),
+    ('suppliers', 'Fournisseurs', ['ID', 'Nom', 'Contact', 'Email', 'Téléphone', 'Adresse', 'Notes'], supplier_rows),
+    ('sales', 'Ventes',
+     ['ID Vente', 'Date', 'Total', 'Mode Paiement', 'Caissier', 'Produit', 'Quantité', 'Prix Unit.', 'Sous-total'],
+     sale_rows),
+    ('users', 'Utilisateurs',
+     ['ID', 'Nom utilisateur', 'Email', 'Prénom', 'Nom', 'Rôle', 'Téléphone', 'Actif', 'Voir Stock', 'Gérer Stock'],
+     user_rows),
+    ('settings', 'Paramètres', ['Paramètre', 'Valeur'], settings_rows),
+]
+
+
+def select_sheets(selected):
+    """Feuilles à exporter ; `selected` est l'ensemble des paramètres retenus."""
+    return [sheet for sheet in SHEETS if sheet[0] in selected]
+
+
+class _StreamBuffer:
+    """Tampon non positionnable : zipfile y écrit, le générateur le vide."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# ---- xlsx ----
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Styles : 0 = défaut, 1 = en-tête (gras blanc sur fond indigo, bordure fine)
+_STYLES = (
+    _XML + f'<styleSheet xmlns="{_NS_MAIN}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font></fonts>'
+    '<fills count="3"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF4F46E5"/><bgColor rgb="FF4F46E5"/></patternFill></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf></cellXfs>'
+    '</styleSheet>'
+)
+
+# Caractères interdits en XML 1.0 (openpyxl les refuse également)
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xml_text(value):
+    return escape(_ILLEGAL_XML.sub('', str(value)))
+
+
+def _cell(value, style=0):
+    if value is None or value == '':
+        return '<c/>'  # cellules sans référence : la position suit l'ordre
+    attr = f' s="{style}"' if style else ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c{attr}><v>{value}</v></c>'
+    return f'<c t="inlineStr"{attr}><is><t xml:space="preserve">{_xml_text(value)}</t></is></c>'
+
+
+def _sheet_rows(headers, rows):
+    """Fragments XML d'une feuille, produits au fil des lignes."""
+    cols = ''.join(
+        f'<col min="{col}" max="{col}" width="{max(15, len(header) + 5)}" customWidth="1"/>'
+        for col, header in enumerate(headers, 1)
+    )
+    yield (
+        _XML + f'<worksheet xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}">'
+        f'<cols>{cols}</cols><sheetData>'
+        '<row r="1">' + ''.join(_cell(h, style=1) for h in headers) + '</row>'
+    )
+    for number, row in enumerate(rows, 2):
+        yield f'<row r="{number}">' + ''.join(_cell(v) for v in row) + '</row>'
+    yield '</sheetData></worksheet>'
+
+
+def _workbook_parts(titles):
+    """Fichiers fixes du classeur : types, relations, liste des feuilles."""
+    count = len(titles)
+    overrides = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for n in range(1, count + 1)
+    )
+    sheets = ''.join(
+        f'<sheet name="{_xml_text(title[:31])}" sheetId="{n}" r:id="rId{n}"/>'
+        for n, title in enumerate(titles, 1)
+    )
+    sheet_rels = ''.join(
+        f'<Relationship Id="rId{n}" Type="{_NS_REL}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+        for n in range(1, count + 1)
+    )
+    return {
+        '[Content_Types].xml': (
+            _XML + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{overrides}</Types>'
+        ),
+        '_rels/.rels': (
+            _XML + f'<Relationships xmlns="{_NS_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{_NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/workbook.xml': (
+            _XML + f'<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><sheets>{sheets}</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            _XML + f'<Relationships xmlns="{_NS_PKG_REL}">{sheet_rels}'
+            f'<Relationship Id="rId{count + 1}" Type="{_NS_REL}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ),
+        'xl/styles.xml': _STYLES,
+    }
+
+
+def stream_xlsx(sheets):
+    """Classeur xlsx produit et envoyé au fil de l'eau, feuille après feuille."""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _workbook_parts([title for _, title, _, _ in sheets]).items():
+            archive.writestr(name, content)
+        yield buffer.pop()
+        for number, (_, _, headers, rows) in enumerate(sheets, 1):
+            with archive.open(f'xl/worksheets/sheet{number}.xml', 'w') as entry:
+                pending = []
+                for count, fragment in enumerate(_sheet_rows(headers, rows()), 1):
+                    pending.append(fragment)
+                    if count % CHUNK_SIZE == 0:
+                        entry.write(''.join(pending).encode('utf-8'))
+                        pending = []
+                        yield buffer.pop()
+                entry.write(''.join(pending).encode('utf-8'))
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+# ---- CSV ----
+
+def stream_csv_zip(sheets):
+    """Archive ZIP d'un CSV par feuille, produite et envoyée au fil de l'eau."""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for _, title, headers, rows in sheets:
+            with archive.open(f'{title}.csv', 'w') as entry:
+                text = io.StringIO()
+                writer = csv.writer(text, delimiter=';')
+                text.write('\ufeff')  # BOM pour l'ouverture dans Excel
+                writer.writerow(headers)
+                for count, row in enumerate(rows(), 1):
+                    writer.writerow(row)
+                    if count % CHUNK_SIZE == 0:
+                        entry.write(text.getvalue().encode('utf-8'))
+                        text.seek(0)
+                        text.truncate()
+                        yield buffer.pop()
+                entry.write(text.getvalue().encode('utf-8'))
+            yield buffer.pop()
+    yield buffer.pop()
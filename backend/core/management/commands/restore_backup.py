@@ -0,0 +1,40 @@
+"""
+Restauration d'une sauvegarde (voir core.backups).
+
+Usage :
+    python manage.py restore_backup --list
+    python manage.py restore_backup                      # dernière sauvegarde
+    python manage.py restore_backup 20260301-180000-incremental
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core import backups
+
+
+class Command(BaseCommand):
+    help = "Recharge une sauvegarde complète et ses incrémentales"
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup_id', nargs='?', help="Sauvegarde à restaurer (dernière par défaut)")
+        parser.add_argument('--dir', help="Dossier des sauvegardes (BACKUP_DIR par défaut)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Lignes insérées par requête")
+        parser.add_argument('--list', action='store_true', help="Liste les sauvegardes disponibles")
+
+    def handle(self, *args, **options):
+        root = options['dir']
+        if options['list']:
+            for backup in backups.list_backups(root):
+                rows = sum(table['rows'] for table in backup['tables'].values())
+                self.stdout.write(f"{backup['id']}  {rows} lignes")
+            return
+
+        try:
+            chain = backups.restore_chain(options['backup_id'], root)
+        except LookupError as e:
+            raise CommandError(f"Sauvegarde introuvable : {e}")
+
+        self.stdout.write(f"Restauration de {' → '.join(b['id'] for b in chain)}")
+        counts = backups.restore(options['backup_id'], root, batch_size=options['batch_size'])
+        for name, count in counts.items():
+            self.stdout.write(f"  {name} : {count} lignes")
+        self.stdout.write(self.style.SUCCESS("Restauration terminée"))
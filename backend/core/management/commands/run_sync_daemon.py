@@ -0,0 +1,50 @@
+"""
+Démon de synchronisation vers le cloud (remplace la tâche cron / planifiée).
+
+Usage :
+    python manage.py run_sync_daemon
+    python manage.py run_sync_daemon --poll 5 --pull 600
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sync_daemon import SyncDaemon
+from core.sync_service import SyncService
+
+
+class Command(BaseCommand):
+    help = "Synchronise en continu les changements locaux vers le cloud"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll', type=float, default=settings.SYNC_DAEMON_POLL_INTERVAL,
+            help="Intervalle de consultation de l'outbox, en secondes"
+        )
+        parser.add_argument(
+            '--pull', type=float, default=settings.SYNC_DAEMON_PULL_INTERVAL,
+            help="Intervalle de récupération des données de référence, en secondes"
+        )
+        parser.add_argument(
+            '--max-backoff', type=float, default=settings.SYNC_DAEMON_MAX_BACKOFF,
+            help="Attente maximale entre deux tentatives quand le cloud est injoignable"
+        )
+
+    def handle(self, *args, **options):
+        service = SyncService()
+        if not service.cloud_url or not service.sync_token:
+            raise CommandError("Synchronisation non configurée (CLOUD_API_URL / SYNC_TOKEN)")
+
+        daemon = SyncDaemon(
+            service,
+            poll_interval=options['poll'],
+            pull_interval=options['pull'],
+            max_backoff=options['max_backoff'],
+        )
+        signal.signal(signal.SIGTERM, daemon.stop)
+        signal.signal(signal.SIGINT, daemon.stop)
+
+        self.stdout.write(f"Synchronisation vers {service.cloud_url} (Ctrl+C pour arrêter)")
+        daemon.run()
+        self.stdout.write(self.style.SUCCESS("Démon de synchronisation arrêté"))
@@ -0,0 +1,192 @@
+"""
+Synchronisation incrémentale des données de référence (CLOUD → LOCAL).
+
+Côté cloud, chaque entité (catégories, fournisseurs, produits) est servie
+par pages ordonnées sur (updated_at, id) à partir d'un curseur
+`updated_since` / `after_id` ; chaque ligne porte une empreinte (digest)
+de son contenu.
+
+Côté local, les empreintes reçues sont comparées à celles des lignes
+existantes (une requête par page) : seules les lignes réellement modifiées
+sont écrites, en une seule opération groupée.
+"""
+import hashlib
+import json
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.lookups import LessThanOrEqual
+
+from inventory.models import Category, Supplier, Product
+from .normalize import search_key
+
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+# key : champ identifiant la ligne d'un serveur à l'autre
+# fields : champs transmis (les relations sont transmises par leur nom)
+# untracked : champs transmis mais exclus de l'empreinte
+Entity = namedtuple('Entity', 'model key fields untracked')
+
+ENTITIES = {
+    'categories': Entity(Category, 'name', ('name', 'description', 'icon', 'color'), ()),
+    'suppliers': Entity(
+        Supplier, 'name',
+        ('name', 'contact_name', 'email', 'phone', 'address', 'notes', 'active'), ()
+    ),
+    # Le stock est l'autorité du serveur local : utilisé uniquement à la création
+    'products': Entity(
+        Product, 'barcode',
+        ('barcode', 'name', 'description', 'category__name', 'supplier__name',
+         'purchase_price', 'sale_price_ht', 'tva', 'min_stock', 'active', 'stock'),
+        ('stock',)
+    ),
+}
+
+# Ordre d'application : les produits référencent catégories et fournisseurs
+ENTITY_ORDER = ('categories', 'suppliers', 'products')
+
+
+def _row(entity, values):
+    """Ligne transmise : relations renommées (category__name → category_name)."""
+    row = {}
+    for field in entity.fields:
+        value = values[field]
+        if isinstance(value, Decimal):
+            value = format(value, 'f')
+        row[field.replace('__', '_')] = value
+    return row
+
+
+def row_digest(entity, row):
+    """Empreinte du contenu d'une ligne (indépendante de l'ordre des champs)."""
+    tracked = {
+        name: value for name, value in row.items()
+        if name != 'digest' and name not in entity.untracked
+    }
+    encoded = json.dumps(tracked, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def iter_page(name, updated_since=None, after_id=0, limit=PAGE_SIZE):
+    """
+    Lignes modifiées après le curseur (updated_at, id), dans cet ordre,
+    avec leur empreinte et leur position (`updated_at`, `id`).
+    """
+    entity = ENTITIES[name]
+    queryset = entity.model.objects.order_by('updated_at', 'pk')
+    if updated_since is not None:
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_since) | Q(updated_at=updated_since, pk__gt=after_id)
+        )
+    values = queryset.values('pk', 'updated_at', *entity.fields)[:limit]
+    for record in values.iterator(chunk_size=PAGE_SIZE):
+        row = _row(entity, record)
+        row['digest'] = row_digest(entity, row)
+        yield record['pk'], record['updated_at'], row
+
+
+def local_digests(name, keys):
+    """{clé: (pk, empreinte)} des lignes locales correspondantes (une requête)."""
+    entity = ENTITIES[name]
+    found = {}
+    for record in entity.model.objects.filter(
+        **{f'{entity.key}__in': list(keys)}
+    ).order_by('-pk').values('pk', *entity.fields):
+        row = _row(entity, record)
+        # En cas de doublon de nom, la ligne la plus ancienne l'emporte
+        found[record[entity.key]] = (record['pk'], row_digest(entity, row))
+    return found
+
+
+def changed_rows(name, rows):
+    """Lignes reçues absentes ou différentes localement, avec le pk local éventuel."""
+    entity = ENTITIES[name]
+    existing = local_digests(name, (row[entity.key] for row in rows))
+    changed = []
+    for row in rows:
+        pk, digest = existing.get(row[entity.key], (None, None))
+        if digest != row['digest']:
+            changed.append((pk, row))
+    return changed
+
+
+def apply_rows(name, rows):
+    """Applique une page reçue du cloud ; retourne le nombre de lignes écrites."""
+    changed = changed_rows(name, rows)
+    if not changed:
+        return 0
+
+    with transaction.atomic():
+        if name == 'products':
+            _upsert_products([row for _, row in changed])
+        else:
+            _apply_named(ENTITIES[name], changed)
+    return len(changed)
+
+
+def _apply_named(entity, changed):
+    """Catégories / fournisseurs : le nom n'est pas unique, pas d'UPSERT SQL."""
+    fields = [field for field in entity.fields if field != entity.key]
+    new, updated = [], []
+    for pk, row in changed:
+        obj = entity.model(pk=pk, **{field: row[field] for field in entity.fields})
+        obj.search_key = obj.build_search_key()
+        (updated if pk else new).append(obj)
+    if new:
+        entity.model.objects.bulk_create(new, batch_size=500)
+    if updated:
+        entity.model.objects.bulk_update(updated, [*fields, 'search_key'], batch_size=500)
+
+
+def _upsert_products(rows):
+    """Un seul INSERT ... ON CONFLICT (barcode) DO UPDATE ; le stock local est conservé."""
+    categories = dict(Category.objects.filter(
+        name__in={row['category_name'] for row in rows} - {None}
+    ).order_by('-pk').values_list('name', 'pk'))
+    suppliers = dict(Supplier.objects.filter(
+        name__in={row['supplier_name'] for row in rows} - {None}
+    ).order_by('-pk').values_list('name', 'pk'))
+
+    products = [
+        Product(
+            barcode=row['barcode'],
+            name=row['name'],
+            description=row['description'],
+            category_id=categories.get(row['category_name']),
+            supplier_id=suppliers.get(row['supplier_name']),
+            purchase_price=Decimal(row['purchase_price']),
+            sale_price_ht=Decimal(row['sale_price_ht']),
+            tva=Decimal(row['tva']),
+            min_stock=row['min_stock'],
+            active=row['active'],
+            stock=row['stock'],
+            is_low_stock=row['stock'] <= row['min_stock'],
+            search_key=search_key(row['name'], row['description']),
+        )
+        for row in rows
+    ]
+    Product.objects.bulk_create(
+        products,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['barcode'],
+        update_fields=[
+            'name', 'description', 'search_key', 'category', 'supplier', 'purchase_price',
+            'sale_price_ht', 'tva', 'min_stock', 'active', 'updated_at'
+        ],
+    )
+
+    # bulk_create ne déclenche pas post_save : invalider le cache de scan
+    barcodes = [row['barcode'] for row in rows]
+    
+    # Seuil éventuellement modifié, stock local conservé : recalculer le drapeau
+    low = LessThanOrEqual(F('stock'), F('min_stock'))
+    Product.objects.filter(barcode__in=barcodes).exclude(is_low_stock=low).update(is_low_stock=low)
+
+    def invalidate_cache():
+        from inventory.barcode_cache import barcode_cache
+        barcode_cache.invalidate_many((None, barcode) for barcode in barcodes)
+    transaction.on_commit(invalidate_cache)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_synclog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(max_length=30, unique=True, verbose_name='Stream')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Last ID')),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='Last Timestamp')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Sync Cursor',
+                'verbose_name_plural': 'Sync Cursors',
+            },
+        ),
+    ]
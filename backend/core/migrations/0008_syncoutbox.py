@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_synccursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncOutbox',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('stream', models.CharField(choices=[('sales', 'Sales'), ('returns', 'Returns'), ('stock_updates', 'Stock Updates')], max_length=30, verbose_name='Stream')),
+                ('object_id', models.BigIntegerField(verbose_name='Object ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Sync Outbox Entry',
+                'verbose_name_plural': 'Sync Outbox',
+                'ordering': ['seq'],
+            },
+        ),
+    ]
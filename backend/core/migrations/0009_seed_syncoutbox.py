@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def seed_outbox(apps, schema_editor):
+    """
+    Reprend dans l'outbox ce que l'ancien mécanisme aurait encore envoyé :
+    ventes et retours non synchronisés, produits modifiés depuis le dernier
+    curseur de stock (tous les produits si aucun envoi n'a eu lieu).
+    """
+    if getattr(settings, 'IS_CLOUD_SERVER', False):
+        return
+
+    SyncOutbox = apps.get_model('core', 'SyncOutbox')
+    SyncCursor = apps.get_model('core', 'SyncCursor')
+    Sale = apps.get_model('sales', 'Sale')
+    Return = apps.get_model('sales', 'Return')
+    Product = apps.get_model('inventory', 'Product')
+
+    products = Product.objects.all()
+    stock_cursor = SyncCursor.objects.filter(stream='stock_updates').first()
+    if stock_cursor and stock_cursor.last_timestamp:
+        products = products.filter(updated_at__gt=stock_cursor.last_timestamp)
+
+    # Ventes avant retours avant stock : l'ordre des seq est l'ordre d'envoi
+    sources = [
+        ('sales', Sale.objects.filter(synced=False)),
+        ('returns', Return.objects.filter(synced=False)),
+        ('stock_updates', products),
+    ]
+    for stream, queryset in sources:
+        batch = []
+        for pk in queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=BATCH_SIZE):
+            batch.append(SyncOutbox(stream=stream, object_id=pk))
+            if len(batch) >= BATCH_SIZE:
+                SyncOutbox.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            SyncOutbox.objects.bulk_create(batch)
+
+    # Les curseurs par flux sont remplacés par l'outbox
+    SyncCursor.objects.filter(stream__in=['sales', 'returns', 'stock_updates']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_syncoutbox'),
+        ('sales', '0007_sale_return_source_local_id'),
+        ('inventory', '0007_importjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_outbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_seed_syncoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Store',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(unique=True, verbose_name='Code')),
+                ('name', models.CharField(max_length=200, verbose_name='Name')),
+                ('sync_token', models.CharField(blank=True, max_length=64, unique=True, verbose_name='Sync Token')),
+                ('active', models.BooleanField(default=True, verbose_name='Active')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Store',
+                'verbose_name_plural': 'Stores',
+                'ordering': ['code'],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synclog',
+            name='bytes_received',
+            field=models.BigIntegerField(default=0, verbose_name='Bytes Received'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='bytes_sent',
+            field=models.BigIntegerField(default=0, verbose_name='Bytes Sent'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='collect_ms',
+            field=models.FloatField(default=0, verbose_name='Collect (ms)'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='compress_ms',
+            field=models.FloatField(default=0, verbose_name='Compress (ms)'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='duration_ms',
+            field=models.FloatField(default=0, verbose_name='Duration (ms)'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='ingest_ms',
+            field=models.FloatField(default=0, verbose_name='Ingest (ms)'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='lag_seconds',
+            field=models.FloatField(default=0, verbose_name='Lag (s)'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='rows_per_second',
+            field=models.FloatField(default=0, verbose_name='Rows per Second'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='serialize_ms',
+            field=models.FloatField(default=0, verbose_name='Serialize (ms)'),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='transfer_ms',
+            field=models.FloatField(default=0, verbose_name='Transfer (ms)'),
+        ),
+        migrations.AddIndex(
+            model_name='synclog',
+            index=models.Index(fields=['sync_type', 'created_at'], name='core_synclo_sync_ty_66d3ac_idx'),
+        ),
+    ]
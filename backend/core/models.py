@@ -1,3 +1,5 @@
+import secrets
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
@@ -195,13 +197,99 @@ class SyncLog(models.Model):
     success = models.BooleanField(_('Success'), default=True)
     error_message = models.TextField(_('Error Message'), blank=True)
     details = models.JSONField(_('Details'), default=dict, blank=True)
+    # Mesures de l'exécution (millisecondes) : où passe le temps d'une synchronisation
+    duration_ms = models.FloatField(_('Duration (ms)'), default=0)
+    collect_ms = models.FloatField(_('Collect (ms)'), default=0)
+    serialize_ms = models.FloatField(_('Serialize (ms)'), default=0)
+    compress_ms = models.FloatField(_('Compress (ms)'), default=0)
+    transfer_ms = models.FloatField(_('Transfer (ms)'), default=0)
+    ingest_ms = models.FloatField(_('Ingest (ms)'), default=0)
+    bytes_sent = models.BigIntegerField(_('Bytes Sent'), default=0)
+    bytes_received = models.BigIntegerField(_('Bytes Received'), default=0)
+    rows_per_second = models.FloatField(_('Rows per Second'), default=0)
+    # Âge du plus ancien changement en attente au début de l'envoi
+    lag_seconds = models.FloatField(_('Lag (s)'), default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name = _('Sync Log')
         verbose_name_plural = _('Sync Logs')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['sync_type', 'created_at']),
+        ]
     
     def __str__(self):
         return f"{self.get_sync_type_display()} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+
+
+class SyncCursor(models.Model):
+    """
+    Position de la synchronisation LOCAL → CLOUD pour un flux de données.
+    Avancée uniquement après l'accusé de réception d'un lot par le cloud.
+    """
+    stream = models.CharField(_('Stream'), max_length=30, unique=True)
+    last_id = models.BigIntegerField(_('Last ID'), default=0)
+    last_timestamp = models.DateTimeField(_('Last Timestamp'), null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Sync Cursor')
+        verbose_name_plural = _('Sync Cursors')
+    
+    def __str__(self):
+        return f"{self.stream} @ {self.last_id}"
+
+
+class SyncOutbox(models.Model):
+    """
+    Changement à envoyer au cloud (capture des modifications).
+    Écrit dans la même transaction que la vente, le retour ou le mouvement
+    de stock ; `seq` croît de façon monotone et donne l'ordre d'envoi.
+    Les entrées sont supprimées une fois acquittées par le cloud.
+    """
+    
+    class Stream(models.TextChoices):
+        SALES = 'sales', _('Sales')
+        RETURNS = 'returns', _('Returns')
+        STOCK = 'stock_updates', _('Stock Updates')
+    
+    seq = models.BigAutoField(primary_key=True)
+    stream = models.CharField(_('Stream'), max_length=30, choices=Stream.choices)
+    object_id = models.BigIntegerField(_('Object ID'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Sync Outbox Entry')
+        verbose_name_plural = _('Sync Outbox')
+        ordering = ['seq']
+    
+    def __str__(self):
+        return f"#{self.seq} {self.stream} {self.object_id}"
+
+
+class Store(models.Model):
+    """
+    Magasin connecté au cloud. Chaque magasin s'authentifie avec son propre
+    jeton de synchronisation ; ses ventes, retours et stocks sont rangés
+    sous son code.
+    """
+    code = models.SlugField(_('Code'), max_length=50, unique=True)
+    name = models.CharField(_('Name'), max_length=200)
+    sync_token = models.CharField(_('Sync Token'), max_length=64, unique=True, blank=True)
+    active = models.BooleanField(_('Active'), default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Store')
+        verbose_name_plural = _('Stores')
+        ordering = ['code']
+    
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+    
+    def save(self, *args, **kwargs):
+        if not self.sync_token:
+            self.sync_token = secrets.token_urlsafe(32)
+        super().save(*args, **kwargs)
@@ -0,0 +1,52 @@
+"""
+Normalisation des textes pour la recherche (champ search_key des produits,
+catégories et fournisseurs, et texte saisi dans les champs de recherche).
+
+Étapes :
+- casse : casefold (« Œuvre » → « œuvre », « ß » → « ss ») ;
+- accents : décomposition NFKD puis suppression des marques combinantes
+  (« à spirale » → « a spirale ») ; en arabe, cela retire aussi le
+  tashkeel (fatha, damma, kasra, shadda, soukoun, tanwin) et sépare la
+  hamza de son support (أ إ آ → ا, ؤ → و, ئ → ي) ;
+- arabe : alef wasla → alef, alef maqsura → ya, ta marbuta → ha,
+  suppression du tatweel, chiffres arabes-indiens → 0-9 ;
+- ligatures œ / æ développées ;
+- ponctuation : les mots sont séparés par une espace.
+
+Appliquée à la fois aux données et à la requête, une même recherche
+trouve « cahier », « Cahier à spirale » ou « CAHIER ».
+"""
+import re
+import unicodedata
+
+_FOLD = str.maketrans({
+    'ٱ': 'ا',   # alef wasla
+    'ى': 'ي',   # alef maqsura
+    'ة': 'ه',   # ta marbuta
+    'ـ': None,  # tatweel
+    'œ': 'oe',
+    'æ': 'ae',
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # chiffres arabes-indiens
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # chiffres persans
+})
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Texte normalisé : mots en minuscules, sans accents ni signes, séparés par une espace."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_WORD.findall(text.translate(_FOLD)))
+
+
+def search_key(*parts):
+    """Clé de recherche de plusieurs champs (vides ignorés)."""
+    return normalize(' '.join(str(part) for part in parts if part))
+
+
+def search_terms(query):
+    """Mots normalisés d'une recherche saisie."""
+    return normalize(query).split()
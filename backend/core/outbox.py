@@ -0,0 +1,24 @@
+"""
+Alimentation de la table SyncOutbox.
+
+`record()` est appelé dans la transaction qui modifie les données : si elle
+est annulée, l'entrée l'est aussi, et rien n'est envoyé au cloud. Le serveur
+cloud (IS_CLOUD_SERVER) ne renvoie rien : aucune entrée n'y est écrite.
+"""
+from django.conf import settings
+
+from .models import SyncOutbox
+
+
+def enabled():
+    return not getattr(settings, 'IS_CLOUD_SERVER', False)
+
+
+def record(stream, object_ids):
+    """Ajoute une entrée par objet modifié (un seul INSERT)."""
+    object_ids = [pk for pk in object_ids if pk is not None]
+    if not object_ids or not enabled():
+        return
+    SyncOutbox.objects.bulk_create([
+        SyncOutbox(stream=stream, object_id=pk) for pk in object_ids
+    ])
@@ -0,0 +1,49 @@
+"""
+Diffusion temps réel via Channels.
+Les envois sont best-effort : si Redis/Channels n'est pas disponible,
+l'opération métier ne doit jamais échouer pour autant.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+STOCK_GROUP = 'stock_updates'
+IMPORT_GROUP = 'import_jobs'
+
+
+def group_send(group, event_type, message):
+    """Envoie un événement à un groupe Channels (ignore les erreurs)."""
+    try:
+        from channels.layers import get_channel_layer
+        from asgiref.sync import async_to_sync
+
+        channel_layer = get_channel_layer()
+        if channel_layer:
+            async_to_sync(channel_layer.group_send)(
+                group,
+                {'type': event_type, 'message': message}
+            )
+    except Exception as e:
+        logger.debug(f"Channels indisponible, événement {event_type} ignoré: {e}")
+
+
+def broadcast_stock_updates(updates):
+    """
+    Publie un seul événement pour un lot de changements de stock.
+    `updates` est une liste de dicts {'product_id': ..., 'new_stock': ...}.
+    """
+    if not updates:
+        return
+    group_send(STOCK_GROUP, 'stock_update', {'updates': list(updates)})
+
+
+def broadcast_low_stock(products):
+    """Publie les produits qui viennent de passer sous leur seuil (liste de dicts)."""
+    if not products:
+        return
+    group_send(STOCK_GROUP, 'low_stock_alert', {'products': list(products)})
+
+
+def broadcast_import_progress(progress):
+    """Publie l'avancement d'un import de produits (dict sérialisable)."""
+    group_send(IMPORT_GROUP, 'import_progress', progress)
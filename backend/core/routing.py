@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/stock/$', consumers.StockConsumer.as_asgi()),
+    re_path(r'ws/imports/$', consumers.ImportJobConsumer.as_asgi()),
 ]
@@ -0,0 +1,29 @@
+"""
+Capture des modifications pour la synchronisation LOCAL → CLOUD.
+
+Les enregistrements via save() (ventes, retours, fiches produit) sont
+captés ici ; les mises à jour en masse du stock passent par le registre
+de stock, qui écrit lui-même dans l'outbox.
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from inventory.models import Product
+from sales.models import Sale, Return
+from . import outbox
+from .models import SyncOutbox
+
+
+@receiver(post_save, sender=Sale)
+def capture_sale(sender, instance, **kwargs):
+    outbox.record(SyncOutbox.Stream.SALES, [instance.pk])
+
+
+@receiver(post_save, sender=Return)
+def capture_return(sender, instance, **kwargs):
+    outbox.record(SyncOutbox.Stream.RETURNS, [instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def capture_product(sender, instance, **kwargs):
+    outbox.record(SyncOutbox.Stream.STOCK, [instance.pk])
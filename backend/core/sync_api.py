@@ -2,19 +2,36 @@
 API endpoints for data synchronization between local and cloud servers.
 """
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from decimal import Decimal
+import hmac
+import json
 import logging
+import time
 
 from sales.models import Sale, SaleItem, Return, ReturnItem
-from inventory.models import Product, Category, Supplier
+from sales.signals import sales_committed, returns_completed
+from inventory.models import Product, StoreStock
+from inventory.signals import stock_changed
+from . import master_data, sync_metrics, wire
+from .models import Store, SyncLog, SyncOutbox
 
 logger = logging.getLogger(__name__)
 
+# Magasin supposé pour les envois qui ne précisent pas source_store
+DEFAULT_SOURCE_STORE = 'main'
+
 
 class SyncTokenPermission:
     """
@@ -22,60 +39,64 @@ class SyncTokenPermission:
     Used for server-to-server sync authentication.
     """
     def has_permission(self, request, view):
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('SyncToken '):
-            token = auth_header[10:]
-            expected_token = getattr(settings, 'SYNC_TOKEN', None)
-            return token and token == expected_token
-        return False
+        return _authenticate_sync(request) is not None
+
+
+def _authenticate_sync(request):
+    """
+    Vérifie le jeton SyncToken. Retourne le code du magasin pour un jeton
+    de magasin (Store), '' pour le jeton global SYNC_TOKEN (le magasin est
+    alors celui déclaré dans l'envoi), None si le jeton est invalide.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('SyncToken '):
+        return None
+    token = auth_header[10:]
+    if not token:
+        return None
+    
+    expected_token = getattr(settings, 'SYNC_TOKEN', None)
+    if expected_token and hmac.compare_digest(token.encode(), expected_token.encode()):
+        return ''
+    store = Store.objects.filter(sync_token=token, active=True).only('code', 'sync_token').first()
+    if store and hmac.compare_digest(token.encode(), store.sync_token.encode()):
+        return store.code
+    return None
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])  # Uses custom token auth
+@parser_classes(wire.SYNC_PARSERS)
 def receive_sync_data(request):
     """
     Endpoint for receiving sync data from local server.
     This runs on the cloud server.
     """
     # Verify sync token
-    auth_header = request.headers.get('Authorization', '')
-    if not auth_header.startswith('SyncToken '):
-        return Response({'error': 'Invalid authorization'}, status=status.HTTP_401_UNAUTHORIZED)
-    
-    token = auth_header[10:]
-    expected_token = getattr(settings, 'SYNC_TOKEN', None)
-    
-    if not expected_token or token != expected_token:
+    authenticated_store = _authenticate_sync(request)
+    if authenticated_store is None:
         return Response({'error': 'Invalid sync token'}, status=status.HTTP_401_UNAUTHORIZED)
     
     data = request.data
+    # Un jeton de magasin impose son magasin ; le jeton global garde l'ancien comportement
+    store = authenticated_store or data.get('source_store') or DEFAULT_SOURCE_STORE
     
     try:
+        started = time.perf_counter()
         with transaction.atomic():
-            # Process incoming sales
-            sales_created = 0
-            for sale_data in data.get('sales', []):
-                sale_created = _import_sale(sale_data)
-                if sale_created:
-                    sales_created += 1
+            sales_created = _ingest_sales(store, data.get('sales', []))
+            returns_created = _ingest_returns(store, data.get('returns', []))
             
-            # Process incoming returns
-            returns_created = 0
-            for return_data in data.get('returns', []):
-                return_created = _import_return(return_data)
-                if return_created:
-                    returns_created += 1
-            
-            # Process stock updates (just log them, local is authority for stock)
+            # Process stock updates (local is authority for stock)
             stock_updates = data.get('stock_updates', [])
-            for stock_update in stock_updates:
-                _update_cloud_stock_reference(stock_update)
+            _ingest_stock_references(store, stock_updates)
         
         return Response({
             'status': 'success',
             'sales_created': sales_created,
             'returns_created': returns_created,
             'stock_updates_received': len(stock_updates),
+            'ingest_ms': round((time.perf_counter() - started) * 1000, 1),
             'sync_time': timezone.now().isoformat()
         })
     
@@ -84,105 +105,190 @@ def receive_sync_data(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-def _import_sale(sale_data: dict) -> bool:
-    """Import a sale from local server."""
-    # Check if this sale already exists (by local_id)
-    local_id = sale_data.get('local_id')
-    if not local_id:
-        return False
-    
-    # Use a reference field to track imported sales
-    existing = Sale.objects.filter(
-        created_at=sale_data['created_at']
-    ).first()
-    
-    if existing:
-        return False  # Already imported
-    
+def _new_by_local_id(model, store: str, records: list) -> dict:
+    """
+    {local_id: données} des enregistrements pas encore importés pour ce
+    magasin : une seule requête sur la clé unique (source_store, local_id).
+    """
+    incoming = {}
+    for record in records:
+        local_id = record.get('local_id')
+        if local_id:
+            incoming.setdefault(int(local_id), record)
+    if not incoming:
+        return {}
+    
+    existing = set(model.objects.filter(
+        source_store=store, local_id__in=list(incoming)
+    ).values_list('local_id', flat=True))
+    return {local_id: r for local_id, r in incoming.items() if local_id not in existing}
+
+
+def _restore_timestamps(model, objects: list, created_at: dict):
+    """bulk_create applique auto_now_add : rétablir les dates d'origine."""
+    for obj in objects:
+        obj.created_at = created_at[obj.local_id]
+    model.objects.bulk_update(objects, ['created_at'], batch_size=500)
+
+
+def _ingest_sales(store: str, sales_data: list) -> int:
+    """Import a batch of sales from a local server (bulk, idempotent)."""
     from core.models import User
-    user = None
-    if sale_data.get('user_username'):
-        user = User.objects.filter(username=sale_data['user_username']).first()
     
-    sale = Sale.objects.create(
-        user=user,
-        total_ht=sale_data['total_ht'],
-        total_tva=0,  # Will be calculated
-        total_ttc=sale_data['total_ttc'],
-        payment_method=sale_data.get('payment_method', 'CASH'),
-        synced=True  # Mark as already synced
-    )
-    
-    # Override created_at
-    Sale.objects.filter(id=sale.id).update(created_at=sale_data['created_at'])
-    
-    # Create sale items
-    for item_data in sale_data.get('items', []):
-        product = Product.objects.filter(barcode=item_data['product_barcode']).first()
-        
-        SaleItem.objects.create(
-            sale=sale,
-            product=product,
-            product_name=item_data['product_name'],
-            quantity=item_data['quantity'],
-            unit_price_ht=item_data['unit_price_ht'],
-            total_price_ht=item_data['total_ht'],
-            tva_rate=20  # Default
+    new_sales = _new_by_local_id(Sale, store, sales_data)
+    if not new_sales:
+        return 0
+    
+    barcodes = {
+        item.get('product_barcode')
+        for sale_data in new_sales.values() for item in sale_data.get('items', [])
+    } - {None, ''}
+    products = {
+        barcode: (pk, purchase_price)
+        for pk, barcode, purchase_price in Product.objects.filter(
+            barcode__in=barcodes
+        ).values_list('pk', 'barcode', 'purchase_price')
+    }
+    usernames = {s.get('user_username') for s in new_sales.values()} - {None, ''}
+    users = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+    
+    sales = [
+        Sale(
+            source_store=store,
+            local_id=local_id,
+            user_id=users.get(sale_data.get('user_username')),
+            total_ht=Decimal(str(sale_data['total_ht'])),
+            total_tva=Decimal(str(sale_data['total_ttc'])) - Decimal(str(sale_data['total_ht'])),
+            total_ttc=Decimal(str(sale_data['total_ttc'])),
+            payment_method=sale_data.get('payment_method', 'CASH'),
+            synced=True  # Mark as already synced
         )
+        for local_id, sale_data in new_sales.items()
+    ]
+    Sale.objects.bulk_create(sales, batch_size=500)
+    _restore_timestamps(Sale, sales, {
+        local_id: parse_datetime(sale_data['created_at']) for local_id, sale_data in new_sales.items()
+    })
     
-    return True
+    items = []
+    for sale in sales:
+        for item_data in new_sales[sale.local_id].get('items', []):
+            product_id, purchase_price = products.get(item_data.get('product_barcode'), (None, 0))
+            items.append(SaleItem(
+                sale=sale,
+                product_id=product_id,
+                product_name=item_data['product_name'],
+                quantity=item_data['quantity'],
+                unit_price_ht=item_data['unit_price_ht'],
+                total_price_ht=item_data['total_ht'],
+                tva_rate=item_data.get('tva_rate', 20),
+                unit_cost=item_data.get('unit_cost') or purchase_price
+            ))
+    SaleItem.objects.bulk_create(items, batch_size=1000)
+    
+    sale_ids = [sale.pk for sale in sales]
+    transaction.on_commit(lambda: sales_committed.send(sender=Sale, sale_ids=sale_ids))
+    return len(sales)
 
 
-def _import_return(return_data: dict) -> bool:
-    """Import a return from local server."""
-    # Skip if already imported
-    local_id = return_data.get('local_id')
-    if not local_id:
-        return False
-    
-    existing = Return.objects.filter(
-        created_at=return_data['created_at']
-    ).first()
-    
-    if existing:
-        return False
-    
-    # Find the corresponding sale
-    sale = Sale.objects.filter(
-        created_at=return_data.get('sale_created_at')
-    ).first()
-    
-    if not sale:
-        logger.warning(f"Could not find sale for return {local_id}")
-        return False
-    
-    ret = Return.objects.create(
-        sale=sale,
-        reason=return_data['reason'],
-        refund_amount=return_data['total_refund'],
-        status=return_data.get('status', 'COMPLETED'),
-        synced=True
-    )
-    
-    Return.objects.filter(id=ret.id).update(created_at=return_data['created_at'])
+def _ingest_returns(store: str, returns_data: list) -> int:
+    """Import a batch of returns from a local server (bulk, idempotent)."""
+    new_returns = _new_by_local_id(Return, store, returns_data)
+    if not new_returns:
+        return 0
+    
+    # Vente d'origine : par clé (magasin, id local), sinon par date (anciens envois)
+    sale_local_ids = {r.get('sale_local_id') for r in new_returns.values()} - {None}
+    sales_by_local_id = dict(Sale.objects.filter(
+        source_store=store, local_id__in=sale_local_ids
+    ).values_list('local_id', 'pk'))
+    legacy_dates = {
+        r.get('sale_created_at') for r in new_returns.values()
+        if r.get('sale_local_id') not in sales_by_local_id and r.get('sale_created_at')
+    }
+    sales_by_date = {}
+    if legacy_dates:
+        sales_by_date = {
+            created_at: pk for pk, created_at in Sale.objects.filter(
+                created_at__in=[parse_datetime(d) for d in legacy_dates]
+            ).values_list('pk', 'created_at')
+        }
+    
+    returns = []
+    for local_id, return_data in new_returns.items():
+        sale_id = sales_by_local_id.get(return_data.get('sale_local_id'))
+        if sale_id is None and return_data.get('sale_created_at'):
+            sale_id = sales_by_date.get(parse_datetime(return_data['sale_created_at']))
+        if sale_id is None:
+            logger.warning(f"Could not find sale for return {local_id}")
+            continue
+        returns.append(Return(
+            source_store=store,
+            local_id=local_id,
+            sale_id=sale_id,
+            reason=return_data['reason'],
+            refund_amount=return_data['total_refund'],
+            status=return_data.get('status', 'COMPLETED'),
+            synced=True
+        ))
+    if not returns:
+        return 0
+    
+    Return.objects.bulk_create(returns, batch_size=500)
+    _restore_timestamps(Return, returns, {
+        local_id: parse_datetime(return_data['created_at']) for local_id, return_data in new_returns.items()
+    })
     
-    return True
+    completed = [r.pk for r in returns if r.status == Return.ReturnStatus.COMPLETED]
+    if completed:
+        transaction.on_commit(lambda: returns_completed.send(sender=Return, return_ids=completed))
+    return len(returns)
 
 
-def _update_cloud_stock_reference(stock_data: dict):
+def _ingest_stock_references(store: str, stock_updates: list):
     """
     Update stock reference on cloud (for reporting only).
     Local server is the authority for actual stock levels.
+    
+    Chaque magasin a son propre niveau (StoreStock) ; Product.stock est
+    la somme de tous les magasins.
     """
-    barcode = stock_data.get('barcode')
-    if not barcode:
+    levels = {
+        u['barcode']: u['stock'] for u in stock_updates
+        if u.get('barcode') and u.get('stock') is not None
+    }
+    if not levels:
+        return
+    
+    products = dict(Product.objects.filter(barcode__in=list(levels)).values_list('barcode', 'pk'))
+    if not products:
         return
+    now = timezone.now()
+    StoreStock.objects.bulk_create(
+        [
+            StoreStock(store=store, product_id=pk, stock=levels[barcode], updated_at=now)
+            for barcode, pk in products.items()
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['store', 'product'],
+        update_fields=['stock', 'updated_at'],
+    )
+    
+    total = StoreStock.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('stock')
+    ).values('total')
+    stock = Coalesce(Subquery(total), 0)
+    # updated_at inchangé : il sert de curseur aux données de référence
+    # (master_data), dont le stock est exclu ; sinon chaque produit vendu
+    # serait renvoyé à tous les magasins à chaque réception
+    Product.objects.filter(pk__in=products.values()).update(
+        stock=stock, is_low_stock=LessThanOrEqual(stock, F('min_stock'))
+    )
     
-    product = Product.objects.filter(barcode=barcode).first()
-    if product:
-        # Update cloud's reference of local stock
-        product.stock = stock_data.get('stock', product.stock)
-        product.save(update_fields=['stock', 'updated_at'])
+    # update() ne déclenche pas post_save : mettre à jour le cache de scan
+    new_levels = dict(Product.objects.filter(pk__in=products.values()).values_list('pk', 'stock'))
+    transaction.on_commit(lambda: stock_changed.send(sender=Product, levels=new_levels))
 
 
 @api_view(['GET'])
@@ -191,54 +297,70 @@ def get_master_data(request):
     """
     Endpoint for providing master data to local server.
     This runs on the cloud server.
-    """
-    auth_header = request.headers.get('Authorization', '')
-    if not auth_header.startswith('SyncToken '):
-        return Response({'error': 'Invalid authorization'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    token = auth_header[10:]
-    expected_token = getattr(settings, 'SYNC_TOKEN', None)
-    
-    if not expected_token or token != expected_token:
+    One entity per call (?entity=categories|suppliers|products), paged on
+    the (updated_since, after_id) cursor and streamed row by row.
+    """
+    if _authenticate_sync(request) is None:
         return Response({'error': 'Invalid sync token'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    since = request.query_params.get('since')
-    
-    # Get master data updated since the given timestamp
-    categories = list(Category.objects.all().values('name', 'description'))
-    
-    suppliers = list(Supplier.objects.all().values(
-        'name', 'email', 'phone', 'address'
-    ))
-    
-    products_qs = Product.objects.all()
-    if since:
-        try:
-            from datetime import datetime
-            since_dt = datetime.fromisoformat(since.replace('Z', '+00:00'))
-            products_qs = products_qs.filter(updated_at__gt=since_dt)
-        except (ValueError, TypeError):
-            pass
-    
-    products = []
-    for p in products_qs:
-        products.append({
-            'barcode': p.barcode,
-            'name': p.name,
-            'category_name': p.category.name if p.category else None,
-            'purchase_price_ht': str(p.purchase_price_ht),
-            'sale_price_ht': str(p.sale_price_ht),
-            'tva_rate': str(p.tva_rate),
-            'stock': p.stock,
-            'min_stock': p.min_stock,
-        })
+    entity = request.query_params.get('entity')
+    if entity not in master_data.ENTITIES:
+        return Response(
+            {'error': f"entity must be one of: {', '.join(master_data.ENTITY_ORDER)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    return Response({
-        'categories': categories,
-        'suppliers': suppliers,
-        'products': products,
-        'timestamp': timezone.now().isoformat()
-    })
+    try:
+        updated_since = parse_datetime(request.query_params.get('updated_since') or '')
+        after_id = int(request.query_params.get('after_id') or 0)
+        limit = min(int(request.query_params.get('limit') or master_data.PAGE_SIZE), master_data.MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    content_type, encoding = wire.negotiate(request)
+    if content_type == wire.MSGPACK:
+        # Page bornée par limit : encodée en une fois, en colonnes
+        body = wire.encode(_master_page(entity, updated_since, after_id, limit), wire.MSGPACK)
+        chunks = [body]
+    else:
+        chunks = _stream_master_page(entity, updated_since, after_id, limit)
+    
+    response = StreamingHttpResponse(wire.compress_stream(chunks, encoding), content_type=content_type)
+    if encoding != wire.IDENTITY:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+
+def _master_page(entity: str, updated_since, after_id: int, limit: int) -> dict:
+    results, cursor = [], None
+    for pk, updated_at, row in master_data.iter_page(entity, updated_since, after_id, limit):
+        results.append(row)
+        cursor = {'updated_since': updated_at.isoformat(), 'after_id': pk}
+    return {
+        'entity': entity,
+        'results': results,
+        'cursor': cursor,
+        'has_more': len(results) == limit,
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+def _stream_master_page(entity: str, updated_since, after_id: int, limit: int):
+    """
+    JSON page written row by row:
+    {"entity", "results": [...], "cursor": {"updated_since", "after_id"}, "has_more"}
+    """
+    yield '{"entity": %s, "results": [' % json.dumps(entity)
+    count, cursor = 0, None
+    for pk, updated_at, row in master_data.iter_page(entity, updated_since, after_id, limit):
+        yield (',' if count else '') + json.dumps(row, cls=DjangoJSONEncoder)
+        count += 1
+        cursor = {'updated_since': updated_at.isoformat(), 'after_id': pk}
+    yield '], "cursor": %s, "has_more": %s, "timestamp": %s}' % (
+        json.dumps(cursor), json.dumps(count == limit), json.dumps(timezone.now().isoformat())
+    )
 
 
 @api_view(['GET'])
@@ -248,8 +370,10 @@ def sync_status(request):
     from core.sync_service import sync_service
     
     last_sync = sync_service.get_last_sync_time()
-    pending_sales = Sale.objects.filter(synced=False).count()
-    pending_returns = Return.objects.filter(synced=False).count()
+    # L'outbox ne contient que les changements en attente : comptage peu coûteux
+    pending = dict(
+        SyncOutbox.objects.order_by().values('stream').annotate(n=Count('seq')).values_list('stream', 'n')
+    )
     
     cloud_configured = bool(
         getattr(settings, 'CLOUD_API_URL', None) and 
@@ -259,12 +383,47 @@ def sync_status(request):
     return Response({
         'cloud_configured': cloud_configured,
         'last_sync': last_sync.isoformat() if last_sync else None,
-        'pending_sales': pending_sales,
-        'pending_returns': pending_returns,
+        'pending_sales': pending.get(SyncOutbox.Stream.SALES, 0),
+        'pending_returns': pending.get(SyncOutbox.Stream.RETURNS, 0),
+        'pending_stock_updates': pending.get(SyncOutbox.Stream.STOCK, 0),
+        'lag_seconds': sync_service.outbox_lag(),
         'is_local_server': not getattr(settings, 'IS_CLOUD_SERVER', False)
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_metrics_view(request):
+    """
+    Sync metrics: current replication lag, last push / pull measurements
+    and a time series (?hours=24&bucket=minute|hour|day).
+    """
+    from core.sync_service import sync_service
+    
+    try:
+        hours = min(max(int(request.query_params.get('hours') or 24), 1), 24 * 31)
+    except ValueError:
+        return Response({'error': 'Invalid hours'}, status=status.HTTP_400_BAD_REQUEST)
+    bucket = request.query_params.get('bucket') or 'hour'
+    if bucket not in sync_metrics.BUCKETS:
+        return Response(
+            {'error': f"bucket must be one of: {', '.join(sync_metrics.BUCKETS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    lag = sync_service.outbox_lag()
+    threshold = getattr(settings, 'SYNC_LAG_ALERT_SECONDS', 600)
+    return Response({
+        'lag_seconds': round(lag, 1),
+        'lag_alert': lag > threshold,
+        'lag_alert_threshold': threshold,
+        'pending': SyncOutbox.objects.count(),
+        'last_push': sync_metrics.last_run(SyncLog.SyncType.PUSH),
+        'last_pull': sync_metrics.last_run(SyncLog.SyncType.PULL),
+        'series': sync_metrics.series(hours, bucket),
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def trigger_sync(request):
@@ -0,0 +1,108 @@
+"""
+Démon de synchronisation LOCAL ↔ CLOUD (commande `run_sync_daemon`).
+
+Un seul processus, lancé une fois : Django est chargé une fois pour
+toutes et la session HTTP garde ses connexions TLS ouvertes. La boucle
+interroge l'outbox toutes les quelques secondes (une requête sur la clé
+primaire) et n'envoie que s'il y a des changements ; la récupération des
+données de référence se fait à intervalle plus long.
+
+Tant que le cloud est injoignable, l'attente croît exponentiellement
+(avec une part aléatoire, pour que plusieurs caisses ne réessaient pas
+en même temps) jusqu'à `max_backoff`.
+"""
+import logging
+import random
+import time
+
+from django.db import close_old_connections
+
+from .models import SyncOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(failures, base, cap, rand=random.random):
+    """Attente après `failures` échecs consécutifs : moitié fixe, moitié aléatoire."""
+    delay = min(cap, base * 2 ** max(failures - 1, 0))
+    return delay / 2 + rand() * delay / 2
+
+
+class SyncDaemon:
+    """Boucle d'envoi / réception ; `run_once` effectue un cycle et retourne l'attente suivante."""
+
+    def __init__(self, service, poll_interval=2.0, pull_interval=300.0, max_backoff=300.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.service = service
+        self.poll_interval = poll_interval
+        self.pull_interval = pull_interval
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.failures = 0
+        self.next_pull = clock()
+        self.running = False
+
+    def _cycle(self):
+        """Envoi si l'outbox n'est pas vide, puis réception si elle est due ; retourne les erreurs."""
+        errors = []
+
+        if SyncOutbox.objects.exists():
+            result = self.service.push_to_cloud()
+            if result['status'] != 'success':
+                errors.append(f"push: {result.get('message')}")
+
+        if not errors and self.clock() >= self.next_pull:
+            result = self.service.pull_from_cloud()
+            if result['status'] == 'success':
+                self.next_pull = self.clock() + self.pull_interval
+            else:
+                errors.append(f"pull: {result.get('message')}")
+        return errors
+
+    def _backoff(self):
+        self.failures += 1
+        return backoff_delay(self.failures, self.poll_interval, self.max_backoff)
+
+    def run_once(self):
+        close_old_connections()
+        try:
+            errors = self._cycle()
+            lag = self.service.outbox_lag()
+        except Exception:
+            # Base verrouillée, réponse illisible, conflit d'intégrité... : le démon
+            # ne doit pas s'arrêter, le cycle est compté comme un échec
+            delay = self._backoff()
+            logger.exception(f"Sync cycle crashed, attempt {self.failures}, retry in {delay:.1f}s")
+            return delay
+
+        if errors:
+            delay = self._backoff()
+            logger.warning(
+                f"Sync failed ({'; '.join(errors)}), attempt {self.failures}, "
+                f"retry in {delay:.1f}s, lag {lag:.0f}s"
+            )
+            return delay
+
+        if self.failures:
+            logger.info(f"Sync recovered after {self.failures} failed attempts")
+        self.failures = 0
+        if lag:
+            logger.info(f"Sync lag {lag:.0f}s")
+        return self.poll_interval
+
+    def run(self):
+        self.running = True
+        self.service.open_session()
+        try:
+            while self.running:
+                delay = self.run_once()
+                # Attente découpée pour réagir rapidement à stop()
+                deadline = self.clock() + delay
+                while self.running and self.clock() < deadline:
+                    self.sleep(min(self.poll_interval, deadline - self.clock()))
+        finally:
+            self.service.close_session()
+
+    def stop(self, *args):
+        self.running = False
@@ -0,0 +1,96 @@
+"""
+Mesures des synchronisations LOCAL ↔ CLOUD.
+
+Chaque exécution (envoi ou réception) est découpée en phases :
+- collect : lecture de l'outbox et des lignes à envoyer ;
+- serialize : encodage (ou décodage) du corps ;
+- compress : compression du corps envoyé ;
+- transfer : aller-retour HTTP, hors temps d'ingestion du cloud ;
+- ingest : écriture des lignes (mesurée par le cloud pour un envoi).
+
+Les durées, octets échangés et débit sont enregistrés dans SyncLog ;
+`series` les agrège par intervalle pour la vue /sync/metrics/.
+"""
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Max, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+
+from .models import SyncLog
+
+PHASES = ('collect', 'serialize', 'compress', 'transfer', 'ingest')
+
+BUCKETS = {'minute': TruncMinute, 'hour': TruncHour, 'day': TruncDay}
+
+# Champs d'une exécution exposés par l'API
+LOG_FIELDS = (
+    'duration_ms', *(f'{phase}_ms' for phase in PHASES),
+    'bytes_sent', 'bytes_received', 'rows_per_second', 'lag_seconds',
+)
+
+
+class SyncMetrics:
+    """Chronomètre par phase et compteurs d'octets d'une exécution."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.lag_seconds = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.timings[name] += self.clock() - start
+
+    def add(self, name, seconds):
+        self.timings[name] += seconds
+
+    def log_fields(self, rows):
+        """Valeurs des champs de mesure de SyncLog."""
+        duration = self.clock() - self.started
+        return {
+            'duration_ms': round(duration * 1000, 1),
+            **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'rows_per_second': round(rows / duration, 1) if duration > 0 else 0.0,
+            'lag_seconds': round(self.lag_seconds, 1),
+        }
+
+
+def last_run(sync_type):
+    """Mesures de la dernière exécution d'un type, ou None."""
+    return SyncLog.objects.filter(sync_type=sync_type).order_by('-created_at').values(
+        'created_at', 'success', 'records_synced', *LOG_FIELDS
+    ).first()
+
+
+def series(hours=24, bucket='hour'):
+    """Exécutions des `hours` dernières heures, agrégées par intervalle et par type."""
+    since = timezone.now() - timedelta(hours=hours)
+    rows = SyncLog.objects.filter(created_at__gte=since).order_by().annotate(
+        bucket=BUCKETS[bucket]('created_at')
+    ).values('bucket', 'sync_type').annotate(
+        runs=Count('pk'),
+        failures=Count('pk', filter=Q(success=False)),
+        records=Sum('records_synced'),
+        bytes_sent=Sum('bytes_sent'),
+        bytes_received=Sum('bytes_received'),
+        avg_duration_ms=Avg('duration_ms'),
+        **{f'avg_{phase}_ms': Avg(f'{phase}_ms') for phase in PHASES},
+        avg_rows_per_second=Avg('rows_per_second'),
+        max_lag_seconds=Max('lag_seconds'),
+    ).order_by('bucket', 'sync_type')
+    return [
+        {key: round(value, 1) if isinstance(value, float) else value for key, value in row.items()}
+        for row in rows
+    ]
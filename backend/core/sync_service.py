@@ -5,15 +5,17 @@ the local store server and the cloud server.
 """
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 import requests
 
 from sales.models import Sale, SaleItem, Return, ReturnItem
-from inventory.models import Product, Category, Supplier
-from core.models import User, AppSettings
+from inventory.models import Product
+from core import master_data, wire
+from core.sync_metrics import SyncMetrics
+from core.models import User, AppSettings, SyncCursor, SyncLog, SyncOutbox
 
 logger = logging.getLogger(__name__)
 
@@ -23,42 +25,82 @@ class SyncService:
     Handles synchronization between local and cloud servers.
     
     Sync Strategy:
-    - Local → Cloud: Push new sales, returns, and stock updates
-    - Cloud → Local: Pull new products, categories, suppliers (master data)
+    - Local → Cloud: Push the changes recorded in SyncOutbox (sales, returns,
+      stock updates) in seq order; each chunk's entries are deleted once
+      the cloud acknowledges it
+    - Cloud → Local: Pull categories, suppliers and products changed since
+      the last pull (per-entity cursor), writing only rows whose content
+      digest differs
     """
     
+    STREAM_OUTBOX = 'outbox'
+    
     def __init__(self):
         self.cloud_url = settings.CLOUD_API_URL if hasattr(settings, 'CLOUD_API_URL') else None
         self.sync_token = settings.SYNC_TOKEN if hasattr(settings, 'SYNC_TOKEN') else None
-        self.last_sync_file = settings.BASE_DIR / '.last_sync'
+        self.chunk_size = getattr(settings, 'SYNC_CHUNK_SIZE', 200)
+        self.pull_page_size = master_data.PAGE_SIZE
+        self.wire_format, self.wire_encoding = self._wire_settings()
+        # Session HTTP persistante (démon) ; sinon une connexion par requête
+        self.session = None
     
-    def get_last_sync_time(self) -> datetime:
-        """Get the timestamp of the last successful sync."""
-        try:
-            if self.last_sync_file.exists():
-                timestamp = self.last_sync_file.read_text().strip()
-                return datetime.fromisoformat(timestamp)
-        except Exception as e:
-            logger.warning(f"Could not read last sync time: {e}")
-        return datetime.now() - timedelta(days=365)  # Default: sync everything
+    @property
+    def _http(self):
+        return self.session or requests
     
-    def set_last_sync_time(self, timestamp: datetime = None):
-        """Update the last sync timestamp."""
-        if timestamp is None:
-            timestamp = timezone.now()
-        try:
-            self.last_sync_file.write_text(timestamp.isoformat())
-        except Exception as e:
-            logger.error(f"Could not save last sync time: {e}")
-    
-    def get_pending_sales(self) -> list:
-        """Get sales created since last sync."""
-        last_sync = self.get_last_sync_time()
-        sales = Sale.objects.filter(
-            created_at__gt=last_sync,
-            synced=False
-        ).select_related('user').prefetch_related('items__product')
+    def open_session(self, pool_size: int = 2):
+        """Keep TLS connections to the cloud alive between requests."""
+        from requests.adapters import HTTPAdapter
         
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        return self.session
+    
+    def close_session(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+    
+    def outbox_lag(self) -> float:
+        """Age in seconds of the oldest change not yet acknowledged by the cloud."""
+        oldest = SyncOutbox.objects.order_by('seq').values_list('created_at', flat=True).first()
+        if oldest is None:
+            return 0.0
+        return max((timezone.now() - oldest).total_seconds(), 0.0)
+    
+    @staticmethod
+    def _wire_settings():
+        """Format / compression configurés, ramenés à ce qui est disponible ici."""
+        wire_format = {'msgpack': wire.MSGPACK, 'json': wire.JSON}.get(
+            getattr(settings, 'SYNC_WIRE_FORMAT', 'msgpack'), wire.JSON
+        )
+        if wire_format not in wire.available_formats():
+            wire_format = wire.JSON
+        encoding = getattr(settings, 'SYNC_WIRE_ENCODING', wire.GZIP)
+        if encoding not in wire.available_encodings():
+            encoding = wire.IDENTITY if encoding == wire.IDENTITY else wire.GZIP
+        return wire_format, encoding
+    
+    def get_last_sync_time(self):
+        """Date of the last successful push (SyncLog), or None if none yet."""
+        return SyncLog.objects.filter(
+            sync_type=SyncLog.SyncType.PUSH, success=True
+        ).order_by('-created_at').values_list('created_at', flat=True).first()
+    
+    # ---- Push (Local → Cloud) depuis l'outbox ----
+    
+    def get_outbox_chunk(self, limit: int = None) -> list:
+        """Oldest pending outbox entries, as (seq, stream, object_id)."""
+        entries = SyncOutbox.objects.order_by('seq').values_list('seq', 'stream', 'object_id')
+        return list(entries[:limit or self.chunk_size])
+    
+    def get_sales(self, sale_ids) -> list:
+        """Serialized sales for the given ids, in primary-key order."""
+        sales = Sale.objects.filter(pk__in=sale_ids).select_related('user').prefetch_related(
+            'items__product'
+        ).order_by('pk')
         return [self._serialize_sale(sale) for sale in sales]
     
     def _serialize_sale(self, sale: Sale) -> dict:
@@ -72,26 +114,23 @@ class SyncService:
             'user_username': sale.user.username if sale.user else None,
             'items': [
                 {
-                    'product_barcode': item.product.barcode,
-                    'product_name': item.product.name,
+                    'product_barcode': item.product.barcode if item.product else None,
+                    'product_name': item.product_name,
                     'quantity': item.quantity,
                     'unit_price_ht': str(item.unit_price_ht),
-                    'unit_price_ttc': str(item.unit_price_ttc),
-                    'total_ht': str(item.total_ht),
-                    'total_ttc': str(item.total_ttc),
+                    'total_ht': str(item.total_price_ht),
+                    'tva_rate': str(item.tva_rate),
+                    'unit_cost': str(item.unit_cost),
                 }
                 for item in sale.items.all()
             ]
         }
     
-    def get_pending_returns(self) -> list:
-        """Get returns created since last sync."""
-        last_sync = self.get_last_sync_time()
-        returns = Return.objects.filter(
-            created_at__gt=last_sync,
-            synced=False
-        ).prefetch_related('items__sale_item__product')
-        
+    def get_returns(self, return_ids) -> list:
+        """Serialized returns for the given ids, in primary-key order."""
+        returns = Return.objects.filter(pk__in=return_ids).select_related('sale').prefetch_related(
+            'items__sale_item__product'
+        ).order_by('pk')
         return [self._serialize_return(ret) for ret in returns]
     
     def _serialize_return(self, ret: Return) -> dict:
@@ -99,75 +138,173 @@ class SyncService:
         return {
             'local_id': ret.id,
             'sale_local_id': ret.sale_id,
+            'sale_created_at': ret.sale.created_at.isoformat(),
             'reason': ret.reason,
-            'total_refund': str(ret.total_refund),
+            'total_refund': str(ret.refund_amount),
             'status': ret.status,
             'created_at': ret.created_at.isoformat(),
             'items': [
                 {
-                    'product_barcode': item.sale_item.product.barcode,
+                    'product_barcode': item.sale_item.product.barcode if item.sale_item.product else None,
                     'quantity': item.quantity,
-                    'refund_amount': str(item.refund_amount),
                 }
                 for item in ret.items.all()
             ]
         }
     
-    def get_stock_updates(self) -> list:
-        """Get products with stock changes since last sync."""
-        last_sync = self.get_last_sync_time()
-        products = Product.objects.filter(
-            updated_at__gt=last_sync
-        ).values('barcode', 'stock', 'name')
-        
-        return list(products)
+    def get_stock_updates(self, product_ids) -> list:
+        """Current stock of the given products."""
+        products = Product.objects.filter(pk__in=product_ids).order_by('pk').values(
+            'id', 'barcode', 'stock', 'name', 'updated_at'
+        )
+        return [
+            {**p, 'updated_at': p['updated_at'].isoformat()}
+            for p in products
+        ]
     
-    def push_to_cloud(self) -> dict:
-        """Push local data to cloud server."""
-        if not self.cloud_url or not self.sync_token:
-            return {'status': 'error', 'message': 'Cloud sync not configured'}
+    def _build_payload(self, entries: list) -> dict:
+        """One payload per chunk; an object changed several times is sent once."""
+        ids = {stream: [] for stream in SyncOutbox.Stream.values}
+        for _, stream, object_id in entries:
+            if object_id not in ids[stream]:
+                ids[stream].append(object_id)
         
+        payload = {}
+        if ids[SyncOutbox.Stream.SALES]:
+            payload['sales'] = self.get_sales(ids[SyncOutbox.Stream.SALES])
+        if ids[SyncOutbox.Stream.RETURNS]:
+            payload['returns'] = self.get_returns(ids[SyncOutbox.Stream.RETURNS])
+        if ids[SyncOutbox.Stream.STOCK]:
+            payload['stock_updates'] = self.get_stock_updates(ids[SyncOutbox.Stream.STOCK])
+        return payload
+    
+    def _post_chunk(self, payload: dict, metrics: SyncMetrics = None):
+        """
+        Send one chunk in the negotiated wire format; returns None on
+        success, an error dict otherwise. A 415 from the cloud switches
+        this service to plain JSON and resends the chunk.
+        """
+        metrics = metrics or SyncMetrics()
         data = {
-            'sales': self.get_pending_sales(),
-            'returns': self.get_pending_returns(),
-            'stock_updates': self.get_stock_updates(),
-            'sync_timestamp': timezone.now().isoformat(),
+            **payload,
+            'source_store': settings.STORE_CODE,
+            'sync_timestamp': timezone.now().isoformat()
         }
+        try:
+            response = self._send(data, metrics)
+            if response.status_code == 415 and (self.wire_format, self.wire_encoding) != (wire.JSON, wire.IDENTITY):
+                logger.warning(
+                    f"Cloud refused {self.wire_format} / {self.wire_encoding}, falling back to plain JSON"
+                )
+                self.wire_format, self.wire_encoding = wire.JSON, wire.IDENTITY
+                response = self._send(data, metrics)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Sync push failed: {e}")
+            return {'message': str(e)}
         
+        if response.status_code != 200:
+            return {
+                'message': f"Cloud returned {response.status_code}",
+                'details': response.text[:500]
+            }
+        # Le cloud mesure son temps d'ingestion : le retirer du transfert
+        ingest = self._cloud_ingest_seconds(response)
+        metrics.add('ingest', ingest)
+        metrics.add('transfer', -ingest)
+        return None
+    
+    @staticmethod
+    def _cloud_ingest_seconds(response) -> float:
         try:
-            response = requests.post(
+            return float(response.json().get('ingest_ms', 0)) / 1000
+        except (ValueError, TypeError, AttributeError):
+            return 0.0
+    
+    def _send(self, data: dict, metrics: SyncMetrics):
+        headers = {
+            'Authorization': f'SyncToken {self.sync_token}',
+            'Content-Type': self.wire_format,
+        }
+        if self.wire_encoding != wire.IDENTITY:
+            headers['Content-Encoding'] = self.wire_encoding
+        with metrics.phase('serialize'):
+            body = wire.encode(data, self.wire_format)
+        with metrics.phase('compress'):
+            body = wire.compress(body, self.wire_encoding)
+        with metrics.phase('transfer'):
+            response = self._http.post(
                 f"{self.cloud_url}/sync/receive/",
-                json=data,
-                headers={
-                    'Authorization': f'SyncToken {self.sync_token}',
-                    'Content-Type': 'application/json'
-                },
+                data=body,
+                headers=headers,
                 timeout=30
             )
+        metrics.bytes_sent += len(body)
+        metrics.bytes_received += len(response.content)
+        return response
+    
+    def _acknowledge(self, entries: list, payload: dict):
+        """Remove the acknowledged entries and mark the rows synced, atomically."""
+        with transaction.atomic():
+            self._mark_sales_synced(payload.get('sales', []))
+            self._mark_returns_synced(payload.get('returns', []))
+            # Supprimer par seq (et non seq <= dernier) : une entrée d'une
+            # transaction validée plus tard avec un seq inférieur reste en file
+            SyncOutbox.objects.filter(seq__in=[seq for seq, _, _ in entries]).delete()
+            SyncCursor.objects.update_or_create(
+                stream=self.STREAM_OUTBOX, defaults={'last_id': entries[-1][0]}
+            )
+    
+    def push_to_cloud(self) -> dict:
+        """
+        Push pending outbox entries to the cloud, in acknowledged chunks.
+        Work is proportional to what changed since the last push.
+        """
+        if not self.cloud_url or not self.sync_token:
+            return {'status': 'error', 'message': 'Cloud sync not configured'}
+        
+        counts = {'sales': 0, 'returns': 0, 'stock_updates': 0, 'chunks': 0}
+        error = None
+        metrics = SyncMetrics()
+        metrics.lag_seconds = self.outbox_lag()
+        while True:
+            with metrics.phase('collect'):
+                entries = self.get_outbox_chunk()
+                payload = self._build_payload(entries) if entries else None
+            if not entries:
+                break
             
-            if response.status_code == 200:
-                result = response.json()
-                # Mark synced items
-                self._mark_sales_synced(data['sales'])
-                self._mark_returns_synced(data['returns'])
-                self.set_last_sync_time()
-                
-                return {
-                    'status': 'success',
-                    'synced_sales': len(data['sales']),
-                    'synced_returns': len(data['returns']),
-                    'synced_stock_updates': len(data['stock_updates']),
-                }
-            else:
-                return {
-                    'status': 'error',
-                    'message': f"Cloud returned {response.status_code}",
-                    'details': response.text[:500]
-                }
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Sync push failed: {e}")
-            return {'status': 'error', 'message': str(e)}
+            error = self._post_chunk(payload, metrics)
+            if error:
+                break
+            self._acknowledge(entries, payload)
+            
+            for key in ('sales', 'returns', 'stock_updates'):
+                counts[key] += len(payload.get(key, []))
+            counts['chunks'] += 1
+            
+            if len(entries) < self.chunk_size:
+                break
+        
+        result = {
+            'synced_sales': counts['sales'],
+            'synced_returns': counts['returns'],
+            'synced_stock_updates': counts['stock_updates'],
+            'chunks': counts['chunks'],
+        }
+        records = counts['sales'] + counts['returns'] + counts['stock_updates']
+        SyncLog.objects.create(
+            sync_type=SyncLog.SyncType.PUSH,
+            records_synced=records,
+            success=error is None,
+            error_message=error['message'] if error else '',
+            details=result,
+            **metrics.log_fields(records)
+        )
+        
+        if error:
+            return {'status': 'error', **error, **result}
+        
+        return {'status': 'success', **result}
     
     def _mark_sales_synced(self, sales_data: list):
         """Mark sales as synced after successful push."""
@@ -179,108 +316,91 @@ class SyncService:
         local_ids = [r['local_id'] for r in returns_data]
         Return.objects.filter(id__in=local_ids).update(synced=True)
     
-    def pull_from_cloud(self) -> dict:
-        """Pull master data (products, categories, suppliers) from cloud."""
-        if not self.cloud_url or not self.sync_token:
-            return {'status': 'error', 'message': 'Cloud sync not configured'}
-        
+    # ---- Pull (Cloud → Local) incrémental ----
+    
+    def _get_master_page(self, params: dict, metrics: SyncMetrics):
+        """Fetch one master-data page; returns (page, None) or (None, error dict)."""
         try:
-            response = requests.get(
-                f"{self.cloud_url}/sync/master-data/",
-                headers={
-                    'Authorization': f'SyncToken {self.sync_token}',
-                },
-                params={'since': self.get_last_sync_time().isoformat()},
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Process incoming master data
-                categories_count = self._import_categories(data.get('categories', []))
-                suppliers_count = self._import_suppliers(data.get('suppliers', []))
-                products_count = self._import_products(data.get('products', []))
-                
-                return {
-                    'status': 'success',
-                    'imported_categories': categories_count,
-                    'imported_suppliers': suppliers_count,
-                    'imported_products': products_count,
-                }
-            else:
-                return {
-                    'status': 'error',
-                    'message': f"Cloud returned {response.status_code}"
-                }
-                
+            with metrics.phase('transfer'):
+                response = self._http.get(
+                    f"{self.cloud_url}/sync/master-data/",
+                    headers={
+                        'Authorization': f'SyncToken {self.sync_token}',
+                        'Accept': ', '.join(wire.available_formats()),
+                        'Accept-Encoding': ', '.join(wire.available_encodings()),
+                    },
+                    params=params,
+                    timeout=30
+                )
         except requests.exceptions.RequestException as e:
             logger.error(f"Sync pull failed: {e}")
-            return {'status': 'error', 'message': str(e)}
-    
-    @transaction.atomic
-    def _import_categories(self, categories: list) -> int:
-        """Import or update categories from cloud."""
-        count = 0
-        for cat_data in categories:
-            _, created = Category.objects.update_or_create(
-                name=cat_data['name'],
-                defaults={'description': cat_data.get('description', '')}
-            )
-            if created:
-                count += 1
-        return count
-    
-    @transaction.atomic
-    def _import_suppliers(self, suppliers: list) -> int:
-        """Import or update suppliers from cloud."""
-        count = 0
-        for sup_data in suppliers:
-            _, created = Supplier.objects.update_or_create(
-                name=sup_data['name'],
-                defaults={
-                    'email': sup_data.get('email', ''),
-                    'phone': sup_data.get('phone', ''),
-                    'address': sup_data.get('address', ''),
-                }
-            )
-            if created:
-                count += 1
-        return count
+            return None, {'message': str(e)}
+        
+        if response.status_code != 200:
+            return None, {'message': f"Cloud returned {response.status_code}"}
+        # requests a déjà décompressé le corps (Content-Encoding)
+        metrics.bytes_received += len(response.content)
+        content_type = response.headers.get('Content-Type', wire.JSON).split(';')[0].strip()
+        with metrics.phase('serialize'):
+            return wire.decode(response.content, content_type), None
     
-    @transaction.atomic
-    def _import_products(self, products: list) -> int:
-        """Import or update products from cloud (does NOT overwrite stock)."""
-        count = 0
-        for prod_data in products:
-            existing = Product.objects.filter(barcode=prod_data['barcode']).first()
+    def _pull_entity(self, name: str, counts: dict, metrics: SyncMetrics):
+        """
+        Pull one entity page by page from its (updated_at, id) cursor.
+        Only rows whose digest differs locally are written.
+        Returns an error dict, or None when the entity is up to date.
+        """
+        cursor, _ = SyncCursor.objects.get_or_create(stream=f'pull:{name}')
+        
+        while True:
+            params = {'entity': name, 'after_id': cursor.last_id, 'limit': self.pull_page_size}
+            if cursor.last_timestamp:
+                params['updated_since'] = cursor.last_timestamp.isoformat()
             
-            if existing:
-                # Update everything except stock (stock is local authority)
-                existing.name = prod_data['name']
-                existing.purchase_price_ht = prod_data.get('purchase_price_ht', existing.purchase_price_ht)
-                existing.sale_price_ht = prod_data.get('sale_price_ht', existing.sale_price_ht)
-                existing.tva_rate = prod_data.get('tva_rate', existing.tva_rate)
-                existing.min_stock = prod_data.get('min_stock', existing.min_stock)
-                existing.save()
-            else:
-                # New product from cloud
-                category = None
-                if prod_data.get('category_name'):
-                    category, _ = Category.objects.get_or_create(name=prod_data['category_name'])
-                
-                Product.objects.create(
-                    barcode=prod_data['barcode'],
-                    name=prod_data['name'],
-                    category=category,
-                    purchase_price_ht=prod_data.get('purchase_price_ht', 0),
-                    sale_price_ht=prod_data.get('sale_price_ht', 0),
-                    tva_rate=prod_data.get('tva_rate', 20),
-                    stock=prod_data.get('stock', 0),
-                    min_stock=prod_data.get('min_stock', 5),
-                )
-                count += 1
-        return count
+            page, error = self._get_master_page(params, metrics)
+            if error:
+                return error
+            
+            with metrics.phase('ingest'), transaction.atomic():
+                counts[name] += master_data.apply_rows(name, page['results'])
+                if page['cursor']:
+                    cursor.last_timestamp = datetime.fromisoformat(page['cursor']['updated_since'])
+                    cursor.last_id = page['cursor']['after_id']
+                    cursor.save()
+            
+            if not page['has_more']:
+                return None
+    
+    def pull_from_cloud(self) -> dict:
+        """Pull master data changed since the last pull (categories, suppliers, products)."""
+        if not self.cloud_url or not self.sync_token:
+            return {'status': 'error', 'message': 'Cloud sync not configured'}
+        
+        counts = {name: 0 for name in master_data.ENTITY_ORDER}
+        error = None
+        metrics = SyncMetrics()
+        for name in master_data.ENTITY_ORDER:
+            error = self._pull_entity(name, counts, metrics)
+            if error:
+                break
+        
+        result = {
+            'imported_categories': counts['categories'],
+            'imported_suppliers': counts['suppliers'],
+            'imported_products': counts['products'],
+        }
+        SyncLog.objects.create(
+            sync_type=SyncLog.SyncType.PULL,
+            records_synced=sum(counts.values()),
+            success=error is None,
+            error_message=error['message'] if error else '',
+            details=result,
+            **metrics.log_fields(sum(counts.values()))
+        )
+        
+        if error:
+            return {'status': 'error', **error, **result}
+        return {'status': 'success', **result}
     
     def full_sync(self) -> dict:
         """Perform full bidirectional sync."""
@@ -1,8 +1,32 @@
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from zipfile import ZipFile
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 
+from openpyxl import load_workbook
+
+from inventory.models import Category, Product, StockMovement, StoreStock
+from sales.checkout import create_sale
+from sales.models import Sale, Return
+from . import backups, exports, master_data, wire
+from .normalize import normalize
+from .models import Store, SyncCursor, SyncLog, SyncOutbox
+from .sync_daemon import SyncDaemon
+from .sync_service import SyncService
+from .timeranges import range_filter
+
 User = get_user_model()
 
 
@@ -128,3 +152,580 @@ class UserAPITest(APITestCase):
         })
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(User.objects.count(), 2)
+
+
+class TimeRangeTest(TestCase):
+    """Tests pour les fenêtres temporelles indexables"""
+    
+    def test_half_open_local_range(self):
+        """Les bornes sont les minuits locaux, la fin est exclusive"""
+        lookups = range_filter('created_at', date(2025, 3, 1), date(2025, 3, 31))
+        start, end = lookups['created_at__gte'], lookups['created_at__lt']
+        
+        self.assertTrue(timezone.is_aware(start))
+        self.assertEqual(timezone.localtime(start).date(), date(2025, 3, 1))
+        self.assertEqual(timezone.localtime(end).date(), date(2025, 4, 1))
+        self.assertEqual(timezone.localtime(end).time(), time.min)
+        self.assertEqual(range_filter('created_at'), {})
+    
+    def test_range_queries_use_indexes(self):
+        """EXPLAIN : les filtres par période utilisent les index composites"""
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest("EXPLAIN vérifié uniquement sur SQLite et PostgreSQL")
+        
+        window = range_filter('created_at', date(2025, 1, 1), date(2025, 1, 31))
+        cases = [
+            (Sale.objects.filter(**window), Sale, ['created_at']),
+            (Return.objects.filter(status='COMPLETED', **window), Return, ['status', 'created_at']),
+            (StockMovement.objects.filter(product_id=1, **window), StockMovement, ['product', 'created_at']),
+        ]
+        
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tables vides : forcer le planificateur à considérer les index
+                cursor.execute('SET enable_seqscan = off')
+            for queryset, model, fields in cases:
+                index = next(i for i in model._meta.indexes if i.fields == fields)
+                plan = queryset.order_by().explain()
+                self.assertIn(index.name, plan, f"{model.__name__}: {plan}")
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET enable_seqscan = on')
+
+
+class DatabaseExportTest(APITestCase):
+    """Tests pour l'export de sauvegarde en flux continu"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='admin123',
+            role='ADMIN'
+        )
+        self.client.force_authenticate(self.admin)
+        product = Product.objects.create(
+            name='Cahier', barcode='123', sale_price_ht=Decimal('10.00'), stock=100
+        )
+        for _ in range(3):
+            create_sale(self.admin, [{'product_id': product.id, 'quantity': 2}])
+    
+    def test_streaming_xlsx_export(self):
+        """Export Excel : réponse en flux, toutes les ventes exportées"""
+        response = self.client.get('/api/auth/backup/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        
+        wb = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('Produits', wb.sheetnames)
+        sales = list(wb['Ventes'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(len(sales), 3)
+        self.assertEqual(sales[0][5], 'Cahier')
+        self.assertEqual(sales[0][2], 24.0)
+        self.assertTrue(wb['Ventes']['A1'].font.b)
+        # Cellules vides (catégorie, fournisseur) : les colonnes suivantes restent en place
+        product = next(wb['Produits'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(product[3:7], (None, None, 0.0, 10.0))
+    
+    def test_xlsx_starts_before_rows_are_read(self):
+        """Le premier bloc du classeur est envoyé avant la lecture des lignes"""
+        rows = mock.Mock(return_value=iter([[1, 'a']]))
+        stream = exports.stream_xlsx([('test', 'Test', ['ID', 'Nom'], rows)])
+        first = next(stream)
+        self.assertTrue(first.startswith(b'PK'))
+        rows.assert_not_called()
+        wb = load_workbook(BytesIO(first + b''.join(stream)))
+        self.assertEqual(list(wb['Test'].values), [('ID', 'Nom'), (1, 'a')])
+    
+    def test_streaming_csv_zip_export(self):
+        """Export ZIP : un CSV par feuille sélectionnée"""
+        response = self.client.get('/api/auth/backup/', {'output': 'zip', 'users': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        archive = ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertNotIn('Utilisateurs.csv', archive.namelist())
+        lines = archive.read('Ventes.csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('ID Vente;Date'))
+
+
+class NormalizeTest(TestCase):
+    """Tests pour la normalisation des textes de recherche"""
+    
+    def test_french(self):
+        self.assertEqual(normalize("Cahier à SPIRALE — L'Œuvre"), 'cahier a spirale l oeuvre')
+    
+    def test_arabic(self):
+        """Tashkeel supprimé, formes de l'alef et de la hamza unifiées"""
+        self.assertEqual(normalize('الْقُرْآنُ'), normalize('القران'))
+        self.assertEqual(normalize('إسلام أحمد مؤمن'), 'اسلام احمد مومن')
+        self.assertEqual(normalize('مكتبة هدى ١٢٣'), 'مكتبه هدي 123')
+
+
+class BackupTest(TestCase):
+    """Tests pour les sauvegardes incrémentales (core.backups)"""
+    
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.user = User.objects.create_user(username='caisse', password='test123')
+        self.product = Product.objects.create(
+            name='Cahier', barcode='B1', sale_price_ht=Decimal('10.00'), stock=100
+        )
+        create_sale(self.user, [{'product_id': self.product.id, 'quantity': 2}])
+    
+    def _rows(self, manifest, name):
+        with gzip.open(manifest['path'] / manifest['tables'][name]['file'], 'rt') as f:
+            return [json.loads(line) for line in f]
+    
+    def test_incremental_contains_only_changes(self):
+        """La première sauvegarde est complète, la suivante ne contient que les changements"""
+        # La copie SQLite attendrait la fin de la transaction du test
+        with mock.patch.object(backups, '_copy_sqlite') as copy_sqlite:
+            full = backups.run_backup(root=self.root)
+        self.assertEqual(full['kind'], backups.FULL)
+        self.assertEqual(full['tables']['sales']['rows'], 1)
+        copy_sqlite.assert_called_once()
+        
+        Sale.objects.filter(pk=Sale.objects.get().pk).update(updated_at=timezone.now() - timedelta(days=1))
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        full['tables']['sales']['marks']['updated_at'] = (timezone.now() - timedelta(hours=1)).isoformat()
+        create_sale(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+        
+        with mock.patch.object(backups, 'list_backups', return_value=[full]):
+            incremental = backups.run_backup(backups.INCREMENTAL, root=self.root)
+        self.assertEqual(incremental['base'], full['id'])
+        self.assertEqual(incremental['tables']['sales']['rows'], 1)
+        self.assertEqual(incremental['tables']['sale_items']['rows'], 1)
+        self.assertEqual(self._rows(incremental, 'products')[0]['fields']['stock'], 97)
+        self.assertNotIn('sqlite', incremental)
+    
+    @mock.patch.object(backups, '_copy_sqlite')
+    def test_restore_round_trip(self, copy_sqlite):
+        """La restauration recharge les lignes et leurs dates d'origine"""
+        backups.run_backup(root=self.root)
+        sale = Sale.objects.get()
+        created_at = sale.created_at
+        Sale.objects.all().delete()
+        
+        counts = backups.restore(root=self.root, batch_size=1)
+        self.assertEqual(counts['sales'], 1)
+        restored = Sale.objects.get()
+        # Le format JSON de Django arrondit à la milliseconde
+        self.assertAlmostEqual(restored.created_at, created_at, delta=timedelta(milliseconds=1))
+        self.assertEqual(restored.items.count(), 1)
+    
+    def test_retention_keeps_last_full_chains(self):
+        """Les sauvegardes complètes au-delà de la rétention sont supprimées avec leurs incrémentales"""
+        for backup_id, kind in [('1-full', 'full'), ('2-incremental', 'incremental'), ('3-full', 'full')]:
+            path = backups.Path(self.root, backup_id)
+            path.mkdir()
+            (path / backups.MANIFEST).write_text(json.dumps({'id': backup_id, 'kind': kind, 'tables': {}}))
+        
+        self.assertEqual(backups.apply_retention(self.root, keep_full=1), ['1-full', '2-incremental'])
+        self.assertEqual([b['id'] for b in backups.list_backups(self.root)], ['3-full'])
+
+
+class SyncPushTest(TestCase):
+    """Tests pour l'envoi par lots vers le cloud"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='caisse', password='test123')
+        product = Product.objects.create(
+            name='Cahier', barcode='123', sale_price_ht=Decimal('10.00'), stock=100
+        )
+        for _ in range(5):
+            create_sale(self.user, [{'product_id': product.id, 'quantity': 1}])
+        self.service = SyncService()
+        self.service.cloud_url = 'https://cloud.test/api'
+        self.service.sync_token = 'secret'
+        self.service.chunk_size = 2
+    
+    def _response(self, status_code):
+        return mock.Mock(status_code=status_code, text='', content=b'{}', json=lambda: {'ingest_ms': 5.0})
+    
+    def _sent(self, call):
+        """Corps envoyé, décodé selon ses en-têtes."""
+        headers = call.kwargs['headers']
+        body = wire.decompress(call.kwargs['data'], headers.get('Content-Encoding'))
+        return wire.decode(body, headers['Content-Type'])
+    
+    def test_resume_after_failed_chunk(self):
+        """Un lot refusé reste dans l'outbox ; la reprise ne renvoie rien de déjà accepté"""
+        # Création du produit puis, par vente : la vente et son mouvement de stock
+        self.assertEqual(SyncOutbox.objects.count(), 11)
+        
+        with mock.patch('core.sync_service.requests.post') as post:
+            post.side_effect = [self._response(200), self._response(503)]
+            result = self.service.push_to_cloud()
+        
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(result['synced_sales'], 1)
+        self.assertEqual(Sale.objects.filter(synced=True).count(), 1)
+        self.assertEqual(SyncOutbox.objects.count(), 9)
+        self.assertEqual(SyncCursor.objects.get(stream='outbox').last_id, SyncOutbox.objects.first().seq - 1)
+        self.assertFalse(SyncLog.objects.get().success)
+        self.assertIsNone(self.service.get_last_sync_time())
+        
+        with mock.patch('core.sync_service.requests.post') as post:
+            post.return_value = self._response(200)
+            result = self.service.push_to_cloud()
+        
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['synced_sales'], 4)
+        sent = [
+            sale['local_id']
+            for call in post.call_args_list
+            for sale in self._sent(call).get('sales', [])
+        ]
+        self.assertEqual(sent, list(Sale.objects.order_by('pk').values_list('pk', flat=True))[1:])
+        self.assertFalse(SyncOutbox.objects.exists())
+        self.assertFalse(Sale.objects.filter(synced=False).exists())
+        self.assertEqual(self.service.get_last_sync_time(), SyncLog.objects.get(success=True).created_at)
+    
+    def test_outbox_follows_transaction(self):
+        """Une vente annulée n'écrit rien dans l'outbox ; un produit modifié n'est envoyé qu'une fois"""
+        SyncOutbox.objects.all().delete()
+        product = Product.objects.get()
+        with self.assertRaises(Exception):
+            create_sale(self.user, [{'product_id': product.id, 'quantity': 1000}])
+        self.assertFalse(SyncOutbox.objects.exists())
+        
+        product.min_stock = 2
+        product.save()
+        create_sale(self.user, [{'product_id': product.id, 'quantity': 1}])
+        self.service.chunk_size = 10
+        with mock.patch('core.sync_service.requests.post') as post:
+            post.return_value = self._response(200)
+            result = self.service.push_to_cloud()
+        
+        self.assertEqual(result['chunks'], 1)
+        payload = self._sent(post.call_args)
+        self.assertEqual(len(payload['sales']), 1)
+        self.assertEqual(payload['stock_updates'][0]['stock'], 94)
+        self.assertEqual(len(payload['stock_updates']), 1)
+        self.assertEqual(payload['source_store'], 'main')
+    
+    def test_push_records_metrics(self):
+        """Chaque envoi enregistre durées par phase, octets, débit et retard"""
+        SyncOutbox.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        self.service.chunk_size = 100
+        with mock.patch('core.sync_service.requests.post') as post:
+            post.return_value = self._response(200)
+            self.service.push_to_cloud()
+        
+        log = SyncLog.objects.get()
+        self.assertEqual(log.bytes_sent, len(post.call_args.kwargs['data']))
+        self.assertEqual(log.bytes_received, 2)
+        self.assertEqual(log.ingest_ms, 5.0)
+        self.assertGreaterEqual(log.lag_seconds, 300)
+        self.assertGreater(log.rows_per_second, 0)
+        self.assertGreaterEqual(log.duration_ms, log.collect_ms + log.serialize_ms + log.compress_ms)
+    
+    def test_metrics_endpoint(self):
+        """Retard courant, dernière exécution et série agrégée par heure"""
+        admin = User.objects.create_user(username='admin', password='test123', role='ADMIN')
+        for success in (True, False):
+            SyncLog.objects.create(
+                sync_type=SyncLog.SyncType.PUSH, success=success, records_synced=10,
+                duration_ms=200, transfer_ms=150, bytes_sent=1000, lag_seconds=30
+            )
+        SyncOutbox.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        
+        client = APIClient()
+        client.force_authenticate(admin)
+        with self.settings(SYNC_LAG_ALERT_SECONDS=600):
+            response = client.get('/api/auth/sync/metrics/', {'hours': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['lag_alert'])
+        self.assertEqual(response.data['pending'], 11)
+        self.assertEqual(response.data['last_push']['bytes_sent'], 1000)
+        self.assertIsNone(response.data['last_pull'])
+        [point] = response.data['series']
+        self.assertEqual(
+            (point['runs'], point['failures'], point['records'], point['avg_transfer_ms']),
+            (2, 1, 20, 150.0)
+        )
+        
+        response = client.get('/api/auth/sync/metrics/', {'bucket': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SyncReceiveTest(APITestCase):
+    """Tests pour la réception des envois sur le cloud"""
+    
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Cahier', barcode='123', purchase_price=Decimal('6.00'),
+            sale_price_ht=Decimal('10.00'), stock=100
+        )
+        created_at = '2026-01-15T10:00:00+00:00'
+        self.payload = {
+            'source_store': 'casa',
+            'sales': [
+                {
+                    'local_id': local_id, 'created_at': created_at, 'user_username': None,
+                    'total_ht': '10.00', 'total_ttc': '12.00', 'payment_method': 'CASH',
+                    'items': [{
+                        'product_barcode': '123', 'product_name': 'Cahier', 'quantity': 1,
+                        'unit_price_ht': '10.00', 'total_ht': '10.00', 'tva_rate': '20.00'
+                    }]
+                }
+                for local_id in range(1, 21)
+            ],
+            'returns': [{
+                'local_id': 1, 'sale_local_id': 3, 'sale_created_at': created_at,
+                'created_at': created_at, 'reason': 'Défaut', 'total_refund': '12.00',
+                'status': 'COMPLETED', 'items': []
+            }],
+            'stock_updates': [{'barcode': '123', 'stock': 80}],
+        }
+    
+    def _post(self):
+        return self.client.post(
+            '/api/auth/sync/receive/', self.payload, format='json',
+            HTTP_AUTHORIZATION='SyncToken secret'
+        )
+    
+    def test_redelivered_batch_is_idempotent(self):
+        """Un lot renvoyé (ack perdu) ne crée aucun doublon ; requêtes en nombre constant"""
+        with self.settings(SYNC_TOKEN='secret'), self.assertNumQueries(15):
+            response = self._post()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sales_created'], 20)
+        self.assertEqual(response.data['returns_created'], 1)
+        
+        with self.settings(SYNC_TOKEN='secret'):
+            response = self._post()
+        self.assertEqual(response.data['sales_created'], 0)
+        self.assertEqual(response.data['returns_created'], 0)
+        
+        sales = Sale.objects.filter(source_store='casa')
+        self.assertEqual(sales.count(), 20)
+        self.assertEqual(Return.objects.get().sale, sales.get(local_id=3))
+        self.assertEqual(timezone.localtime(sales.first().created_at).date(), date(2026, 1, 15))
+        self.assertEqual(sales.first().items.get().unit_cost, Decimal('6.00'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 80)
+    
+    def test_store_token_sets_store(self):
+        """Un jeton de magasin impose son code, quel que soit source_store"""
+        store = Store.objects.create(code='rabat', name='Rabat')
+        response = self.client.post(
+            '/api/auth/sync/receive/', self.payload, format='json',
+            HTTP_AUTHORIZATION=f'SyncToken {store.sync_token}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Sale.objects.filter(source_store='rabat').count(), 20)
+        self.assertFalse(Sale.objects.filter(source_store='casa').exists())
+        
+        store.active = False
+        store.save()
+        response = self.client.post(
+            '/api/auth/sync/receive/', self.payload, format='json',
+            HTTP_AUTHORIZATION=f'SyncToken {store.sync_token}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_stores_keep_separate_stock(self):
+        """Le stock d'un magasin n'écrase pas celui d'un autre ; Product.stock est la somme"""
+        updated_at = self.product.updated_at
+        with self.settings(SYNC_TOKEN='secret'):
+            self._post()
+            self.payload.update(source_store='rabat', sales=[], returns=[],
+                                stock_updates=[{'barcode': '123', 'stock': 15}])
+            self._post()
+            self.payload['stock_updates'] = [{'barcode': '123', 'stock': 12}]
+            self._post()
+        
+        levels = dict(StoreStock.objects.filter(product=self.product).values_list('store', 'stock'))
+        self.assertEqual(levels, {'casa': 80, 'rabat': 12})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 92)
+        # Stock seul : le produit n'est pas renvoyé aux magasins par les données de référence
+        self.assertEqual(self.product.updated_at, updated_at)
+        self.assertEqual(list(master_data.iter_page('products', updated_at, self.product.pk)), [])
+    
+    def test_receive_compressed_msgpack(self):
+        """Un lot MessagePack en colonnes compressé gzip est accepté"""
+        body = wire.compress(wire.encode(self.payload, wire.MSGPACK), wire.GZIP)
+        with self.settings(SYNC_TOKEN='secret'):
+            response = self.client.generic(
+                'POST', '/api/auth/sync/receive/', body, content_type=wire.MSGPACK,
+                headers={'Authorization': 'SyncToken secret', 'Content-Encoding': wire.GZIP}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sales_created'], 20)
+        self.assertEqual(Sale.objects.get(local_id=1).items.get().product, self.product)
+
+
+class SyncWireTest(TestCase):
+    """Tests pour le format d'échange des synchronisations"""
+    
+    def setUp(self):
+        self.payload = {'sales': [
+            {
+                'local_id': i, 'total_ht': '10.00', 'total_ttc': '12.00', 'payment_method': 'CASH',
+                'created_at': f'2026-01-15T10:{i % 60:02d}:00+00:00', 'user_username': 'caisse',
+                'items': [{
+                    'product_barcode': f'611{i:06d}', 'product_name': 'Cahier 96 pages', 'quantity': 1,
+                    'unit_price_ht': '10.00', 'total_ht': '10.00', 'tva_rate': '20.00', 'unit_cost': '6.00'
+                }] * 3
+            }
+            for i in range(200)
+        ]}
+    
+    def test_columnar_round_trip_and_size(self):
+        """Colonnes + compression : même contenu, au moins dix fois moins d'octets"""
+        plain = wire.encode(self.payload, wire.JSON)
+        packed = wire.compress(wire.encode(self.payload, wire.MSGPACK), wire.GZIP)
+        self.assertEqual(wire.decode(wire.decompress(packed, wire.GZIP), wire.MSGPACK), self.payload)
+        self.assertLess(len(packed) * 10, len(plain))
+    
+    def test_fallback_to_json_on_415(self):
+        """Un cloud qui refuse le format reçoit le lot en JSON non compressé"""
+        service = SyncService()
+        service.cloud_url = 'https://cloud.test/api'
+        service.sync_token = 'secret'
+        with mock.patch('core.sync_service.requests.post') as post:
+            post.side_effect = [mock.Mock(status_code=415, content=b''), mock.Mock(status_code=200, content=b'')]
+            self.assertIsNone(service._post_chunk(self.payload))
+        
+        first, second = post.call_args_list
+        self.assertEqual(first.kwargs['headers']['Content-Type'], wire.MSGPACK)
+        self.assertEqual(second.kwargs['headers']['Content-Type'], wire.JSON)
+        self.assertNotIn('Content-Encoding', second.kwargs['headers'])
+        self.assertEqual(json.loads(second.kwargs['data'])['sales'], self.payload['sales'])
+
+
+class MasterDataSyncTest(APITestCase):
+    """Tests pour la récupération incrémentale des données de référence"""
+    
+    def setUp(self):
+        self.category = Category.objects.create(name='Papeterie')
+        for i in range(5):
+            Product.objects.create(
+                name=f'Produit {i}', barcode=f'B{i}', category=self.category,
+                sale_price_ht=Decimal('10.00'), stock=50
+            )
+    
+    def _get(self, headers=None, **params):
+        headers = {'Authorization': 'SyncToken secret', **(headers or {})}
+        with self.settings(SYNC_TOKEN='secret'):
+            response = self.client.get('/api/auth/sync/master-data/', params, headers=headers)
+            body = wire.decompress(b''.join(response.streaming_content), response.get('Content-Encoding'))
+            return response, wire.decode(body, response['Content-Type'])
+    
+    def test_pages_follow_cursor(self):
+        """Pages ordonnées sur (updated_at, id) ; requêtes en nombre constant"""
+        barcodes = []
+        params = {'entity': 'products', 'limit': 2}
+        while True:
+            with self.assertNumQueries(1):
+                response, page = self._get(**params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            barcodes += [row['barcode'] for row in page['results']]
+            self.assertTrue(all(row['category_name'] == 'Papeterie' for row in page['results']))
+            params.update(page['cursor'])
+            if not page['has_more']:
+                break
+        self.assertEqual(sorted(barcodes), [f'B{i}' for i in range(5)])
+        
+        product = Product.objects.get(barcode='B2')
+        product.sale_price_ht = Decimal('12.00')
+        product.save()
+        _, page = self._get(**params)
+        self.assertEqual([row['barcode'] for row in page['results']], ['B2'])
+    
+    def test_apply_writes_only_changed_rows(self):
+        """Seules les lignes dont l'empreinte diffère sont écrites, en une requête"""
+        rows = [row for _, _, row in master_data.iter_page('products')]
+        self.assertEqual(master_data.apply_rows('products', rows), 0)
+        
+        rows[0]['sale_price_ht'] = '15.00'
+        rows[0]['stock'] = 0
+        rows.append({**rows[1], 'barcode': 'NEW', 'name': 'Nouveau'})
+        for row in (rows[0], rows[-1]):
+            row['digest'] = master_data.row_digest(master_data.ENTITIES['products'], row)
+        
+        with self.assertNumQueries(6):
+            self.assertEqual(master_data.apply_rows('products', rows), 2)
+        
+        changed = Product.objects.get(barcode=rows[0]['barcode'])
+        self.assertEqual(changed.sale_price_ht, Decimal('15.00'))
+        self.assertEqual(changed.stock, 50)  # stock local conservé
+        self.assertEqual(Product.objects.get(barcode='NEW').category, self.category)
+    
+    def test_pull_up_to_date_catalogue(self):
+        """Un catalogue identique ne provoque aucune écriture ; les curseurs avancent"""
+        def fake_get(url, headers, params, timeout):
+            # requests décompresse le corps ; le format reste négocié
+            response, page = self._get(headers=headers, **params)
+            self.assertEqual(response['Content-Type'], wire.MSGPACK)
+            return mock.Mock(
+                status_code=response.status_code,
+                headers={'Content-Type': response['Content-Type']},
+                content=wire.encode(page, wire.MSGPACK)
+            )
+        
+        service = SyncService()
+        service.cloud_url = 'https://cloud.test/api'
+        service.sync_token = 'secret'
+        service.pull_page_size = 2
+        with mock.patch('core.sync_service.requests.get', side_effect=fake_get):
+            result = service.pull_from_cloud()
+        
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['imported_products'], 0)
+        last = Product.objects.order_by('updated_at', 'pk').last()
+        self.assertEqual(SyncCursor.objects.get(stream='pull:products').last_id, last.pk)
+
+
+class SyncDaemonTest(TestCase):
+    """Tests pour le démon de synchronisation"""
+    
+    def setUp(self):
+        self.now = 1000.0
+        self.service = mock.Mock()
+        self.service.outbox_lag.return_value = 0.0
+        self.service.pull_from_cloud.return_value = {'status': 'success'}
+        self.daemon = SyncDaemon(
+            self.service, poll_interval=2, pull_interval=300, max_backoff=60, clock=lambda: self.now
+        )
+    
+    def test_push_only_when_outbox_has_entries(self):
+        """Sans changement en attente, aucun envoi ; la réception suit son propre intervalle"""
+        self.assertEqual(self.daemon.run_once(), 2)
+        self.service.push_to_cloud.assert_not_called()
+        self.assertEqual(self.service.pull_from_cloud.call_count, 1)
+        
+        SyncOutbox.objects.create(stream=SyncOutbox.Stream.SALES, object_id=1)
+        self.service.push_to_cloud.return_value = {'status': 'success'}
+        self.now += 10
+        self.assertEqual(self.daemon.run_once(), 2)
+        self.assertEqual(self.service.push_to_cloud.call_count, 1)
+        self.assertEqual(self.service.pull_from_cloud.call_count, 1)
+    
+    def test_backoff_while_cloud_unreachable(self):
+        """Attente exponentielle bornée tant que l'envoi échoue, puis retour au rythme normal"""
+        SyncOutbox.objects.create(stream=SyncOutbox.Stream.SALES, object_id=1)
+        self.service.push_to_cloud.return_value = {'status': 'error', 'message': 'timeout'}
+        delays = [self.daemon.run_once() for _ in range(8)]
+        for attempt, delay in enumerate(delays, 1):
+            ceiling = min(60, 2 * 2 ** (attempt - 1))
+            self.assertTrue(ceiling / 2 <= delay <= ceiling)
+        self.service.pull_from_cloud.assert_not_called()
+        
+        self.service.push_to_cloud.return_value = {'status': 'success'}
+        self.assertEqual(self.daemon.run_once(), 2)
+        self.assertEqual(self.daemon.failures, 0)
+    
+    def test_exception_backs_off_instead_of_stopping(self):
+        """Une exception pendant le cycle est comptée comme un échec : le démon continue"""
+        self.service.pull_from_cloud.side_effect = ValueError('invalid payload')
+        with self.assertLogs('core.sync_daemon', 'ERROR'):
+            delay = self.daemon.run_once()
+        self.assertTrue(1 <= delay <= 2)
+        self.assertEqual(self.daemon.failures, 1)
+        
+        self.service.pull_from_cloud.side_effect = None
+        self.assertEqual(self.daemon.run_once(), 2)
+        self.assertEqual(self.daemon.failures, 0)
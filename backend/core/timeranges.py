@@ -0,0 +1,52 @@
+"""
+Fenêtres temporelles pour les filtres sur les champs DateTimeField.
+
+Un filtre `created_at__date__gte=...` applique une fonction sur la colonne
+et empêche l'utilisation des index. Ces helpers convertissent des dates
+locales (fuseau du magasin) en intervalles datetime semi-ouverts
+[début, fin[ directement comparables à la colonne indexée.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def day_start(day):
+    """Minuit local (tz-aware) du jour donné."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def local_range(start_date=None, end_date=None):
+    """
+    Retourne (début, fin) pour les jours locaux [start_date, end_date], bornes
+    incluses. La fin est exclusive : minuit du lendemain de end_date.
+    Une borne absente vaut None.
+    """
+    start = day_start(start_date) if start_date else None
+    end = day_start(end_date + timedelta(days=1)) if end_date else None
+    return start, end
+
+
+def range_filter(field, start_date=None, end_date=None):
+    """
+    Lookups ORM pour un filtre par jours locaux, ex. :
+    Sale.objects.filter(**range_filter('created_at', debut, fin))
+    """
+    start, end = local_range(start_date, end_date)
+    lookups = {}
+    if start is not None:
+        lookups[f'{field}__gte'] = start
+    if end is not None:
+        lookups[f'{field}__lt'] = end
+    return lookups
+
+
+def to_date(value):
+    """Convertit une date ou une chaîne AAAA-MM-JJ ; None si invalide."""
+    if isinstance(value, date):
+        return value
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
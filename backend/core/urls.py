@@ -9,7 +9,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .views import UserMeView, UserViewSet, AppSettingsView, PublicSettingsView, CustomTokenObtainPairView, DatabaseExportView
-from .sync_api import receive_sync_data, get_master_data, sync_status, trigger_sync
+from .sync_api import receive_sync_data, get_master_data, sync_status, sync_metrics_view, trigger_sync
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -90,6 +90,7 @@ urlpatterns = [
     path('sync/receive/', receive_sync_data, name='sync_receive'),
     path('sync/master-data/', get_master_data, name='sync_master_data'),
     path('sync/status/', sync_status, name='sync_status'),
+    path('sync/metrics/', sync_metrics_view, name='sync_metrics'),
     path('sync/trigger/', trigger_sync, name='sync_trigger'),
     
     # User management (admin)
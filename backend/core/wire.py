@@ -0,0 +1,212 @@
+"""
+Format d'échange des synchronisations LOCAL ↔ CLOUD.
+
+Deux formats de corps :
+- json : JSON classique (toujours disponible, format de repli) ;
+- msgpack : MessagePack en colonnes — chaque liste d'objets devient
+  {"__columns__": [...], "__rows__": [[...], ...]} : les clés ne sont
+  transmises qu'une fois par table.
+
+Deux compressions (en-tête Content-Encoding) : gzip (bibliothèque
+standard) et zstd (si le paquet `zstandard` est installé).
+msgpack et zstandard sont optionnels : sans eux, on se replie sur JSON
+et gzip. Le cloud répond 415 à un format qu'il ne sait pas lire ; le
+client renvoie alors le lot en JSON.
+"""
+import json
+import zlib
+
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.parsers import BaseParser
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+IDENTITY = 'identity'
+
+COLUMNS = '__columns__'
+ROWS = '__rows__'
+
+# Taille maximale d'un corps décompressé (protection contre les bombes)
+MAX_DECODED_SIZE = 64 * 1024 * 1024
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def available_formats():
+    """Formats de corps utilisables ici, du plus compact au plus simple."""
+    return [MSGPACK, JSON] if _msgpack() else [JSON]
+
+
+def available_encodings():
+    """Compressions utilisables ici, de la plus efficace à la plus courante."""
+    return [ZSTD, GZIP] if _zstandard() else [GZIP]
+
+
+# ---- Encodage en colonnes ----
+
+def to_columnar(value):
+    """Remplace récursivement chaque liste d'objets par une table en colonnes."""
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            columns = list(dict.fromkeys(key for item in value for key in item))
+            return {
+                COLUMNS: columns,
+                ROWS: [[to_columnar(item.get(column)) for column in columns] for item in value],
+            }
+        return [to_columnar(item) for item in value]
+    return value
+
+
+def from_columnar(value):
+    """Inverse de to_columnar."""
+    if isinstance(value, dict):
+        if COLUMNS in value and ROWS in value:
+            columns = value[COLUMNS]
+            return [
+                {column: from_columnar(item) for column, item in zip(columns, row)}
+                for row in value[ROWS]
+            ]
+        return {key: from_columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_columnar(item) for item in value]
+    return value
+
+
+# ---- Corps et compression ----
+
+def encode(data, content_type=JSON):
+    """Sérialise un objet dans le format demandé (bytes)."""
+    if content_type == MSGPACK:
+        return _msgpack().packb(to_columnar(data), use_bin_type=True)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def decode(body, content_type=JSON):
+    if content_type == MSGPACK:
+        return from_columnar(_msgpack().unpackb(body, raw=False))
+    return json.loads(body)
+
+
+def compressor(encoding):
+    """Objet compress()/flush() pour une compression en flux."""
+    if encoding == ZSTD:
+        return _zstandard().ZstdCompressor(level=10).compressobj()
+    if encoding == GZIP:
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    return None
+
+
+def compress(body, encoding):
+    comp = compressor(encoding)
+    if comp is None:
+        return body
+    return comp.compress(body) + comp.flush()
+
+
+def compress_stream(chunks, encoding):
+    """Compresse au fil de l'eau un itérable de morceaux (str ou bytes)."""
+    comp = compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if comp is None:
+            yield chunk
+            continue
+        block = comp.compress(chunk)
+        if block:
+            yield block
+    if comp is not None:
+        yield comp.flush()
+
+
+def decompress(body, encoding):
+    """Décompresse un corps reçu ; lève ValueError si trop volumineux."""
+    if not encoding or encoding == IDENTITY:
+        return body
+    if encoding == GZIP:
+        decompressor = zlib.decompressobj(47)
+        data = decompressor.decompress(body, MAX_DECODED_SIZE + 1)
+    elif encoding == ZSTD and _zstandard():
+        data = _zstandard().ZstdDecompressor().decompress(body, max_output_size=MAX_DECODED_SIZE + 1)
+    else:
+        raise LookupError(encoding)
+    if len(data) > MAX_DECODED_SIZE:
+        raise ValueError('Decoded body too large')
+    return data
+
+
+# ---- Négociation côté cloud ----
+
+def _accepted(header):
+    return [part.split(';')[0].strip().lower() for part in (header or '').split(',') if part.strip()]
+
+
+def negotiate(request):
+    """(format, compression) de la réponse selon Accept / Accept-Encoding."""
+    accepted = _accepted(request.META.get('HTTP_ACCEPT'))
+    content_type = next((f for f in available_formats() if f in accepted), JSON)
+    accepted = _accepted(request.META.get('HTTP_ACCEPT_ENCODING'))
+    encoding = next((e for e in available_encodings() if e in accepted), IDENTITY)
+    return content_type, encoding
+
+
+# ---- Parseurs DRF ----
+
+class _DecompressingParser(BaseParser):
+    """Décompresse le corps selon Content-Encoding avant de le décoder."""
+
+    def read(self, stream, parser_context):
+        request = parser_context['request']
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        try:
+            return decompress(stream.read(), encoding)
+        except LookupError:
+            raise UnsupportedMediaType(f'Content-Encoding {encoding}')
+        except (ValueError, zlib.error) as e:
+            raise ParseError(f'Invalid compressed body: {e}')
+
+
+class SyncJSONParser(_DecompressingParser):
+    """JSON, éventuellement compressé"""
+    media_type = JSON
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return json.loads(self.read(stream, parser_context))
+        except ValueError as e:
+            raise ParseError(f'JSON parse error - {e}')
+
+
+class SyncMsgpackParser(_DecompressingParser):
+    """MessagePack en colonnes, éventuellement compressé"""
+    media_type = MSGPACK
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not _msgpack():
+            raise UnsupportedMediaType(media_type)
+        try:
+            return decode(self.read(stream, parser_context), MSGPACK)
+        except ValueError as e:
+            raise ParseError(f'MessagePack parse error - {e}')
+
+
+SYNC_PARSERS = [SyncJSONParser, SyncMsgpackParser]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, Supplier, StockMovement
+from .models import Category, Product, Supplier, StockMovement, ImportJob, StoreStock
 
 
 @admin.register(Category)
@@ -50,3 +50,19 @@ class StockMovementAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False  # Stock movements shouldn't be modified
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'original_name', 'mode', 'status', 'processed_rows', 'total_rows', 'created_count', 'updated_count', 'error_count', 'created_by', 'created_at')
+    list_filter = ('status', 'mode', 'created_at')
+    ordering = ('-created_at',)
+    readonly_fields = ('started_at', 'finished_at', 'created_at')
+
+
+@admin.register(StoreStock)
+class StoreStockAdmin(admin.ModelAdmin):
+    list_display = ('product', 'store', 'stock', 'updated_at')
+    list_filter = ('store',)
+    search_fields = ('product__name', 'product__barcode')
+    raw_id_fields = ('product',)
@@ -0,0 +1,262 @@
+"""
+Index en mémoire pour l'autocomplétion du POS (nom ou début de code-barres
+saisi quand le scanner échoue).
+
+Trois tableaux triés de (clé, product_id), interrogés par bisect :
+- codes-barres ;
+- noms normalisés complets (core.normalize) ;
+- chaque mot des noms normalisés.
+
+Une recherche coûte une dichotomie puis la lecture des N premières clés
+du préfixe : quelques microsecondes, quelle que soit la taille du
+catalogue. Seuls les produits actifs y figurent.
+
+L'index est construit au premier appel, en une requête values_list (la
+base n'est pas accessible dans AppConfig.ready), puis tenu à jour :
+- dans ce processus, par les signaux de Product (save/delete) et
+  stock_changed ;
+- pour les écritures des autres processus (workers, imports,
+  synchronisation), par une requête sur updated_at au plus toutes les
+  AUTOCOMPLETE_SYNC_INTERVAL secondes ; l'index est reconstruit toutes
+  les AUTOCOMPLETE_REBUILD_INTERVAL secondes (suppressions, et stock reçu
+  des magasins par le cloud, qui ne modifie pas updated_at).
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Max
+
+from core.normalize import normalize, search_terms
+from .barcode_cache import _to_entry
+from .models import Product
+
+FIELDS = ('id', 'name', 'barcode', 'price_ttc', 'tva', 'stock', 'image')
+
+_VALUES = ('id', 'name', 'barcode', 'sale_price_ht', 'tva', 'stock', 'image', 'active')
+
+# Candidats examinés au plus pour une recherche de plusieurs mots
+MAX_SCAN = 2000
+
+
+def _entry(pk, name, barcode, sale_price_ht, tva, stock, image):
+    pk, name, price_ttc, tva, stock = _to_entry(pk, name, sale_price_ht, tva, stock)
+    return (pk, name, barcode, price_ttc, tva, stock, image or '')
+
+
+def _remove(array, key):
+    index = bisect_left(array, key)
+    if index < len(array) and array[index] == key:
+        del array[index]
+
+
+def _prefixed(array, prefix):
+    """product_id des clés commençant par `prefix`, dans l'ordre des clés."""
+    index = bisect_left(array, (prefix,))
+    while index < len(array) and array[index][0].startswith(prefix):
+        yield array[index][1]
+        index += 1
+
+
+class ProductIndex:
+    """Index de préfixes des produits actifs (noms normalisés et codes-barres)."""
+
+    def __init__(self, sync_interval=None, rebuild_interval=None, clock=time.monotonic):
+        self.sync_interval = sync_interval if sync_interval is not None else getattr(
+            settings, 'AUTOCOMPLETE_SYNC_INTERVAL', 5)
+        self.rebuild_interval = rebuild_interval if rebuild_interval is not None else getattr(
+            settings, 'AUTOCOMPLETE_REBUILD_INTERVAL', 3600)
+        self.clock = clock
+        self._lock = threading.RLock()
+        # Un seul appelant recharge l'index (build / sync) à la fois
+        self._refresh_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}   # product_id -> entry
+        self._keys = {}      # product_id -> (barcode, nom normalisé, mots)
+        self._barcodes = []
+        self._names = []
+        self._words = []
+        self._built_at = None
+        self._synced_at = None
+        self._high_water = None
+
+    # ---- Écriture ----
+
+    def _index_keys(self, entry):
+        pk, name, barcode = entry[:3]
+        normalized = normalize(name)
+        keys = (barcode, normalized, tuple(set(normalized.split())))
+        self._entries[pk] = entry
+        self._keys[pk] = keys
+        return keys
+
+    def _insert(self, entry):
+        pk = entry[0]
+        self._discard(pk)
+        barcode, normalized, words = self._index_keys(entry)
+        insort(self._barcodes, (barcode, pk))
+        insort(self._names, (normalized, pk))
+        for word in words:
+            insort(self._words, (word, pk))
+
+    def _discard(self, pk):
+        keys = self._keys.pop(pk, None)
+        if keys is None:
+            return
+        barcode, normalized, words = keys
+        self._entries.pop(pk, None)
+        _remove(self._barcodes, (barcode, pk))
+        _remove(self._names, (normalized, pk))
+        for word in words:
+            _remove(self._words, (word, pk))
+
+    def _apply_rows(self, rows):
+        for *values, active in rows:
+            if active:
+                self._insert(_entry(*values))
+            else:
+                self._discard(values[0])
+
+    def build(self):
+        """Charge tous les produits actifs (une requête)."""
+        # Marque lue avant les lignes : une modification concurrente sera relue par sync()
+        high_water = Product.objects.aggregate(m=Max('updated_at'))['m']
+        rows = Product.objects.filter(active=True).values_list(*_VALUES[:-1])
+        entries = [_entry(*row) for row in rows.iterator(chunk_size=5000)]
+        with self._lock:
+            self._reset()
+            for entry in entries:
+                pk = entry[0]
+                barcode, normalized, words = self._index_keys(entry)
+                self._barcodes.append((barcode, pk))
+                self._names.append((normalized, pk))
+                self._words.extend((word, pk) for word in words)
+            # Un seul tri par tableau plutôt que des insertions successives
+            self._barcodes.sort()
+            self._names.sort()
+            self._words.sort()
+            self._built_at = self._synced_at = self.clock()
+            self._high_water = high_water
+
+    def sync(self):
+        """Applique les produits modifiés depuis la dernière lecture (autres processus)."""
+        queryset = Product.objects.order_by('updated_at')
+        if self._high_water is not None:
+            queryset = queryset.filter(updated_at__gte=self._high_water)
+        rows = list(queryset.values_list(*_VALUES, 'updated_at'))
+        with self._lock:
+            self._apply_rows(row[:-1] for row in rows)
+            if rows:
+                self._high_water = rows[-1][-1]
+            self._synced_at = self.clock()
+
+    def _refresh_if_stale(self):
+        now = self.clock()
+        if self._built_at is None or now - self._built_at >= self.rebuild_interval:
+            self.build()
+        elif now - self._synced_at >= self.sync_interval:
+            self.sync()
+
+    def _is_stale(self):
+        now = self.clock()
+        return (self._built_at is None or now - self._built_at >= self.rebuild_interval
+                or now - self._synced_at >= self.sync_interval)
+
+    def _ensure_fresh(self):
+        """Un seul appelant recharge l'index ; l'état est revérifié une fois le verrou obtenu."""
+        if not self._is_stale():
+            return
+        if self._built_at is None:
+            # Premier appel : attendre la construction (une seule requête, même en concurrence)
+            with self._refresh_lock:
+                self._refresh_if_stale()
+        elif self._refresh_lock.acquire(blocking=False):
+            # Les autres appelants servent l'index courant pendant le rechargement
+            try:
+                self._refresh_if_stale()
+            finally:
+                self._refresh_lock.release()
+
+    def update(self, product):
+        """Ajoute, met à jour ou retire un produit (signal post_save)."""
+        if self._built_at is None:
+            return
+        with self._lock:
+            if product.active:
+                # Valeurs de l'instance : le défaut de tva est un float tant qu'elle n'est pas relue
+                self._insert(_entry(
+                    product.pk, product.name, product.barcode, Decimal(str(product.sale_price_ht)),
+                    Decimal(str(product.tva)), product.stock, product.image.name if product.image else ''
+                ))
+            else:
+                self._discard(product.pk)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._discard(product_id)
+
+    def update_stock(self, levels):
+        """Met à jour le stock des produits indexés : {product_id: stock}."""
+        with self._lock:
+            for pk, stock in levels.items():
+                entry = self._entries.get(pk)
+                if entry is not None:
+                    self._entries[pk] = entry[:5] + (stock,) + entry[6:]
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    # ---- Lecture ----
+
+    def lookup(self, query, limit=10):
+        """
+        Jusqu'à `limit` produits : début de code-barres, puis noms
+        commençant par la saisie, puis noms dont chaque mot saisi
+        commence un mot.
+        """
+        self._ensure_fresh()
+        terms = search_terms(query)
+        if not terms:
+            return []
+        phrase = ' '.join(terms)
+        results, seen = [], set()
+
+        def take(product_ids, matches=None, scan=None):
+            for scanned, pk in enumerate(product_ids):
+                if scan is not None and scanned >= scan:
+                    return
+                if pk in seen or (matches is not None and not matches(pk)):
+                    continue
+                seen.add(pk)
+                results.append(self._entries[pk])
+                if len(results) >= limit:
+                    return
+
+        with self._lock:
+            raw = query.strip()
+            if raw:
+                take(_prefixed(self._barcodes, raw))
+            if len(results) < limit:
+                take(_prefixed(self._names, phrase))
+            if len(results) < limit:
+                first, others = max(terms, key=len), terms
+                take(
+                    _prefixed(self._words, first),
+                    lambda pk: all(
+                        any(word.startswith(term) for word in self._keys[pk][2]) for term in others
+                    ),
+                    scan=MAX_SCAN,
+                )
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Singleton instance
+product_index = ProductIndex()
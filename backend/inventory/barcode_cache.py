@@ -0,0 +1,213 @@
+"""
+Cache de résolution code-barres → produit pour le scan en caisse.
+
+Deux niveaux :
+- mémoire (LRU borné, par processus) ;
+- Redis optionnel, partagé entre workers, si REDIS_URL est défini.
+
+Chaque entrée est un tuple compact (id, name, price_ttc, tva, stock).
+Les entrées sont invalidées par les signaux de Product (save/delete) et
+mises à jour par le registre de stock (signal stock_changed).
+
+Une invalidation ne touche que la mémoire du processus qui l'effectue :
+- avec Redis, elle incrémente aussi un compteur de génération ; les
+  autres processus le relisent au plus toutes les
+  BARCODE_CACHE_SYNC_INTERVAL secondes et vident leur mémoire s'il a
+  changé (un prix modifié n'est pas facturé à l'ancien prix) ;
+- sans Redis, les entrées en mémoire expirent après
+  BARCODE_CACHE_LOCAL_TTL secondes.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+REDIS_PREFIX = 'libtak:barcode:'
+GENERATION_KEY = 'libtak:barcode-generation'
+FIELDS = ('id', 'name', 'price_ttc', 'tva', 'stock')
+
+
+def _to_entry(pk, name, sale_price_ht, tva, stock):
+    price_ttc = (sale_price_ht * (1 + tva / 100)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return (pk, name, float(price_ttc), float(tva), stock)
+
+
+class BarcodeCache:
+    """LRU borné en mémoire, avec un niveau Redis optionnel."""
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize or getattr(settings, 'BARCODE_CACHE_SIZE', 50000)
+        self.ttl = ttl or getattr(settings, 'BARCODE_CACHE_TTL', 300)
+        self._entries = OrderedDict()  # barcode -> (expires_at, entry)
+        self._barcodes = {}            # product_id -> barcode
+        self._lock = threading.Lock()
+        self.local_ttl = getattr(settings, 'BARCODE_CACHE_LOCAL_TTL', 5)
+        self.sync_interval = getattr(settings, 'BARCODE_CACHE_SYNC_INTERVAL', 1)
+        self._redis = None
+        self._redis_checked = False
+        self._generation = None
+        self._generation_checked_at = None
+
+    # ---- Redis ----
+
+    def _get_redis(self):
+        if not self._redis_checked:
+            self._redis_checked = True
+            redis_url = getattr(settings, 'REDIS_URL', '')
+            if redis_url:
+                try:
+                    import redis
+                    self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.05)
+                except Exception as e:
+                    logger.warning(f"Cache code-barres Redis désactivé: {e}")
+        return self._redis
+
+    def _redis_get(self, barcode):
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            raw = client.get(REDIS_PREFIX + barcode)
+            return tuple(json.loads(raw)) if raw else None
+        except Exception:
+            return None
+
+    def _redis_set(self, barcode, entry):
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            client.set(REDIS_PREFIX + barcode, json.dumps(entry), ex=self.ttl)
+        except Exception:
+            pass
+
+    def _redis_delete(self, barcodes, publish=False):
+        """Supprime les entrées Redis ; `publish` signale l'invalidation aux autres processus."""
+        client = self._get_redis()
+        if client is None or not barcodes:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.delete(*[REDIS_PREFIX + b for b in barcodes])
+            if publish:
+                pipe.incr(GENERATION_KEY)
+            results = pipe.execute()
+            if publish:
+                # Propre invalidation : déjà appliquée à la mémoire de ce processus
+                with self._lock:
+                    if self._generation == results[-1] - 1:
+                        self._generation = results[-1]
+        except Exception:
+            pass
+
+    def _check_generation(self):
+        """Vide la mémoire si un autre processus a invalidé des entrées depuis la dernière lecture."""
+        client = self._get_redis()
+        if client is None:
+            return
+        now = time.monotonic()
+        if self._generation_checked_at is not None and now - self._generation_checked_at < self.sync_interval:
+            return
+        try:
+            generation = int(client.get(GENERATION_KEY) or 0)
+        except Exception:
+            # Génération inconnue : ne rien servir de la mémoire
+            generation = None
+        with self._lock:
+            if generation is None or generation != self._generation:
+                self._entries.clear()
+                self._barcodes.clear()
+            self._generation = generation
+            self._generation_checked_at = now
+
+    # ---- Mémoire ----
+
+    def _remember(self, barcode, entry):
+        ttl = self.ttl if self._get_redis() is not None else min(self.ttl, self.local_ttl)
+        with self._lock:
+            self._entries[barcode] = (time.monotonic() + ttl, entry)
+            self._entries.move_to_end(barcode)
+            self._barcodes[entry[0]] = barcode
+            while len(self._entries) > self.maxsize:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._barcodes.pop(evicted[0], None)
+
+    def _forget(self, barcode):
+        entry = self._entries.pop(barcode, None)
+        if entry is not None:
+            self._barcodes.pop(entry[1][0], None)
+
+    # ---- API ----
+
+    def get(self, barcode):
+        """Retourne le tuple (id, name, price_ttc, tva, stock) ou None."""
+        self._check_generation()
+        with self._lock:
+            cached = self._entries.get(barcode)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._entries.move_to_end(barcode)
+                    return cached[1]
+                self._forget(barcode)
+
+        entry = self._redis_get(barcode)
+        if entry is None:
+            row = Product.objects.filter(barcode=barcode, active=True).values_list(
+                'id', 'name', 'sale_price_ht', 'tva', 'stock'
+            ).first()
+            if row is None:
+                return None
+            entry = _to_entry(*row)
+            self._redis_set(barcode, entry)
+
+        self._remember(barcode, entry)
+        return entry
+
+    def invalidate(self, product_id=None, barcode=None):
+        """Supprime l'entrée d'un produit (ancien et nouveau code-barres)."""
+        self.invalidate_many([(product_id, barcode)])
+
+    def invalidate_many(self, products):
+        """Supprime les entrées de plusieurs produits : [(product_id, barcode)], une écriture Redis."""
+        barcodes = set()
+        with self._lock:
+            for product_id, barcode in products:
+                barcodes.update(b for b in (barcode, self._barcodes.get(product_id)) if b)
+            for b in barcodes:
+                self._forget(b)
+        self._redis_delete(barcodes, publish=True)
+
+    def update_stock(self, levels):
+        """Met à jour le stock des entrées en cache : {product_id: stock}."""
+        stale = []
+        with self._lock:
+            for product_id, stock in levels.items():
+                barcode = self._barcodes.get(product_id)
+                if barcode is None:
+                    continue
+                expires_at, entry = self._entries[barcode]
+                self._entries[barcode] = (expires_at, entry[:4] + (stock,))
+                stale.append(barcode)
+
+        if self._get_redis() is not None:
+            missing = [pk for pk in levels if pk not in self._barcodes]
+            if missing:
+                stale += list(Product.objects.filter(pk__in=missing).values_list('barcode', flat=True))
+            self._redis_delete(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._barcodes.clear()
+
+
+# Singleton instance
+barcode_cache = BarcodeCache()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_inventorycount_purchaseorder_purchaseorderitem_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'created_at'], name='inventory_s_product_5919a9_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_stockmovement_inventory_s_product_5919a9_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/', verbose_name='File')),
+                ('original_name', models.CharField(blank=True, max_length=255, verbose_name='Original Name')),
+                ('mode', models.CharField(default='create', max_length=10, verbose_name='Mode')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('SUCCESS', 'Success'), ('FAILED', 'Failed')], default='PENDING', max_length=10, verbose_name='Status')),
+                ('total_rows', models.IntegerField(default=0, verbose_name='Total Rows')),
+                ('processed_rows', models.IntegerField(default=0, verbose_name='Processed Rows')),
+                ('created_count', models.IntegerField(default=0, verbose_name='Created')),
+                ('updated_count', models.IntegerField(default=0, verbose_name='Updated')),
+                ('skipped_count', models.IntegerField(default=0, verbose_name='Skipped')),
+                ('error_count', models.IntegerField(default=0, verbose_name='Errors')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Error Details')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Created By')),
+            ],
+            options={
+                'verbose_name': 'Import Job',
+                'verbose_name_plural': 'Import Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
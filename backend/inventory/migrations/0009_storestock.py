@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_category_updated_at_product_updated_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('store', models.CharField(max_length=50, verbose_name='Store')),
+                ('stock', models.IntegerField(default=0, verbose_name='Stock')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='store_stocks', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Store Stock',
+                'verbose_name_plural': 'Store Stocks',
+                'ordering': ['store', 'product'],
+                'constraints': [models.UniqueConstraint(fields=('store', 'product'), name='unique_store_product_stock')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def flag_low_stock(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Product.objects.filter(stock__lte=F('min_stock')).update(is_low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_storestock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Low Stock'),
+        ),
+        migrations.RunPython(flag_low_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['stock'], name='product_low_stock_idx'),
+        ),
+    ]
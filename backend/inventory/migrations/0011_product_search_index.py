@@ -0,0 +1,88 @@
+# Index de recherche plein texte des produits (voir inventory.search)
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'inventory_product_fts'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, barcode, description,
+        content='inventory_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER inventory_product_fts_ai AFTER INSERT ON inventory_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, barcode, description)
+        VALUES (new.id, new.name, new.barcode, new.description);
+    END""",
+    f"""CREATE TRIGGER inventory_product_fts_ad AFTER DELETE ON inventory_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, barcode, description)
+        VALUES ('delete', old.id, old.name, old.barcode, old.description);
+    END""",
+    f"""CREATE TRIGGER inventory_product_fts_au AFTER UPDATE OF name, barcode, description ON inventory_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, barcode, description)
+        VALUES ('delete', old.id, old.name, old.barcode, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, barcode, description)
+        VALUES (new.id, new.name, new.barcode, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS inventory_product_fts_ai",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_ad",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# Même expression que inventory.search.PG_DOCUMENT
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """CREATE INDEX IF NOT EXISTS product_search_idx ON inventory_product USING gin (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(barcode, '')
+        || ' ' || coalesce(description, ''))
+    )""",
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON inventory_product USING gin (UPPER(name::text) gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS product_search_idx",
+    "DROP INDEX IF EXISTS product_name_trgm_idx",
+]
+
+
+def _execute(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_FORWARD)
+    elif vendor == 'sqlite':
+        try:
+            _execute(schema_editor, SQLITE_FORWARD[:1])
+        except OperationalError:
+            # SQLite compilé sans FTS5 : la recherche se replie sur icontains
+            return
+        _execute(schema_editor, SQLITE_FORWARD[1:])
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_REVERSE)
+    elif vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_product_is_low_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,122 @@
+# Clés de recherche normalisées (core.normalize) ; l'index plein texte des
+# produits porte désormais sur search_key et le code-barres.
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+from core.normalize import search_key
+
+previous = import_module('inventory.migrations.0011_product_search_index')
+
+FTS_TABLE = 'inventory_product_fts'
+
+# Ajouter une colonne reconstruit la table sous SQLite : les triggers de
+# 0011 sont supprimés avec l'ancienne table et recréés ici
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        search_key, barcode,
+        content='inventory_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER inventory_product_fts_ai AFTER INSERT ON inventory_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_key, barcode) VALUES (new.id, new.search_key, new.barcode);
+    END""",
+    f"""CREATE TRIGGER inventory_product_fts_ad AFTER DELETE ON inventory_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_key, barcode)
+        VALUES ('delete', old.id, old.search_key, old.barcode);
+    END""",
+    f"""CREATE TRIGGER inventory_product_fts_au AFTER UPDATE OF search_key, barcode ON inventory_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_key, barcode)
+        VALUES ('delete', old.id, old.search_key, old.barcode);
+        INSERT INTO {FTS_TABLE}(rowid, search_key, barcode) VALUES (new.id, new.search_key, new.barcode);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+# Même expression que inventory.search.PG_DOCUMENT
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """CREATE INDEX IF NOT EXISTS product_search_key_idx ON inventory_product USING gin (
+        to_tsvector('simple', coalesce(search_key, '') || ' ' || coalesce(barcode, ''))
+    )""",
+    "CREATE INDEX IF NOT EXISTS product_search_key_trgm_idx ON inventory_product USING gin (search_key gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS category_search_key_trgm_idx ON inventory_category USING gin (search_key gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS supplier_search_key_trgm_idx ON inventory_supplier USING gin (search_key gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS product_search_key_idx",
+    "DROP INDEX IF EXISTS product_search_key_trgm_idx",
+    "DROP INDEX IF EXISTS category_search_key_trgm_idx",
+    "DROP INDEX IF EXISTS supplier_search_key_trgm_idx",
+]
+
+SEARCH_KEY_FIELDS = {
+    'Product': ('name', 'description'),
+    'Category': ('name',),
+    'Supplier': ('name', 'contact_name', 'email', 'phone'),
+}
+
+
+def fill_search_keys(apps, schema_editor):
+    for model_name, fields in SEARCH_KEY_FIELDS.items():
+        model = apps.get_model('inventory', model_name)
+        batch = []
+        for obj in model.objects.only(*fields).iterator(chunk_size=2000):
+            obj.search_key = search_key(*(getattr(obj, field) for field in fields))
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['search_key'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['search_key'])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        previous._execute(schema_editor, POSTGRES_FORWARD)
+    elif vendor == 'sqlite':
+        try:
+            previous._execute(schema_editor, SQLITE_FORWARD[:1])
+        except OperationalError:
+            return
+        previous._execute(schema_editor, SQLITE_FORWARD[1:])
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        previous._execute(schema_editor, POSTGRES_REVERSE)
+    elif vendor == 'sqlite':
+        previous._execute(schema_editor, previous.SQLITE_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(previous.drop_search_index, previous.create_search_index),
+        migrations.AddField(
+            model_name='category',
+            name='search_key',
+            field=models.TextField(blank=True, editable=False, verbose_name='Search key'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_key',
+            field=models.TextField(blank=True, editable=False, verbose_name='Search key'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='search_key',
+            field=models.TextField(blank=True, editable=False, verbose_name='Search key'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
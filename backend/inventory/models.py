@@ -1,9 +1,31 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from core.normalize import search_key
 
-class Supplier(models.Model):
+
+class SearchKeyMixin:
+    """
+    Maintient `search_key` (texte normalisé de `search_key_fields`, voir
+    core.normalize) à chaque save() ; les écritures en masse appellent
+    build_search_key() elles-mêmes.
+    """
+    search_key_fields = ()
+
+    def build_search_key(self):
+        return search_key(*(getattr(self, field) for field in self.search_key_fields))
+
+    def save(self, *args, **kwargs):
+        self.search_key = self.build_search_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(self.search_key_fields) & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_key'}
+        super().save(*args, **kwargs)
+
+
+class Supplier(SearchKeyMixin, models.Model):
     """Fournisseur de produits"""
     name = models.CharField(_('Name'), max_length=200)
     contact_name = models.CharField(_('Contact Name'), max_length=100, blank=True)
@@ -13,9 +35,12 @@ class Supplier(models.Model):
     notes = models.TextField(_('Notes'), blank=True)
     active = models.BooleanField(_('Active'), default=True)
     image = models.ImageField(_('Image'), upload_to='suppliers/', blank=True, null=True)
+    search_key = models.TextField(_('Search key'), blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    search_key_fields = ('name', 'contact_name', 'email', 'phone')
+
     class Meta:
         verbose_name = _('Supplier')
         verbose_name_plural = _('Suppliers')
@@ -25,12 +50,16 @@ class Supplier(models.Model):
         return self.name
 
 
-class Category(models.Model):
+class Category(SearchKeyMixin, models.Model):
     """Catégorie de produits"""
     name = models.CharField(_('Name'), max_length=100)
     description = models.TextField(_('Description'), blank=True)
     icon = models.CharField(_('Icon'), max_length=50, blank=True, help_text="Lucide icon name")
     color = models.CharField(_('Color'), max_length=7, blank=True, help_text="Hex color code")
+    search_key = models.TextField(_('Search key'), blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    search_key_fields = ('name',)
 
     class Meta:
         verbose_name = _('Category')
@@ -41,11 +70,13 @@ class Category(models.Model):
         return self.name
 
 
-class Product(models.Model):
+class Product(SearchKeyMixin, models.Model):
     """Produit avec prix d'achat et de vente"""
     name = models.CharField(_('Name'), max_length=200)
     barcode = models.CharField(_('Barcode'), max_length=50, unique=True, db_index=True)
     description = models.TextField(_('Description'), blank=True)
+    # Nom et description normalisés, indexés pour la recherche (inventory.search)
+    search_key = models.TextField(_('Search key'), blank=True, editable=False)
     
     # Prix
     purchase_price = models.DecimalField(
@@ -71,6 +102,8 @@ class Product(models.Model):
     # Stock
     stock = models.IntegerField(_('Stock'), default=0)
     min_stock = models.IntegerField(_('Min Stock'), default=5)
+    # stock <= min_stock, tenu à jour par save() et le registre de stock
+    is_low_stock = models.BooleanField(_('Low Stock'), default=False, editable=False)
     
     # Relations
     category = models.ForeignKey(
@@ -102,6 +135,8 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    search_key_fields = ('name', 'description')
+
     class Meta:
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
@@ -109,11 +144,34 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['name']),
             models.Index(fields=['barcode']),
+            models.Index(fields=['updated_at', 'id']),
+            # Index partiel : seuls les produits en stock bas y figurent
+            models.Index(
+                fields=['stock'], name='product_low_stock_idx',
+                condition=models.Q(is_low_stock=True)
+            ),
         ]
 
     def __str__(self):
         return f"{self.name} ({self.barcode})"
 
+    def save(self, *args, **kwargs):
+        """Recalcule is_low_stock ; un produit existant qui passe sous le seuil déclenche une alerte."""
+        crossed = (
+            not self._state.adding and not self.is_low_stock
+            and self.stock <= self.min_stock
+        )
+        self.is_low_stock = self.stock <= self.min_stock
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'stock', 'min_stock'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'is_low_stock'}
+        super().save(*args, **kwargs)
+        if crossed:
+            from .signals import low_stock_reached
+            transaction.on_commit(
+                lambda: low_stock_reached.send(sender=Product, product_ids=[self.pk])
+            )
+
     @property
     def price_ttc(self):
         """Prix de vente TTC"""
@@ -135,11 +193,32 @@ class Product(models.Model):
     def stock_value(self):
         """Valeur du stock au prix d'achat"""
         return self.stock * self.purchase_price
-    
-    @property
-    def is_low_stock(self):
-        """Vérifie si le stock est bas"""
-        return self.stock <= self.min_stock
+
+
+class StoreStock(models.Model):
+    """
+    Stock d'un produit dans un magasin, tel que déclaré par sa synchronisation
+    (serveur cloud). Product.stock y est la somme des magasins.
+    """
+    store = models.CharField(_('Store'), max_length=50)
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='store_stocks'
+    )
+    stock = models.IntegerField(_('Stock'), default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Store Stock')
+        verbose_name_plural = _('Store Stocks')
+        ordering = ['store', 'product']
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'product'], name='unique_store_product_stock'),
+        ]
+
+    def __str__(self):
+        return f"{self.store} - {self.product.name}: {self.stock}"
 
 
 class StockMovement(models.Model):
@@ -197,28 +276,26 @@ class StockMovement(models.Model):
         verbose_name = _('Stock Movement')
         verbose_name_plural = _('Stock Movements')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+        ]
 
     def __str__(self):
         return f"{self.get_movement_type_display()} - {self.product.name} ({self.quantity})"
 
     def save(self, *args, **kwargs):
-        """Mise à jour automatique du stock produit"""
+        """Mise à jour atomique du stock produit via le registre de stock"""
         if not self.pk:  # Nouveau mouvement
-            self.stock_before = self.product.stock
-            
-            if self.movement_type == self.MovementType.IN:
-                self.product.stock += self.quantity
-            elif self.movement_type == self.MovementType.OUT:
-                self.product.stock -= self.quantity
-            elif self.movement_type == self.MovementType.RETURN:
-                self.product.stock += self.quantity
-            elif self.movement_type == self.MovementType.ADJUST:
-                # Pour adjustment, quantity est la nouvelle valeur absolue
-                self.product.stock = self.quantity
-                self.quantity = self.quantity - self.stock_before
-            
-            self.stock_after = self.product.stock
-            self.product.save()
+            from core import outbox
+            from core.models import SyncOutbox
+            from .stock_ledger import apply_movements
+            with transaction.atomic():
+                # Pour ADJUST, quantity est la nouvelle valeur absolue (convertie en delta)
+                levels = apply_movements([self])
+                super().save(*args, **kwargs)
+                # Le cloud ne lit que l'outbox (voir stock_ledger.record_movements)
+                outbox.record(SyncOutbox.Stream.STOCK, levels)
+            return
         
         super().save(*args, **kwargs)
 
@@ -450,3 +527,66 @@ class InventoryCountItem(models.Model):
         if self.counted_quantity is None:
             return None
         return self.counted_quantity - self.expected_quantity
+
+
+class ImportJob(models.Model):
+    """Import de produits exécuté en arrière-plan (Celery)"""
+
+    class JobStatus(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        RUNNING = 'RUNNING', _('Running')
+        SUCCESS = 'SUCCESS', _('Success')
+        FAILED = 'FAILED', _('Failed')
+
+    file = models.FileField(_('File'), upload_to='imports/')
+    original_name = models.CharField(_('Original Name'), max_length=255, blank=True)
+    mode = models.CharField(_('Mode'), max_length=10, default='create')
+    status = models.CharField(
+        _('Status'),
+        max_length=10,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING
+    )
+    total_rows = models.IntegerField(_('Total Rows'), default=0)
+    processed_rows = models.IntegerField(_('Processed Rows'), default=0)
+    created_count = models.IntegerField(_('Created'), default=0)
+    updated_count = models.IntegerField(_('Updated'), default=0)
+    skipped_count = models.IntegerField(_('Skipped'), default=0)
+    error_count = models.IntegerField(_('Errors'), default=0)
+    errors = models.JSONField(_('Error Details'), default=list, blank=True)
+    message = models.TextField(_('Message'), blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='import_jobs',
+        verbose_name=_('Created By')
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Import Job')
+        verbose_name_plural = _('Import Jobs')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import #{self.pk} - {self.get_status_display()}"
+
+    @property
+    def progress(self):
+        """Avancement en pourcentage"""
+        if self.status == self.JobStatus.SUCCESS:
+            return 100
+        if not self.total_rows:
+            return 0
+        return int(self.processed_rows * 100 / self.total_rows)
+
+    @property
+    def duration(self):
+        """Durée de traitement en secondes"""
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
@@ -0,0 +1,291 @@
+"""
+Import en masse de produits depuis un fichier Excel/CSV.
+
+Pipeline :
+1. lecture et normalisation vectorisée des colonnes (pandas) ;
+2. validation ligne par ligne sans requête (erreurs conservées par ligne) ;
+3. une requête par table pour récupérer les codes-barres, catégories et
+   fournisseurs existants ;
+4. bulk_create des catégories / fournisseurs / produits manquants et, en
+   mode « upsert », bulk_update des prix et ajustement du stock des
+   produits existants, le tout dans une seule transaction.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import outbox
+from core.models import SyncOutbox
+from core.normalize import search_key
+from .models import Category, Supplier, Product, PriceHistory, StockMovement
+from .stock_ledger import record_movements
+
+CHUNK_SIZE = 2000
+DEFAULT_CATEGORY = 'Général'
+
+MODE_CREATE = 'create'
+MODE_UPSERT = 'upsert'
+
+# Alias de colonnes (français / anglais)
+COLUMN_ALIASES = {
+    'nom': 'name', 'désignation': 'name', 'designation': 'name', 'libellé': 'name', 'titre': 'name', 'produit': 'name',
+    'code': 'barcode', 'code barre': 'barcode', 'code-barre': 'barcode', 'ean': 'barcode', 'ref': 'barcode', 'référence': 'barcode',
+    'prix achat': 'purchase_price', 'coût': 'purchase_price', 'cout': 'purchase_price', 'pa': 'purchase_price',
+    'prix vente': 'sale_price', 'pv': 'sale_price', 'prix': 'sale_price',
+    'quantité': 'stock', 'qte': 'stock', 'qté': 'stock',
+    'min': 'min_stock', 'seuil': 'min_stock', 'sueil': 'min_stock', 'alerte': 'min_stock', 'stock min': 'min_stock',
+    'catégorie': 'category', 'famille': 'category', 'rayon': 'category',
+    'fournisseur': 'supplier'
+}
+
+# Colonnes numériques : (nom interne, valeur par défaut, entier ?)
+NUMERIC_COLUMNS = [
+    ('purchase_price', 0, False),
+    ('sale_price', 0, False),
+    ('tva', 20, False),
+    ('stock', 0, True),
+    ('min_stock', 5, True),
+]
+
+
+class ProductImportError(Exception):
+    """Fichier illisible ou colonnes obligatoires absentes"""
+
+
+def read_dataframe(file, name=None):
+    """Lit un fichier CSV ou Excel dans un DataFrame (toutes colonnes en texte)."""
+    import pandas as pd
+
+    try:
+        if (name or file.name).lower().endswith('.csv'):
+            return pd.read_csv(file, dtype=str, keep_default_na=False)
+        return pd.read_excel(file, dtype=str, keep_default_na=False)
+    except Exception as e:
+        raise ProductImportError(f'Impossible de lire le fichier : {str(e)}')
+
+
+def _text(series):
+    """Normalise une colonne texte : espaces retirés, 'nan' vide."""
+    series = series.fillna('').astype(str).str.strip()
+    return series.mask(series.str.lower() == 'nan', '')
+
+
+def normalize_dataframe(df):
+    """
+    Renomme les colonnes et convertit les types de façon vectorisée.
+    Retourne (df, erreurs) ; les lignes invalides sont retirées de df.
+    """
+    import pandas as pd
+
+    df = df.copy()
+    df.columns = df.columns.astype(str).str.lower().str.strip()
+    df = df.rename(columns=COLUMN_ALIASES)
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    if 'name' not in df.columns or 'barcode' not in df.columns:
+        found_cols = ", ".join(df.columns.tolist())
+        raise ProductImportError(
+            f'Colonnes obligatoires manquantes : "name" (ou Nom) et "barcode" (ou EAN/Code).\n'
+            f'Colonnes trouvées : {found_cols}'
+        )
+
+    # Numéro de ligne tel qu'affiché dans le tableur (en-tête = ligne 1)
+    df['_line'] = df.index + 2
+
+    df['barcode'] = _text(df['barcode']).str.replace(r'\.0$', '', regex=True)
+    df['name'] = _text(df['name'])
+    for column in ('category', 'supplier', 'description'):
+        df[column] = _text(df[column]) if column in df.columns else ''
+    df['category'] = df['category'].mask(df['category'] == '', DEFAULT_CATEGORY)
+
+    # Les codes-barres vides sont ignorés, comme auparavant
+    df = df[df['barcode'] != '']
+
+    invalid = pd.Series('', index=df.index)
+    invalid = invalid.mask(df['name'] == '', 'nom manquant')
+
+    for column, default, integer in NUMERIC_COLUMNS:
+        raw = _text(df[column]) if column in df.columns else pd.Series('', index=df.index)
+        values = pd.to_numeric(raw.str.replace(',', '.', regex=False), errors='coerce')
+        bad = (raw != '') & values.isna()
+        if integer:
+            bad |= values.notna() & (values % 1 != 0)
+        invalid = invalid.mask(bad & (invalid == ''), f'valeur invalide pour "{column}"')
+        df[f'_has_{column}'] = raw != ''
+        df[column] = values.fillna(default)
+
+    errors = [
+        f"Ligne {line}: {message}"
+        for line, message in zip(df.loc[invalid != '', '_line'], invalid[invalid != ''])
+    ]
+    df = df[invalid == '']
+
+    # Code-barres en double dans le fichier : la première ligne l'emporte
+    duplicated = df['barcode'].duplicated(keep='first')
+    errors += [
+        f"Ligne {line}: code-barres {barcode} en double dans le fichier"
+        for line, barcode in zip(df.loc[duplicated, '_line'], df.loc[duplicated, 'barcode'])
+    ]
+    df = df[~duplicated]
+
+    return df, errors
+
+
+def _decimal(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def _existing(model, field, values):
+    """{valeur: pk} pour les valeurs existantes (premier pk en cas de doublon)."""
+    found = {}
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        for pk, value in model.objects.filter(
+            **{f'{field}__in': values[start:start + CHUNK_SIZE]}
+        ).order_by('-pk').values_list('pk', field):
+            found[value] = pk
+    return found
+
+
+def _ensure_named(model, names, **defaults):
+    """Retourne {nom: pk}, en créant en une fois les noms manquants."""
+    names = list(OrderedDict.fromkeys(n for n in names if n))
+    found = _existing(model, 'name', names)
+    missing = [name for name in names if name not in found]
+    if missing:
+        objects = [model(name=name, **defaults) for name in missing]
+        for obj in objects:
+            obj.search_key = obj.build_search_key()
+        model.objects.bulk_create(objects, batch_size=500)
+        found.update(_existing(model, 'name', missing))
+    return found
+
+
+def import_products(df, mode=MODE_CREATE, user=None):
+    """
+    Importe un DataFrame normalisé par normalize_dataframe.
+
+    En mode create, les codes-barres existants sont ignorés ; en mode upsert,
+    leurs prix sont mis à jour et leur stock ajusté via le registre de stock.
+    Retourne {'created', 'updated', 'skipped'}.
+    """
+    rows = df.to_dict('records')
+
+    with transaction.atomic():
+        existing = _existing(Product, 'barcode', (row['barcode'] for row in rows))
+        new_rows = [row for row in rows if row['barcode'] not in existing]
+        old_rows = [row for row in rows if row['barcode'] in existing]
+
+        categories = _ensure_named(
+            Category, (row['category'] for row in new_rows),
+            description='Auto-created from import'
+        )
+        suppliers = _ensure_named(Supplier, (row['supplier'] for row in new_rows))
+
+        Product.objects.bulk_create([
+            Product(
+                name=row['name'],
+                barcode=row['barcode'],
+                description=row['description'],
+                purchase_price=_decimal(row['purchase_price']),
+                sale_price_ht=_decimal(row['sale_price']),
+                tva=_decimal(row['tva']),
+                stock=int(row['stock']),
+                min_stock=int(row['min_stock']),
+                # bulk_create n'appelle pas save() : drapeau et clé calculés ici
+                is_low_stock=int(row['stock']) <= int(row['min_stock']),
+                search_key=search_key(row['name'], row['description']),
+                category_id=categories.get(row['category']),
+                supplier_id=suppliers.get(row['supplier'])
+            )
+            for row in new_rows
+        ], batch_size=500)
+        # bulk_create ne déclenche pas post_save : fiches à envoyer au cloud
+        outbox.record(SyncOutbox.Stream.STOCK, _existing(
+            Product, 'barcode', (row['barcode'] for row in new_rows)
+        ).values())
+
+        updated = 0
+        if mode == MODE_UPSERT and old_rows:
+            updated = _update_existing(old_rows, existing, user)
+
+    return {
+        'created': len(new_rows),
+        'updated': updated,
+        'skipped': 0 if mode == MODE_UPSERT else len(old_rows),
+    }
+
+
+def _record_price_history(rows, existing, user):
+    """Historique des prix modifiés par l'import (anciens prix lus en une requête)."""
+    new_prices = {}
+    for row in rows:
+        prices = new_prices.setdefault(existing[row['barcode']], {})
+        if row['_has_purchase_price']:
+            prices['purchase_price'] = _decimal(row['purchase_price'])
+        if row['_has_sale_price']:
+            prices['sale_price_ht'] = _decimal(row['sale_price'])
+    history = []
+    for pk, purchase_price, sale_price in Product.objects.filter(
+        pk__in=[pk for pk, prices in new_prices.items() if prices]
+    ).values_list('pk', 'purchase_price', 'sale_price_ht'):
+        prices = new_prices[pk]
+        new_purchase = prices.get('purchase_price', purchase_price)
+        new_sale = prices.get('sale_price_ht', sale_price)
+        if (new_purchase, new_sale) != (purchase_price, sale_price):
+            history.append(PriceHistory(
+                product_id=pk,
+                old_purchase_price=purchase_price, new_purchase_price=new_purchase,
+                old_sale_price=sale_price, new_sale_price=new_sale,
+                changed_by=user, reason='Import produits'
+            ))
+    PriceHistory.objects.bulk_create(history, batch_size=500)
+
+
+def _update_existing(rows, existing, user):
+    """Met à jour les prix (bulk_update) et le stock (mouvements ADJUST)."""
+    now = timezone.now()
+    updates = {'purchase_price': [], 'sale_price_ht': []}
+    touched = {}
+    movements = []
+    for row in rows:
+        pk = existing[row['barcode']]
+        product = Product(pk=pk, barcode=row['barcode'], updated_at=now)
+        if row['_has_purchase_price']:
+            product.purchase_price = _decimal(row['purchase_price'])
+            updates['purchase_price'].append(product)
+            touched[pk] = row['barcode']
+        if row['_has_sale_price']:
+            product.sale_price_ht = _decimal(row['sale_price'])
+            updates['sale_price_ht'].append(product)
+            touched[pk] = row['barcode']
+        if row['_has_stock']:
+            movements.append(StockMovement(
+                product_id=pk,
+                movement_type=StockMovement.MovementType.ADJUST,
+                quantity=int(row['stock']),
+                reference='Import produits',
+                created_by=user
+            ))
+
+    if touched:
+        _record_price_history(rows, existing, user)
+
+    for field, products in updates.items():
+        if products:
+            Product.objects.bulk_update(products, [field, 'updated_at'], batch_size=500)
+
+    if touched:
+        outbox.record(SyncOutbox.Stream.STOCK, touched)
+
+        # bulk_update ne déclenche pas post_save : invalider le cache de scan
+        def invalidate_cache():
+            from .barcode_cache import barcode_cache
+            barcode_cache.invalidate_many(touched.items())
+        transaction.on_commit(invalidate_cache)
+
+    record_movements(movements)
+
+    return len(set(touched) | {m.product_id for m in movements})
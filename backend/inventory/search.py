@@ -0,0 +1,149 @@
+"""
+Recherche plein texte des produits (champ de recherche de l'inventaire et
+du POS : ?search=...), et recherche des catégories / fournisseurs.
+
+La recherche porte sur search_key, texte normalisé (casse, accents,
+tashkeel, formes de l'alef et de la hamza : voir core.normalize) tenu à
+jour à chaque enregistrement ; la requête saisie est normalisée de la
+même façon.
+
+Le moteur des produits dépend de la base :
+- SQLite (serveur local du magasin) : table FTS5 inventory_product_fts
+  (search_key, code-barres), classement bm25 ;
+- PostgreSQL (cloud) : index GIN sur to_tsvector('simple', ...), classement
+  ts_rank, et index trigramme (pg_trgm) sur search_key pour les fragments
+  au milieu d'un mot ;
+- autre base, ou SQLite sans FTS5 : LIKE sur search_key et le code-barres.
+
+Chaque mot saisi est cherché comme préfixe ("cah 10" trouve "Cahier
+100 pages"). Les index sont maintenus par la base elle-même (triggers
+SQLite, index d'expression PostgreSQL), y compris pour les écritures en
+masse (import, synchronisation) qui ne passent pas par Product.save().
+PRODUCT_SEARCH_BACKEND permet d'imposer un moteur (chemin de classe).
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from core.normalize import normalize, search_terms
+
+FTS_TABLE = 'inventory_product_fts'
+
+# Document indexé côté PostgreSQL : l'expression doit être identique dans
+# l'index (migration 0012) et dans les requêtes pour que l'index serve
+PG_DOCUMENT = "to_tsvector('simple', coalesce({t}search_key, '') || ' ' || coalesce({t}barcode, ''))"
+
+
+def filter_search_key(queryset, query, *raw_fields):
+    """Chaque mot normalisé doit figurer dans search_key (ou tel quel dans un des raw_fields)."""
+    for term in search_terms(query):
+        condition = Q(search_key__contains=term)
+        for field in raw_fields:
+            condition |= Q(**{f'{field}__contains': term})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+class ContainsBackend:
+    """Repli : LIKE '%...%' sur search_key et le code-barres."""
+
+    def search(self, queryset, query):
+        return filter_search_key(queryset, query, 'barcode').annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend:
+    """Table FTS5 synchronisée par triggers ; rang bm25 (plus petit = meilleur)."""
+
+    # Poids bm25 : search_key, code-barres
+    weights = (10.0, 5.0)
+
+    def match(self, query):
+        return ' '.join(f'"{term}"*' for term in search_terms(query))
+
+    def search(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        table = queryset.model._meta.db_table
+        pk = queryset.model._meta.pk.column
+        weights = ', '.join(str(w) for w in self.weights)
+        return queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(search_rank=RawSQL(
+            f"SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.{pk}",
+            [match], output_field=FloatField()
+        ))
+
+
+class PostgresBackend:
+    """tsvector (préfixes) ou fragment du nom (trigrammes) ; rang ts_rank négatif."""
+
+    def tsquery(self, query):
+        return ' & '.join(f'{term}:*' for term in search_terms(query))
+
+    def search(self, queryset, query):
+        tsquery = self.tsquery(query)
+        if not tsquery:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        document = PG_DOCUMENT.format(t=f'"{queryset.model._meta.db_table}".')
+        matches = RawSQL(f"{document} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        return queryset.filter(Q(matches) | Q(search_key__contains=normalize(query))).annotate(
+            search_rank=RawSQL(f"-ts_rank({document}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+        )
+
+
+def fts5_available():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', '')
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresBackend()
+        elif connection.vendor == 'sqlite' and fts5_available():
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = ContainsBackend()
+    return _backend
+
+
+def search_products(queryset, query):
+    """Produits correspondant à `query`, annotés de search_rank (croissant = plus pertinent)."""
+    return get_backend().search(queryset, query)
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter adossé à l'index plein texte : résultats classés par
+    pertinence, sauf si ?ordering= est précisé.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not search_terms(query):
+            return queryset
+        queryset = search_products(queryset, query)
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('search_rank', 'name', 'pk')
+
+
+class SearchKeyFilter(filters.SearchFilter):
+    """SearchFilter sur search_key (catégories, fournisseurs) : insensible aux accents et à la casse."""
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_search_key(queryset, request.query_params.get(self.search_param, ''))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Category, Product, Supplier, StockMovement, PurchaseOrder, PurchaseOrderItem, InventoryCount, InventoryCountItem
+from .models import Category, Product, Supplier, StockMovement, PurchaseOrder, PurchaseOrderItem, InventoryCount, InventoryCountItem, ImportJob
+from .stock_ledger import record_movements
 
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -17,7 +18,9 @@ class SupplierSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
     
     def get_products_count(self, obj):
-        return obj.products.count()
+        # Annoté par le ViewSet (liste) ; une requête sinon (création)
+        count = getattr(obj, 'products_count', None)
+        return obj.products.count() if count is None else count
 
     def get_image_url(self, obj):
         if obj.image:
@@ -36,7 +39,9 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'icon', 'color', 'products_count']
     
     def get_products_count(self, obj):
-        return obj.products.count()
+        # Annoté par le ViewSet (liste) ; une requête sinon (création)
+        count = getattr(obj, 'products_count', None)
+        return obj.products.count() if count is None else count
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -133,7 +138,7 @@ class StockInSerializer(serializers.Serializer):
         # Si pas de coût unitaire fourni, utiliser le prix d'achat du produit
         unit_cost = validated_data.get('unit_cost', product.purchase_price)
         
-        movement = StockMovement.objects.create(
+        movement = StockMovement(
             product=product,
             movement_type=StockMovement.MovementType.IN,
             quantity=validated_data['quantity'],
@@ -143,6 +148,8 @@ class StockInSerializer(serializers.Serializer):
             notes=validated_data.get('notes', ''),
             created_by=self.context['request'].user
         )
+        # Registre de stock : outbox de synchronisation et diffusion temps réel
+        record_movements([movement])
         return movement
 
 
@@ -162,6 +169,7 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
+    total_amount = serializers.SerializerMethodField()
     
     class Meta:
         model = PurchaseOrder
@@ -173,6 +181,11 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['reference', 'created_by', 'created_at', 'updated_at', 'total_amount']
     
+    def get_total_amount(self, obj):
+        # Annoté par le ViewSet (Sum en SQL) ; calculé sur les articles sinon
+        total = getattr(obj, 'items_total', None)
+        return obj.total_amount if total is None else total
+    
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
         return super().create(validated_data)
@@ -252,3 +265,19 @@ class InventoryCountCreateSerializer(serializers.ModelSerializer):
         
         return count
 
+
+
+# ---- Import Job Serializers ----
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress = serializers.IntegerField(read_only=True)
+    duration = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'original_name', 'mode', 'status', 'status_display', 'progress',
+                  'total_rows', 'processed_rows', 'created_count', 'updated_count',
+                  'skipped_count', 'error_count', 'errors', 'message',
+                  'created_by', 'created_at', 'started_at', 'finished_at', 'duration']
+        read_only_fields = fields
@@ -0,0 +1,48 @@
+"""
+Signaux de l'inventaire.
+
+stock_changed est émis par le registre de stock après le commit, avec
+levels={product_id: nouveau_stock}. Les mises à jour passent par des
+UPDATE directs : post_save n'est donc pas déclenché pour le stock.
+
+low_stock_reached est émis après le commit avec product_ids=[...] pour
+les produits qui viennent de passer sous leur seuil (min_stock).
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Product
+
+stock_changed = Signal()
+low_stock_reached = Signal()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_barcode_cache(sender, instance, **kwargs):
+    from .barcode_cache import barcode_cache
+    # Après le commit : invalidée avant, l'entrée pourrait être relue (ancienne ligne) par un autre worker
+    pk, barcode = instance.pk, instance.barcode
+    transaction.on_commit(lambda: barcode_cache.invalidate(product_id=pk, barcode=barcode))
+
+
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, **kwargs):
+    from .autocomplete import product_index
+    transaction.on_commit(lambda: product_index.update(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    from .autocomplete import product_index
+    pk = instance.pk
+    transaction.on_commit(lambda: product_index.remove(pk))
+
+
+@receiver(stock_changed)
+def update_barcode_cache_stock(sender, levels, **kwargs):
+    from .barcode_cache import barcode_cache
+    from .autocomplete import product_index
+    barcode_cache.update_stock(levels)
+    product_index.update_stock(levels)
@@ -0,0 +1,250 @@
+"""
+Registre central des mouvements de stock.
+
+Toutes les modifications de Product.stock passent par ce module. Le stock
+n'est jamais lu puis réécrit en Python : chaque variation est appliquée par
+un UPDATE conditionnel (`SET stock = stock + delta ... RETURNING`), ce qui
+évite les mises à jour perdues entre plusieurs caisses et workers.
+Les valeurs stock_before / stock_after sont déduites de la ligne retournée.
+
+Le même UPDATE tient à jour Product.is_low_stock ; un produit qui passe
+sous son seuil (min_stock) émet low_stock_reached après le commit.
+"""
+import sqlite3
+from collections import OrderedDict, namedtuple
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, F, When, Value, IntegerField
+from django.utils import timezone
+
+from core import outbox
+from core.models import SyncOutbox
+from core.realtime import broadcast_stock_updates
+from .models import Product, StockMovement
+from .signals import stock_changed, low_stock_reached
+
+# Résultat par produit : stock avant / après et seuil d'alerte
+Level = namedtuple('Level', 'before after min_stock')
+
+
+class InsufficientStock(Exception):
+    """Le stock disponible ne permet pas d'appliquer la sortie demandée"""
+
+    def __init__(self, product_ids, message=None):
+        self.product_ids = list(product_ids)
+        super().__init__(message or f"Stock insuffisant pour les produits {self.product_ids}")
+
+
+# Sens de chaque type de mouvement (ADJUST est une valeur absolue)
+MOVEMENT_SIGN = {
+    StockMovement.MovementType.IN: 1,
+    StockMovement.MovementType.RETURN: 1,
+    StockMovement.MovementType.OUT: -1,
+}
+
+
+def _supports_update_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+def _insufficient_stock_error(product_ids):
+    """Construit un message lisible (requête uniquement en cas d'échec)."""
+    products = Product.objects.filter(pk__in=product_ids).values_list('name', 'stock')
+    details = ', '.join(f"{name} (disponible: {stock})" for name, stock in products)
+    return InsufficientStock(product_ids, f"Stock insuffisant pour {details}")
+
+
+def apply_deltas(deltas, allow_negative=True):
+    """
+    Applique des variations de stock en un seul UPDATE.
+
+    `deltas` : {product_id: delta}. Si allow_negative est False, aucune ligne
+    n'est modifiée dès qu'un produit passerait sous zéro (InsufficientStock).
+    Retourne {product_id: Level(stock_before, stock_after, min_stock)}.
+    """
+    deltas = OrderedDict((pk, d) for pk, d in deltas.items() if d)
+    if not deltas:
+        return {}
+
+    if not _supports_update_returning():
+        return _apply_deltas_locked(deltas, allow_negative)
+
+    qn = connection.ops.quote_name
+    table = qn(Product._meta.db_table)
+    pk_col = qn(Product._meta.pk.column)
+    stock_col = qn('stock')
+    min_col = qn('min_stock')
+
+    case_sql = 'CASE ' + pk_col + ' ' + ' '.join(['WHEN %s THEN %s'] * len(deltas)) + ' END'
+    case_params = [v for pk, d in deltas.items() for v in (pk, d)]
+    in_sql = ', '.join(['%s'] * len(deltas))
+
+    # Les expressions de SET lisent les valeurs d'avant la mise à jour
+    sql = (
+        f"UPDATE {table} SET {stock_col} = {stock_col} + {case_sql}, "
+        f"{qn('is_low_stock')} = ({stock_col} + {case_sql}) <= {min_col}, {qn('updated_at')} = %s "
+        f"WHERE {pk_col} IN ({in_sql})"
+    )
+    params = case_params * 2 + [connection.ops.adapt_datetimefield_value(timezone.now())] + list(deltas.keys())
+    if not allow_negative:
+        sql += f" AND {stock_col} + {case_sql} >= 0"
+        params += case_params
+    sql += f" RETURNING {pk_col}, {stock_col}, {min_col}"
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        if len(rows) != len(deltas):
+            missing = set(deltas) - {row[0] for row in rows}
+            # Annule les lignes déjà modifiées dans ce lot
+            raise _insufficient_stock_error(missing)
+
+    return {pk: Level(stock - deltas[pk], stock, min_stock) for pk, stock, min_stock in rows}
+
+
+def _apply_deltas_locked(deltas, allow_negative):
+    """Repli pour les bases sans UPDATE ... RETURNING : verrou puis UPDATE."""
+    with transaction.atomic():
+        current = {
+            pk: (stock, min_stock) for pk, stock, min_stock in
+            Product.objects.select_for_update().filter(pk__in=deltas.keys())
+            .order_by('pk').values_list('pk', 'stock', 'min_stock')
+        }
+        failed = [pk for pk, d in deltas.items() if pk not in current or (
+            not allow_negative and current[pk][0] + d < 0)]
+        if failed:
+            raise _insufficient_stock_error(failed)
+        now = timezone.now()
+        results = {}
+        for pk, d in deltas.items():
+            stock, min_stock = current[pk]
+            results[pk] = Level(stock, stock + d, min_stock)
+            Product.objects.filter(pk=pk).update(
+                stock=stock + d, is_low_stock=stock + d <= min_stock, updated_at=now
+            )
+    return results
+
+
+def set_levels(levels):
+    """
+    Fixe des niveaux de stock absolus (ajustement / inventaire).
+    Retourne {product_id: Level(stock_before, stock_after, min_stock)}.
+    """
+    if not levels:
+        return {}
+    with transaction.atomic():
+        current = {
+            pk: (stock, min_stock) for pk, stock, min_stock in
+            Product.objects.select_for_update().filter(pk__in=levels.keys())
+            .order_by('pk').values_list('pk', 'stock', 'min_stock')
+        }
+        results = {
+            pk: Level(current[pk][0], level, current[pk][1])
+            for pk, level in levels.items() if pk in current
+        }
+        Product.objects.filter(pk__in=levels.keys()).update(
+            stock=Case(
+                *[When(pk=pk, then=Value(level)) for pk, level in levels.items()],
+                output_field=IntegerField()
+            ),
+            is_low_stock=Case(
+                *[When(pk=pk, then=Value(r.after <= r.min_stock)) for pk, r in results.items()],
+                default=F('is_low_stock'),
+                output_field=BooleanField()
+            ),
+            updated_at=timezone.now()
+        )
+    return results
+
+
+def apply_movements(movements, allow_negative=True):
+    """
+    Applique une liste de StockMovement non enregistrés et renseigne
+    stock_before / stock_after (et quantity en delta pour ADJUST).
+
+    Les variations (IN/OUT/RETURN) sont cumulées par produit et appliquées
+    en un seul UPDATE ; les ajustements absolus sont appliqués ensuite.
+    Retourne {product_id: stock_after}.
+    """
+    deltas = OrderedDict()
+    adjustments = []
+    for movement in movements:
+        if movement.movement_type == StockMovement.MovementType.ADJUST:
+            adjustments.append(movement)
+        else:
+            delta = MOVEMENT_SIGN[movement.movement_type] * movement.quantity
+            deltas[movement.product_id] = deltas.get(movement.product_id, 0) + delta
+
+    levels = {}
+    with transaction.atomic():
+        results = apply_deltas(deltas, allow_negative=allow_negative)
+        # Stock initial et seuil de chaque produit, pour détecter le passage sous le seuil
+        initial = {pk: (r.before, r.min_stock) for pk, r in results.items()}
+
+        # Reconstituer before/after ligne par ligne à partir du stock final
+        running = {pk: r.after - deltas[pk] for pk, r in results.items()}
+        for movement in movements:
+            if movement.movement_type == StockMovement.MovementType.ADJUST:
+                continue
+            pk = movement.product_id
+            delta = MOVEMENT_SIGN[movement.movement_type] * movement.quantity
+            if pk not in running:
+                # Mouvement à quantité nulle : stock inchangé
+                running[pk] = Product.objects.values_list('stock', flat=True).get(pk=pk)
+            movement.stock_before = running[pk]
+            running[pk] += delta
+            movement.stock_after = running[pk]
+            levels[pk] = running[pk]
+
+        adjusted = set_levels(OrderedDict((m.product_id, m.quantity) for m in adjustments))
+        for movement in adjustments:
+            before, after, min_stock = adjusted[movement.product_id]
+            initial.setdefault(movement.product_id, (before, min_stock))
+            movement.stock_before = before
+            movement.stock_after = after
+            # Pour un ajustement, quantity devient la variation effective
+            movement.quantity = after - before
+            levels[movement.product_id] = after
+
+        if levels:
+            transaction.on_commit(lambda: stock_changed.send(sender=Product, levels=levels))
+
+        crossed = [
+            pk for pk, level in levels.items()
+            if pk in initial and initial[pk][0] > initial[pk][1] >= level
+        ]
+        if crossed:
+            transaction.on_commit(lambda: low_stock_reached.send(sender=Product, product_ids=crossed))
+
+    # Garder les instances Product en mémoire cohérentes
+    for movement in movements:
+        if StockMovement.product.is_cached(movement) and movement.product_id in levels:
+            movement.product.stock = levels[movement.product_id]
+
+    return levels
+
+
+def record_movements(movements, allow_negative=True, broadcast=True):
+    """
+    Point d'entrée principal : applique les mouvements, les enregistre en
+    un seul INSERT et publie les nouveaux niveaux après le commit.
+    Les produits modifiés sont ajoutés à l'outbox de synchronisation.
+    """
+    movements = list(movements)
+    if not movements:
+        return []
+
+    with transaction.atomic():
+        levels = apply_movements(movements, allow_negative=allow_negative)
+        StockMovement.objects.bulk_create(movements)
+        outbox.record(SyncOutbox.Stream.STOCK, levels)
+        if broadcast:
+            updates = [{'product_id': pk, 'new_stock': stock} for pk, stock in levels.items()]
+            transaction.on_commit(lambda: broadcast_stock_updates(updates))
+
+    return movements
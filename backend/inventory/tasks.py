@@ -0,0 +1,116 @@
+"""
+Tâches d'arrière-plan de l'inventaire.
+
+Les imports de produits sont traités hors des workers web : par Celery si
+un broker est configuré, sinon (serveur local sans Redis) dans un thread.
+"""
+import logging
+import threading
+
+from celery import shared_task
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.realtime import broadcast_import_progress
+from . import product_import
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+JOB_CHUNK_SIZE = 1000
+MAX_STORED_ERRORS = 500
+
+
+def _publish(job):
+    broadcast_import_progress({
+        'job_id': job.pk,
+        'status': job.status,
+        'progress': job.progress,
+        'processed_rows': job.processed_rows,
+        'total_rows': job.total_rows,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'errors': job.error_count,
+    })
+
+
+def _save(job, *fields):
+    job.save(update_fields=list(fields))
+    _publish(job)
+
+
+@shared_task
+def process_import_job(job_id):
+    """Traite un ImportJob par lots, en enregistrant l'avancement."""
+    # Prise en charge atomique : une seconde livraison de la tâche (retry,
+    # redélivrance Celery) ne trouve plus le job en attente
+    claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.JobStatus.PENDING).update(
+        status=ImportJob.JobStatus.RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return
+    job = ImportJob.objects.select_related('created_by').get(pk=job_id)
+    _publish(job)
+
+    try:
+        with job.file.open('rb') as f:
+            df = product_import.read_dataframe(f, name=job.original_name or job.file.name)
+        df, errors = product_import.normalize_dataframe(df)
+
+        job.total_rows = len(df) + len(errors)
+        job.processed_rows = len(errors)
+        job.error_count = len(errors)
+        job.errors = errors[:MAX_STORED_ERRORS]
+        _save(job, 'total_rows', 'processed_rows', 'error_count', 'errors')
+
+        # Une transaction par lot : l'avancement est visible et un gros
+        # fichier ne verrouille pas les produits pendant tout l'import
+        for start in range(0, len(df), JOB_CHUNK_SIZE):
+            chunk = df.iloc[start:start + JOB_CHUNK_SIZE]
+            result = product_import.import_products(chunk, mode=job.mode, user=job.created_by)
+            job.processed_rows += len(chunk)
+            job.created_count += result['created']
+            job.updated_count += result['updated']
+            job.skipped_count += result['skipped']
+            _save(job, 'processed_rows', 'created_count', 'updated_count', 'skipped_count')
+
+        job.status = ImportJob.JobStatus.SUCCESS
+    except product_import.ProductImportError as e:
+        job.status = ImportJob.JobStatus.FAILED
+        job.message = str(e)
+    except Exception as e:
+        logger.exception(f"Import #{job.pk} échoué")
+        job.status = ImportJob.JobStatus.FAILED
+        job.message = str(e)
+
+    job.finished_at = timezone.now()
+    _save(job, 'status', 'message', 'finished_at')
+    _delete_file(job)
+
+
+def _delete_file(job):
+    """Supprime le fichier importé une fois le job terminé (succès ou échec)."""
+    try:
+        job.file.delete(save=False)
+    except Exception:
+        logger.warning(f"Fichier de l'import #{job.pk} non supprimé", exc_info=True)
+        return
+    job.save(update_fields=['file'])
+
+
+def _run_in_thread(job_id):
+    try:
+        process_import_job(job_id)
+    finally:
+        connection.close()
+
+
+def enqueue_import_job(job):
+    """Lance le traitement après le commit de la création du job."""
+    if getattr(settings, 'CELERY_BROKER_URL', ''):
+        transaction.on_commit(lambda: process_import_job.delay(job.pk))
+    else:
+        transaction.on_commit(lambda: threading.Thread(
+            target=_run_in_thread, args=(job.pk,), daemon=True
+        ).start())
@@ -1,10 +1,24 @@
+import os
+import threading
+import time
+from importlib.util import find_spec
+from tempfile import TemporaryDirectory
+from unittest import skipUnless
+
 from django.test import TestCase
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from decimal import Decimal
 
-from .models import Category, Product, Supplier, StockMovement, PriceHistory
+from core.models import SyncOutbox
+from .barcode_cache import BarcodeCache
+from .models import Category, Product, Supplier, StockMovement, PriceHistory, PurchaseOrder, PurchaseOrderItem, ImportJob
+from .signals import low_stock_reached
+from .stock_ledger import record_movements, apply_deltas, InsufficientStock
+from .tasks import process_import_job
 
 User = get_user_model()
 
@@ -88,6 +102,8 @@ class StockMovementTest(TestCase):
         self.assertEqual(self.product.stock, initial_stock + 50)
         self.assertEqual(movement.stock_before, initial_stock)
         self.assertEqual(movement.stock_after, initial_stock + 50)
+        # Niveau envoyé au cloud par l'outbox
+        self.assertTrue(SyncOutbox.objects.filter(stream=SyncOutbox.Stream.STOCK, object_id=self.product.pk).exists())
     
     def test_stock_out_movement(self):
         """Test sortie de stock"""
@@ -113,6 +129,68 @@ class StockMovementTest(TestCase):
         self.assertEqual(self.product.stock, 75)
 
 
+class StockLedgerTest(TestCase):
+    """Tests pour le registre de stock"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger', password='test123')
+        self.p1 = Product.objects.create(name='Gomme', barcode='5550000000001', sale_price_ht=Decimal('1.00'), stock=10)
+        self.p2 = Product.objects.create(name='Règle', barcode='5550000000002', sale_price_ht=Decimal('2.00'), stock=3)
+    
+    def test_batch_movements(self):
+        """Test application d'un lot avec before/after chaînés"""
+        movements = record_movements([
+            StockMovement(product=self.p1, movement_type='IN', quantity=5, created_by=self.user),
+            StockMovement(product=self.p1, movement_type='OUT', quantity=2, created_by=self.user),
+            StockMovement(product=self.p2, movement_type='OUT', quantity=3, created_by=self.user),
+        ])
+        self.assertEqual([(m.stock_before, m.stock_after) for m in movements], [(10, 15), (15, 13), (3, 0)])
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p1.stock, 13)
+        self.assertEqual(self.p2.stock, 0)
+        self.assertEqual(StockMovement.objects.count(), 3)
+    
+    def test_insufficient_stock_rolls_back_batch(self):
+        """Test qu'un lot refusé ne modifie aucun produit"""
+        with self.assertRaises(InsufficientStock) as ctx:
+            apply_deltas({self.p1.id: -5, self.p2.id: -4}, allow_negative=False)
+        self.assertEqual(ctx.exception.product_ids, [self.p2.id])
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 10)
+    
+    def test_concurrent_deltas_are_not_lost(self):
+        """Test que deux décréments sur une instance périmée s'additionnent"""
+        stale = Product.objects.get(pk=self.p1.pk)
+        StockMovement.objects.create(product=self.p1, movement_type='OUT', quantity=4, created_by=self.user)
+        StockMovement.objects.create(product=stale, movement_type='OUT', quantity=4, created_by=self.user)
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 2)
+    
+    def test_crossing_min_stock_flags_product(self):
+        """Test qu'un passage sous le seuil marque le produit et émet low_stock_reached une fois"""
+        received = []
+        handler = lambda sender, product_ids, **kwargs: received.append(sorted(product_ids))
+        low_stock_reached.connect(handler)
+        self.addCleanup(low_stock_reached.disconnect, handler)
+        Product.objects.filter(pk=self.p1.pk).update(min_stock=5)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movements([
+                StockMovement(product=self.p1, movement_type='OUT', quantity=6, created_by=self.user),
+                StockMovement(product=self.p1, movement_type='OUT', quantity=1, created_by=self.user),
+            ])
+        self.assertEqual(received, [[self.p1.id]])
+        self.assertTrue(Product.objects.get(pk=self.p1.pk).is_low_stock)
+        
+        # Déjà sous le seuil : pas de nouvelle alerte ; réapprovisionné : drapeau levé
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movements([StockMovement(product=self.p1, movement_type='OUT', quantity=1, created_by=self.user)])
+            record_movements([StockMovement(product=self.p1, movement_type='IN', quantity=20, created_by=self.user)])
+        self.assertEqual(received, [[self.p1.id]])
+        self.assertFalse(Product.objects.get(pk=self.p1.pk).is_low_stock)
+
+
 class CategoryTest(TestCase):
     """Tests pour les catégories"""
     
@@ -183,12 +261,324 @@ class InventoryAPITest(APITestCase):
         response = self.client.get('/api/inventory/products/?barcode=3333333333333')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
     
+    def test_full_text_search_ranked(self):
+        """Test recherche plein texte : préfixes, accents, classement et index à jour"""
+        Product.objects.create(name='Stylo bleu', barcode='6660000000001', description='Cahier offert', sale_price_ht=Decimal('2.00'))
+        cahier = Product.objects.create(name='Cahier 100 pages', barcode='6660000000002', sale_price_ht=Decimal('8.00'))
+        Product.objects.create(name='Règle', barcode='6660000000003', sale_price_ht=Decimal('3.00'))
+        
+        response = self.client.get('/api/inventory/products/', {'search': 'cah'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Cahier 100 pages', 'Stylo bleu'])
+        
+        response = self.client.get('/api/inventory/products/', {'search': 'regle'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Règle'])
+        
+        # Index maintenu par les triggers lors d'une modification partielle
+        cahier.name = 'Agenda 2026'
+        cahier.save(update_fields=['name'])
+        response = self.client.get('/api/inventory/products/', {'search': 'agenda 20', 'ordering': 'name'})
+        self.assertEqual([p['id'] for p in response.data['results']], [cahier.id])
+    
+    def test_search_is_accent_and_script_insensitive(self):
+        """Test recherche normalisée : accents, tashkeel et hamza ; catégories et fournisseurs"""
+        Product.objects.create(name='Cahier à spirale', barcode='6670000000001', sale_price_ht=Decimal('4.00'))
+        Product.objects.create(name='القُرْآن الكريم', barcode='6670000000002', sale_price_ht=Decimal('90.00'))
+        Category.objects.create(name='Fournitures scolaires')
+        Supplier.objects.create(name='Éditions Al-Hilâl', contact_name='أحمد')
+        
+        for query, expected in [('CAHIER a', 'Cahier à spirale'), ('القران', 'القُرْآن الكريم'), ('الكريم', 'القُرْآن الكريم')]:
+            response = self.client.get('/api/inventory/products/', {'search': query})
+            self.assertEqual([p['name'] for p in response.data['results']], [expected], query)
+        
+        response = self.client.get('/api/inventory/categories/', {'search': 'SCOLAIRE'})
+        self.assertEqual([c['name'] for c in response.data['results']], ['Fournitures scolaires'])
+        for query in ('hilal', 'احمد'):
+            response = self.client.get('/api/inventory/suppliers/', {'search': query})
+            self.assertEqual([s['name'] for s in response.data['results']], ['Éditions Al-Hilâl'], query)
+    
+    def test_autocomplete(self):
+        """Test suggestions POS : index en mémoire tenu à jour par les signaux"""
+        from .autocomplete import product_index
+        product_index.clear()
+        cahier = Product.objects.create(name='Cahier à spirale', barcode='9782070612758', sale_price_ht=Decimal('10.00'), stock=4)
+        Product.objects.create(name='Grand cahier', barcode='9781000000001', sale_price_ht=Decimal('12.00'))
+        Product.objects.create(name='Cahier inactif', barcode='9781000000002', sale_price_ht=Decimal('1.00'), active=False)
+        
+        response = self.client.get('/api/inventory/products/autocomplete/', {'q': 'cahier'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['name'] for p in response.data], ['Cahier à spirale', 'Grand cahier'])
+        self.assertEqual(response.data[0]['price_ttc'], 12.0)
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'barcode', 'price_ttc', 'tva', 'stock', 'image_url'})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            cahier.name = 'Agenda scolaire'
+            cahier.save()
+            StockMovement.objects.create(product=cahier, movement_type='OUT', quantity=1, created_by=self.admin)
+        with self.assertNumQueries(1):  # authentification JWT uniquement
+            response = self.client.get('/api/inventory/products/autocomplete/', {'q': '978207', 'limit': 5})
+        self.assertEqual([(p['name'], p['stock']) for p in response.data], [('Agenda scolaire', 3)])
+    
+    def test_autocomplete_picks_up_other_writers(self):
+        """Test relecture des modifications faites hors de ce processus (sans signal)"""
+        from .autocomplete import ProductIndex
+        now = [0.0]
+        index = ProductIndex(sync_interval=5, rebuild_interval=3600, clock=lambda: now[0])
+        product = Product.objects.create(name='Règle 30 cm', barcode='7000000000001', sale_price_ht=Decimal('3.00'))
+        self.assertEqual(len(index.lookup('regle 30')), 1)
+        
+        Product.objects.filter(pk=product.pk).update(name='Équerre', updated_at=timezone.now())
+        self.assertEqual(len(index.lookup('equerre')), 0)
+        now[0] = 6.0
+        self.assertEqual([e[1] for e in index.lookup('equerre')], ['Équerre'])
+        self.assertEqual(index.lookup('regle'), [])
+    
+    def test_autocomplete_refreshes_once_under_concurrency(self):
+        """Lookups simultanés : une seule construction, puis une seule synchronisation"""
+        from .autocomplete import ProductIndex
+        now = [0.0]
+        index = ProductIndex(sync_interval=5, rebuild_interval=3600, clock=lambda: now[0])
+        calls = []
+        
+        def refresh(kind):
+            def run():
+                calls.append(kind)
+                time.sleep(0.05)
+                if kind == 'build':
+                    index._built_at = now[0]
+                index._synced_at = now[0]
+            return run
+        index.build, index.sync = refresh('build'), refresh('sync')
+        
+        for moment in (0.0, 6.0):
+            now[0] = moment
+            threads = [threading.Thread(target=index.lookup, args=('cahier',)) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(calls, ['build', 'sync'])
+    
+    def test_receive_purchase_order_adds_stock_once(self):
+        """Test réception commande: une seule entrée de stock"""
+        supplier = Supplier.objects.create(name='Papeterie')
+        product = Product.objects.create(name='Classeur', barcode='4444444444444', sale_price_ht=Decimal('12.00'), stock=2)
+        order = PurchaseOrder.objects.create(supplier=supplier, status='SENT', created_by=self.admin)
+        item = PurchaseOrderItem.objects.create(order=order, product=product, quantity=10, unit_cost=Decimal('7.00'))
+        
+        response = self.client.post(
+            f'/api/inventory/purchase-orders/{order.id}/receive/',
+            {'items': [{'item_id': item.id, 'quantity': 10}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 12)
+        movement = StockMovement.objects.get(product=product)
+        self.assertEqual((movement.stock_before, movement.stock_after), (2, 12))
+    
+    def _import(self, content, **data):
+        """Envoie un fichier à import_excel, exécute le job et retourne son état"""
+        with TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            response = self.client.post('/api/inventory/products/import_excel/', {
+                'file': SimpleUploadedFile('produits.csv', content, content_type='text/csv'),
+                **data
+            }, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data['status'], 'PENDING')
+            
+            process_import_job(response.data['id'])
+            # Fichier supprimé une fois le job terminé ; une seconde livraison ne fait rien
+            self.assertFalse(ImportJob.objects.get(pk=response.data['id']).file)
+            self.assertEqual(os.listdir(os.path.join(media, 'imports')), [])
+            with self.assertNumQueries(1):
+                process_import_job(response.data['id'])
+        return self.client.get(f"/api/inventory/import-jobs/{response.data['id']}/").data
+    
+    @skipUnless(find_spec('pandas'), "pandas non installé")
+    def test_import_excel_create_and_upsert(self):
+        """Import CSV : création en masse, erreurs par ligne, puis mise à jour"""
+        Product.objects.create(
+            name='Existant', barcode='100', sale_price_ht=Decimal('5.00'), stock=3
+        )
+        csv = (
+            "Nom,EAN,Prix achat,Prix vente,Qté,Catégorie,Fournisseur\n"
+            "Cahier,200,4,6.50,10,Papeterie,Sotemi\n"
+            "Stylo,300,1,2,abc,Papeterie,\n"
+            "Gomme,400,0.5,1,7,,\n"
+            "Existant,100,3,5.50,12,,\n"
+            "Doublon,200,1,1,1,,\n"
+        ).encode('utf-8')
+        
+        job = self._import(csv)
+        self.assertEqual(job['status'], 'SUCCESS')
+        self.assertEqual(job['progress'], 100)
+        self.assertEqual(job['total_rows'], 5)
+        self.assertEqual(job['created_count'], 2)
+        self.assertEqual(job['skipped_count'], 1)
+        self.assertEqual(job['error_count'], 2)
+        self.assertTrue(job['errors'][0].startswith('Ligne 3'))
+        
+        cahier = Product.objects.get(barcode='200')
+        self.assertEqual(cahier.category.name, 'Papeterie')
+        self.assertEqual(cahier.supplier.name, 'Sotemi')
+        self.assertEqual(cahier.sale_price_ht, Decimal('6.50'))
+        self.assertEqual(Product.objects.get(barcode='400').category.name, 'Général')
+        self.assertEqual(Category.objects.get(name='Général').search_key, 'general')
+        self.assertTrue(cahier.search_key)
+        self.assertEqual(Product.objects.get(barcode='100').stock, 3)
+        # Produits créés en masse : envoyés au cloud par l'outbox
+        outbox_ids = set(SyncOutbox.objects.filter(stream=SyncOutbox.Stream.STOCK).values_list('object_id', flat=True))
+        self.assertLessEqual({cahier.pk, Product.objects.get(barcode='400').pk}, outbox_ids)
+        
+        job = self._import(csv, mode='upsert')
+        self.assertEqual(job['created_count'], 0)
+        self.assertEqual(job['updated_count'], 3)
+        existing = Product.objects.get(barcode='100')
+        self.assertEqual(existing.sale_price_ht, Decimal('5.50'))
+        self.assertEqual(existing.stock, 12)
+        self.assertTrue(StockMovement.objects.filter(
+            product=existing, movement_type=StockMovement.MovementType.ADJUST
+        ).exists())
+        # Prix modifiés seulement : historique pour le produit existant, pas pour les prix inchangés
+        history = PriceHistory.objects.get()
+        self.assertEqual(history.product, existing)
+        self.assertEqual((history.old_sale_price, history.new_sale_price), (Decimal('5.00'), Decimal('5.50')))
+        self.assertEqual(history.changed_by, self.admin)
+    
+    @skipUnless(find_spec('pandas'), "pandas non installé")
+    def test_import_job_fails_on_missing_columns(self):
+        """Colonnes obligatoires absentes : le job échoue avec un message"""
+        job = self._import(b"Nom,Prix\nCahier,5\n")
+        self.assertEqual(job['status'], 'FAILED')
+        self.assertIn('Colonnes obligatoires manquantes', job['message'])
+        self.assertIsNotNone(job['duration'])
+    
+    def test_stock_in_records_outbox(self):
+        """Une entrée de stock par l'API passe par le registre : entrée STOCK dans l'outbox"""
+        product = Product.objects.create(name='Classeur', barcode='4444', sale_price_ht=Decimal('5.00'), stock=10)
+        SyncOutbox.objects.all().delete()
+        response = self.client.post('/api/inventory/stock-movements/stock_in/', {'product': product.id, 'quantity': 5})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['stock_after'], 15)
+        self.assertEqual(
+            list(SyncOutbox.objects.values_list('stream', 'object_id')), [(SyncOutbox.Stream.STOCK, product.pk)]
+        )
+        
+        response = self.client.post(f'/api/inventory/products/{product.id}/add_stock/', {'quantity': 3}, format='json')
+        self.assertEqual(response.data['new_stock'], 18)
+        self.assertEqual(SyncOutbox.objects.filter(stream=SyncOutbox.Stream.STOCK).count(), 2)
+    
+    def test_resolve_barcode(self):
+        """Test résolution code-barres via le cache"""
+        from .barcode_cache import barcode_cache
+        barcode_cache.clear()
+        product = Product.objects.create(
+            name='Cahier à spirale',
+            barcode='5555555555555',
+            sale_price_ht=Decimal('10.00'),
+            tva=Decimal('20.00'),
+            stock=7
+        )
+        response = self.client.get('/api/inventory/products/resolve/5555555555555/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], product.id)
+        self.assertEqual(response.data['price_ttc'], 12.0)
+        
+        # Deuxième scan servi depuis le cache, stock tenu à jour par le registre
+        with self.captureOnCommitCallbacks(execute=True):
+            StockMovement.objects.create(product=product, movement_type='OUT', quantity=2, created_by=self.admin)
+        with self.assertNumQueries(1):  # authentification JWT uniquement
+            response = self.client.get('/api/inventory/products/resolve/5555555555555/')
+        self.assertEqual(response.data['stock'], 5)
+        
+        # Changement de prix: invalidation par signal, après le commit
+        product.sale_price_ht = Decimal('20.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.client.get('/api/inventory/products/resolve/5555555555555/')
+        self.assertEqual(response.data['price_ttc'], 24.0)
+        
+        response = self.client.get('/api/inventory/products/resolve/0000000000000/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
     def test_product_stats(self):
         """Test endpoint stats produits"""
         response = self.client.get('/api/inventory/products/stats/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+class FakeRedis:
+    """Redis minimal en mémoire (get/set/delete/incr), partagé par plusieurs caches"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+    
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+    
+    def pipeline(self):
+        redis, calls = self, []
+        
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: calls.append((name, args))
+            
+            def execute(self):
+                return [getattr(redis, name)(*args) for name, args in calls]
+        return Pipeline()
+
+
+class BarcodeCacheTest(TestCase):
+    """Invalidation du cache de scan entre processus"""
+    
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Stylo', barcode='777', sale_price_ht=Decimal('10.00'), tva=Decimal('20.00')
+        )
+    
+    def _worker(self, redis):
+        cache = BarcodeCache(ttl=300)
+        cache._redis, cache._redis_checked = redis, True
+        cache.sync_interval = 0
+        return cache
+    
+    def test_invalidation_reaches_other_workers(self):
+        """Un prix modifié dans un worker n'est plus servi depuis la mémoire des autres"""
+        redis = FakeRedis()
+        scanner, editor = self._worker(redis), self._worker(redis)
+        self.assertEqual(scanner.get('777')[2], 12.0)
+        
+        Product.objects.filter(pk=self.product.pk).update(sale_price_ht=Decimal('20.00'))
+        self.assertEqual(scanner.get('777')[2], 12.0)  # pas encore invalidé
+        editor.invalidate(product_id=self.product.pk, barcode='777')
+        self.assertEqual(scanner.get('777')[2], 24.0)
+        
+        # Sa propre invalidation ne vide pas toute la mémoire de l'éditeur
+        editor.get('777')
+        editor.invalidate(barcode='000')
+        with self.assertNumQueries(0):
+            self.assertEqual(editor.get('777')[2], 24.0)
+    
+    def test_short_memory_ttl_without_redis(self):
+        """Sans Redis, les entrées en mémoire expirent après BARCODE_CACHE_LOCAL_TTL"""
+        cache = BarcodeCache(ttl=300)
+        cache._redis_checked = True
+        cache.get('777')
+        expires_at, _ = cache._entries['777']
+        self.assertLessEqual(expires_at - time.monotonic(), cache.local_ttl)
+
+
 class SupplierAPITest(APITestCase):
     """Tests API pour les fournisseurs"""
     
@@ -222,3 +612,63 @@ class SupplierAPITest(APITestCase):
         Supplier.objects.create(name='Fournisseur B')
         response = self.client.get('/api/inventory/suppliers/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ListQueryBudgetTest(APITestCase):
+    """Listes catégories / fournisseurs / commandes : nombre de requêtes indépendant du nombre de lignes"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='admin123',
+            role='ADMIN'
+        )
+        response = self.client.post('/api/auth/login/', {
+            'username': 'admin',
+            'password': 'admin123'
+        })
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.created = 0
+    
+    def add_rows(self, count):
+        for _ in range(count):
+            self.created += 1
+            n = self.created
+            category = Category.objects.create(name=f'Catégorie {n}')
+            supplier = Supplier.objects.create(name=f'Fournisseur {n}')
+            order = PurchaseOrder.objects.create(supplier=supplier, created_by=self.admin)
+            for i in range(2):
+                product = Product.objects.create(
+                    name=f'Produit {n}-{i}', barcode=f'BUDGET{n:03d}{i}',
+                    category=category, supplier=supplier,
+                    purchase_price=Decimal('5.00'), sale_price_ht=Decimal('8.00')
+                )
+                PurchaseOrderItem.objects.create(order=order, product=product, quantity=3, unit_cost=Decimal('2.50'))
+    
+    def assertConstantQueries(self, url, queries):
+        # JWT + count de la pagination + page (+ prefetch pour les commandes)
+        for rows in (2, 8):
+            self.add_rows(rows)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['count'], self.created)
+        return response.data['results']
+    
+    def test_categories(self):
+        results = self.assertConstantQueries('/api/inventory/categories/', 3)
+        self.assertTrue(all(row['products_count'] == 2 for row in results))
+    
+    def test_suppliers(self):
+        results = self.assertConstantQueries('/api/inventory/suppliers/?active=true', 3)
+        self.assertTrue(all(row['products_count'] == 2 for row in results))
+    
+    def test_purchase_orders(self):
+        results = self.assertConstantQueries('/api/inventory/purchase-orders/', 5)
+        self.assertTrue(all(row['total_amount'] == Decimal('15.00') for row in results))
+        self.assertEqual(len(results[0]['items']), 2)
+    
+    def test_created_category_counts_products(self):
+        response = self.client.post('/api/inventory/categories/', {'name': 'Nouvelle'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['products_count'], 0)
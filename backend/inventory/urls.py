@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CategoryViewSet, ProductViewSet, SupplierViewSet, StockMovementViewSet,
-    PurchaseOrderViewSet, InventoryCountViewSet
+    PurchaseOrderViewSet, InventoryCountViewSet, ImportJobViewSet, BarcodeResolveView,
+    ProductAutocompleteView
 )
 
 router = DefaultRouter()
@@ -12,7 +13,10 @@ router.register(r'suppliers', SupplierViewSet)
 router.register(r'stock-movements', StockMovementViewSet)
 router.register(r'purchase-orders', PurchaseOrderViewSet)
 router.register(r'counts', InventoryCountViewSet)
+router.register(r'import-jobs', ImportJobViewSet)
 
 urlpatterns = [
+    path('products/resolve/<str:barcode>/', BarcodeResolveView.as_view(), name='barcode_resolve'),
+    path('products/autocomplete/', ProductAutocompleteView.as_view(), name='product_autocomplete'),
     path('', include(router.urls)),
 ]
@@ -2,13 +2,24 @@ from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from core.permissions import CanManageInventory, CanViewInventory, IsAdminRole
+from rest_framework.views import APIView
+from core.permissions import CanManageInventory, CanViewInventory, IsAdminRole, CanAccessPOS
+from core.timeranges import range_filter, to_date
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, F
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.db import transaction
+from django.core.files.storage import default_storage
 
-from .models import Category, Product, Supplier, StockMovement, PurchaseOrder, PurchaseOrderItem, InventoryCount, InventoryCountItem
+from .models import Category, Product, Supplier, StockMovement, PurchaseOrder, InventoryCount, InventoryCountItem, ImportJob
+from .stock_ledger import record_movements
+from . import product_import
+from .tasks import enqueue_import_job
+from .search import ProductSearchFilter, SearchKeyFilter
+from .barcode_cache import barcode_cache, FIELDS as BARCODE_FIELDS
+from .autocomplete import product_index, FIELDS as AUTOCOMPLETE_FIELDS
 from .serializers import (
     CategorySerializer, 
     ProductSerializer, 
@@ -20,7 +31,8 @@ from .serializers import (
     PurchaseOrderCreateSerializer,
     InventoryCountSerializer,
     InventoryCountCreateSerializer,
-    InventoryCountItemSerializer
+    InventoryCountItemSerializer,
+    ImportJobSerializer
 )
 
 
@@ -29,13 +41,13 @@ class SupplierViewSet(viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [SearchKeyFilter, filters.OrderingFilter]
     search_fields = ['name', 'contact_name', 'email', 'phone']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().annotate(products_count=Count('products'))
         active = self.request.query_params.get('active')
         if active is not None:
             queryset = queryset.filter(active=active.lower() == 'true')
@@ -47,16 +59,21 @@ class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [SearchKeyFilter]
     search_fields = ['name']
 
+    def get_queryset(self):
+        # Meta.ordering n'est pas appliqué aux requêtes avec GROUP BY
+        return super().get_queryset().annotate(products_count=Count('products')).order_by('name')
+
 
 class ProductViewSet(viewsets.ModelViewSet):
     """API pour les produits"""
     queryset = Product.objects.select_related('category', 'supplier').all()
     permission_classes = [IsAuthenticated, CanManageInventory]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Recherche en dernier : le classement par pertinence remplace l'ordre par défaut
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     filterset_fields = ['category', 'supplier', 'active']
     search_fields = ['name', 'barcode', 'description']
     ordering_fields = ['name', 'stock', 'sale_price_ht', 'created_at']
@@ -78,7 +95,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         # Filtre stock bas
         low_stock = self.request.query_params.get('low_stock')
         if low_stock and low_stock.lower() == 'true':
-            queryset = queryset.filter(stock__lte=F('min_stock'))
+            queryset = queryset.filter(is_low_stock=True)
         
         return queryset
     
@@ -89,7 +106,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         total_products = products.count()
         active_products = products.filter(active=True).count()
-        low_stock_count = products.filter(stock__lte=F('min_stock')).count()
+        low_stock_count = products.filter(is_low_stock=True).count()
         out_of_stock = products.filter(stock=0).count()
         
         # Valeur totale du stock
@@ -107,119 +124,39 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'], parser_classes=[MultiPartParser], permission_classes=[IsAuthenticated, CanManageInventory])
     def import_excel(self, request):
-        """Import products from Excel/CSV file"""
+        """
+        Import products from Excel/CSV file.
+        Le fichier est enregistré et traité en arrière-plan : la réponse
+        contient l'ImportJob à suivre via /inventory/import-jobs/<id>/.
+        mode=upsert : met à jour prix et stock des codes-barres existants.
+        """
         try:
-            try:
-                import pandas as pd
-                import openpyxl # Check existence
-            except ImportError as e:
-                return Response(
-                    {'detail': f'Erreur configuration serveur (librairie manquante): {str(e)}. Essayez de redémarrer le serveur backend.'}, 
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-            from .models import Category, Supplier
-
-            if 'file' not in request.FILES:
-                return Response({'detail': 'Aucun fichier fourni.'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            file = request.FILES['file']
-            
-            try:
-                if file.name.endswith('.csv'):
-                    df = pd.read_csv(file)
-                else:
-                    df = pd.read_excel(file)
-            except Exception as e:
-                return Response({'detail': f'Impossible de lire le fichier : {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Standardize column names (lowercase, strip)
-            df.columns = df.columns.str.lower().str.strip()
-            
-            # Column Aliases (French/English)
-            column_mapping = {
-                'nom': 'name', 'désignation': 'name', 'designation': 'name', 'libellé': 'name', 'titre': 'name', 'produit': 'name',
-                'code': 'barcode', 'code barre': 'barcode', 'code-barre': 'barcode', 'ean': 'barcode', 'ref': 'barcode', 'référence': 'barcode',
-                'prix achat': 'purchase_price', 'coût': 'purchase_price', 'cout': 'purchase_price', 'pa': 'purchase_price',
-                'prix vente': 'sale_price', 'pv': 'sale_price', 'prix': 'sale_price',
-                'quantité': 'stock', 'qte': 'stock', 'qté': 'stock',
-                'min': 'min_stock', 'seuil': 'min_stock', 'sueil': 'min_stock', 'alerte': 'min_stock', 'stock min': 'min_stock',
-                'catégorie': 'category', 'famille': 'category', 'rayon': 'category',
-                'fournisseur': 'supplier'
-            }
-            df.rename(columns=column_mapping, inplace=True)
-            
-            created_count = 0
-            errors = []
-            
-            # Required columns
-            if 'name' not in df.columns or 'barcode' not in df.columns:
-                found_cols = ", ".join(df.columns.tolist())
-                return Response(
-                    {'detail': f'Colonnes obligatoires manquantes : "name" (ou Nom) et "barcode" (ou EAN/Code).\nColonnes trouvées : {found_cols}'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            for index, row in df.iterrows():
-                try:
-                    barcode = str(row['barcode']).strip()
-                    # Skip empty barcodes
-                    if not barcode or barcode.lower() == 'nan':
-                        continue
-                        
-                    if Product.objects.filter(barcode=barcode).exists():
-                        continue # Skip existing
+            import pandas  # noqa: F401
+            import openpyxl  # noqa: F401 - Check existence
+        except ImportError as e:
+            return Response(
+                {'detail': f'Erreur configuration serveur (librairie manquante): {str(e)}. Essayez de redémarrer le serveur backend.'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-                    # Category
-                    category_name = row.get('category', 'Général')
-                    if pd.isna(category_name) or not str(category_name).strip():
-                        category_name = 'Général'
-                        
-                    category, _ = Category.objects.get_or_create(
-                        name=str(category_name).strip(), 
-                        defaults={'description': 'Auto-created from import'}
-                    )
-                    
-                    # Supplier (Optional)
-                    supplier = None
-                    supplier_name = row.get('supplier')
-                    if pd.notna(supplier_name) and str(supplier_name).strip() and str(supplier_name).lower() != 'nan':
-                        supplier, _ = Supplier.objects.get_or_create(name=str(supplier_name).strip())
-                    
-                    # Prices (defaults)
-                    purchase_price = row.get('purchase_price', 0)
-                    sale_price_ht = row.get('sale_price', 0)
-                    
-                    # Handle NaN/None
-                    if pd.isna(purchase_price): purchase_price = 0
-                    if pd.isna(sale_price_ht): sale_price_ht = 0
-                    
-                    Product.objects.create(
-                        name=row['name'],
-                        barcode=barcode,
-                        description=row.get('description', '') if pd.notna(row.get('description')) else '',
-                        purchase_price=purchase_price,
-                        sale_price_ht=sale_price_ht,
-                        tva=row.get('tva', 20) if pd.notna(row.get('tva')) else 20,
-                        stock=row.get('stock', 0) if pd.notna(row.get('stock')) else 0,
-                        min_stock=row.get('min_stock', 5) if pd.notna(row.get('min_stock')) else 5,
-                        category=category,
-                        supplier=supplier
-                    )
-                    created_count += 1
-                except Exception as e:
-                    errors.append(f"Ligne {index + 2}: {str(e)}")
-            
-            return Response({
-                'created': created_count,
-                'errors': errors
-            }, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            # Catch-all for any other unhandled error
-            import traceback
-            traceback.print_exc()
-            return Response({'detail': f'Erreur interne : {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if 'file' not in request.FILES:
+            return Response({'detail': 'Aucun fichier fourni.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        mode = request.data.get('mode') or request.query_params.get('mode') or product_import.MODE_CREATE
+        if mode not in (product_import.MODE_CREATE, product_import.MODE_UPSERT):
+            return Response({'detail': f'Mode inconnu : {mode}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        file = request.FILES['file']
+        with transaction.atomic():
+            job = ImportJob.objects.create(
+                file=file,
+                original_name=file.name,
+                mode=mode,
+                created_by=request.user
+            )
+            enqueue_import_job(job)
+        
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['post'])
     def add_stock(self, request, pk=None):
@@ -234,12 +171,51 @@ class ProductViewSet(viewsets.ModelViewSet):
             movement = serializer.save()
             return Response({
                 'message': f'{movement.quantity} unités ajoutées au stock',
-                'new_stock': product.stock,
+                'new_stock': movement.stock_after,
                 'movement_id': movement.id
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Suivi des imports de produits (polling)"""
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated, CanManageInventory]
+
+
+class BarcodeResolveView(APIView):
+    """Résolution rapide d'un code-barres pour le scan en caisse (sans filtres ni pagination)"""
+    permission_classes = [IsAuthenticated, CanAccessPOS]
+    
+    def get(self, request, barcode):
+        entry = barcode_cache.get(barcode.strip())
+        if entry is None:
+            return Response({'detail': 'Produit introuvable.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(dict(zip(BARCODE_FIELDS, entry)))
+
+
+class ProductAutocompleteView(APIView):
+    """
+    Suggestions de produits pour la saisie au POS (?q=..., ?limit=10),
+    servies par l'index en mémoire (ni COUNT ni pagination).
+    """
+    permission_classes = [IsAuthenticated, CanAccessPOS]
+    
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        results = []
+        for entry in product_index.lookup(request.query_params.get('q', ''), limit):
+            item = dict(zip(AUTOCOMPLETE_FIELDS, entry))
+            image = item.pop('image')
+            item['image_url'] = request.build_absolute_uri(default_storage.url(image)) if image else None
+            results.append(item)
+        return Response(results)
+
+
 class StockMovementViewSet(viewsets.ModelViewSet):
     """API pour les mouvements de stock"""
     queryset = StockMovement.objects.select_related(
@@ -257,13 +233,11 @@ class StockMovementViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         
         # Filtre par période
-        date_from = self.request.query_params.get('date_from')
-        date_to = self.request.query_params.get('date_to')
+        date_from = to_date(self.request.query_params.get('date_from'))
+        date_to = to_date(self.request.query_params.get('date_to'))
         
-        if date_from:
-            queryset = queryset.filter(created_at__date__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(created_at__date__lte=date_to)
+        if date_from or date_to:
+            queryset = queryset.filter(**range_filter('created_at', date_from, date_to))
         
         return queryset
     
@@ -318,6 +292,13 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
     filterset_fields = ['supplier', 'status']
     ordering = ['-created_at']
     
+    def get_queryset(self):
+        # Montant total calculé par la base : une seule jointure multivaluée (items)
+        return super().get_queryset().annotate(items_total=Coalesce(
+            Sum(F('items__quantity') * F('items__unit_cost')),
+            Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)
+        ))
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return PurchaseOrderCreateSerializer
@@ -341,33 +322,33 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Commande non envoyée'}, status=400)
         
         received_items = request.data.get('items', [])
+        items_by_id = {item.id: item for item in order.items.all()}
+        movements = []
         
-        for received in received_items:
-            try:
-                item = order.items.get(id=received['item_id'])
+        with transaction.atomic():
+            for received in received_items:
+                item = items_by_id.get(received.get('item_id'))
+                if item is None:
+                    continue
                 qty = int(received.get('quantity', item.quantity))
                 item.received_quantity += qty
-                item.save()
-                
-                # Ajouter au stock
-                item.product.stock += qty
-                item.product.save()
+                item.save(update_fields=['received_quantity'])
                 
-                # Créer mouvement de stock
-                StockMovement.objects.create(
-                    product=item.product,
-                    movement_type='IN',
+                # Mouvement d'entrée (met à jour le stock)
+                movements.append(StockMovement(
+                    product_id=item.product_id,
+                    movement_type=StockMovement.MovementType.IN,
                     quantity=qty,
                     unit_cost=item.unit_cost,
                     supplier=order.supplier,
                     reference=f"PO-{order.reference}",
                     created_by=request.user
-                )
-            except PurchaseOrderItem.DoesNotExist:
-                pass
+                ))
+            
+            record_movements(movements)
         
         # Vérifier si toute la commande est reçue
-        all_received = all(i.received_quantity >= i.quantity for i in order.items.all())
+        all_received = all(i.received_quantity >= i.quantity for i in items_by_id.values())
         order.status = 'RECEIVED' if all_received else 'PARTIAL'
         order.save()
         
@@ -429,21 +410,18 @@ class InventoryCountViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Comptage non terminé'}, status=400)
         
         adjustments = []
-        for item in count.items.all():
+        movements = []
+        for item in count.items.select_related('product'):
             diff = item.difference
-            if diff != 0:
-                # Ajuster le stock
-                item.product.stock = item.counted_quantity
-                item.product.save()
-                
-                # Créer mouvement de stock
-                StockMovement.objects.create(
+            if diff:
+                # Ajustement à la quantité comptée
+                movements.append(StockMovement(
                     product=item.product,
-                    movement_type='ADJUSTMENT',
-                    quantity=abs(diff),
+                    movement_type=StockMovement.MovementType.ADJUST,
+                    quantity=item.counted_quantity,
                     notes=f"Ajustement inventaire #{count.id}: {diff:+d}",
                     created_by=request.user
-                )
+                ))
                 adjustments.append({
                     'product': item.product.name,
                     'expected': item.expected_quantity,
@@ -451,6 +429,8 @@ class InventoryCountViewSet(viewsets.ModelViewSet):
                     'difference': diff
                 })
         
+        record_movements(movements)
+        
         count.status = 'VALIDATED'
         count.save()
         
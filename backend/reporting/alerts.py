@@ -0,0 +1,129 @@
+"""
+Alertes de stock bas.
+
+Le registre de stock signale un produit au moment où il passe sous son
+seuil (signal low_stock_reached, après le commit) :
+- l'alerte est diffusée immédiatement sur le groupe Channels du stock ;
+- le produit est ajouté au prochain email récapitulatif, envoyé par une
+  tâche différée de LOW_STOCK_DIGEST_DELAY secondes (une seule tâche en
+  attente à la fois : les alertes rapprochées partent dans le même email).
+
+Une clé de cache par produit en attente : deux workers qui signalent des
+produits au même moment n'écrasent pas la liste l'un de l'autre. L'envoi
+relit les clés des produits actuellement en stock bas (index partiel).
+
+Le récapitulatif quotidien (tasks.send_low_stock_alert) lit l'index
+partiel des produits marqués is_low_stock.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from core.realtime import broadcast_low_stock
+from inventory.models import Product
+
+PENDING_KEY = 'low-stock:pending'
+SCHEDULED_KEY = 'low-stock:scheduled'
+
+
+def low_stock_products(product_ids=None):
+    """Produits actifs en stock bas (tous, ou parmi product_ids), du plus critique au moins critique."""
+    products = Product.objects.filter(is_low_stock=True, active=True)
+    if product_ids is not None:
+        products = products.filter(pk__in=list(product_ids))
+    return list(products.order_by('stock', 'name').values('id', 'name', 'barcode', 'stock', 'min_stock'))
+
+
+def notify_low_stock(product_ids):
+    """Diffuse l'alerte et programme l'email récapitulatif."""
+    products = low_stock_products(product_ids)
+    if not products:
+        return
+    broadcast_low_stock(products)
+    queue_digest(product['id'] for product in products)
+
+
+def _pending_key(product_id):
+    return f'{PENDING_KEY}:{product_id}'
+
+
+def queue_digest(product_ids):
+    delay = getattr(settings, 'LOW_STOCK_DIGEST_DELAY', 300)
+    cache.set_many({_pending_key(pk): 1 for pk in product_ids}, delay * 10)
+    if cache.add(SCHEDULED_KEY, 1, delay + 60):
+        from .tasks import enqueue_low_stock_digest
+        enqueue_low_stock_digest(delay)
+
+
+def pop_digest():
+    """Identifiants en attente d'email ; une nouvelle alerte programmera un nouvel envoi."""
+    # Libéré d'abord : une alerte arrivée pendant la lecture programme l'envoi suivant
+    cache.delete(SCHEDULED_KEY)
+    candidates = Product.objects.filter(is_low_stock=True, active=True).values_list('pk', flat=True)
+    keys = cache.get_many([_pending_key(pk) for pk in candidates])
+    cache.delete_many(list(keys))
+    return sorted(int(key.rsplit(':', 1)[1]) for key in keys)
+
+
+def _row_class(product):
+    if product['stock'] <= 0:
+        return 'critical'
+    if product['stock'] <= product['min_stock'] / 2:
+        return 'warning'
+    return ''
+
+
+def low_stock_html(products, intro=None):
+    intro = intro or "Les produits suivants nécessitent un réapprovisionnement :"
+    rows = ''.join(
+        f"""
+                    <tr class="{_row_class(p)}">
+                        <td>{p['name']}</td>
+                        <td>{p['barcode']}</td>
+                        <td>{p['stock']}</td>
+                        <td>{p['min_stock']}</td>
+                    </tr>"""
+        for p in products
+    )
+    return f"""
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; }}
+            .header {{ background: #dc2626; color: white; padding: 20px; }}
+            .content {{ padding: 20px; }}
+            table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+            th, td {{ padding: 12px; text-align: left; border-bottom: 1px solid #e5e7eb; }}
+            th {{ background: #fef2f2; color: #dc2626; }}
+            .critical {{ background: #fee2e2; color: #dc2626; font-weight: bold; }}
+            .warning {{ background: #fef3c7; color: #d97706; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>⚠️ Alerte Stock Bas</h1>
+            <p>Librairie Attaquaddoum</p>
+        </div>
+        <div class="content">
+            <p>{intro}</p>
+
+            <table>
+                <thead>
+                    <tr>
+                        <th>Produit</th>
+                        <th>Code-barres</th>
+                        <th>Stock Actuel</th>
+                        <th>Stock Minimum</th>
+                    </tr>
+                </thead>
+                <tbody>{rows}
+                </tbody>
+            </table>
+
+            <p style="color: #6b7280; font-size: 12px;">
+                Cette alerte a été générée automatiquement.
+                Connectez-vous à l'application pour gérer votre stock.
+            </p>
+        </div>
+    </body>
+    </html>
+    """
@@ -0,0 +1,48 @@
+"""
+Reconstruit les agrégats de ventes (DailySalesRollup / HourlySalesRollup).
+
+Usage :
+    python manage.py backfill_sales_rollup                    # tout l'historique
+    python manage.py backfill_sales_rollup --from 2025-01-01 --to 2025-01-31
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from sales.models import Sale
+from reporting.rollups import rebuild_rollups
+
+
+def _parse_date(value, option):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"{option} doit être au format AAAA-MM-JJ")
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les agrégats de ventes sur une période"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="Premier jour (AAAA-MM-JJ)")
+        parser.add_argument('--to', dest='end', help="Dernier jour inclus (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        end = _parse_date(options['end'], '--to') if options['end'] else today
+
+        if options['start']:
+            start = _parse_date(options['start'], '--from')
+        else:
+            first_sale = Sale.objects.aggregate(first=Min('created_at'))['first']
+            start = timezone.localtime(first_sale).date() if first_sale else today
+
+        if start > end:
+            raise CommandError("--from doit précéder --to")
+
+        sales, returns = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f"Agrégats reconstruits du {start} au {end} : {sales} ventes, {returns} retours"
+        ))
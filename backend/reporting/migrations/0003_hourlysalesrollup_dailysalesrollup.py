@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_inventorycount_purchaseorder_purchaseorderitem_and_more'),
+        ('reporting', '0002_reportsettings_sender_email_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('hour', models.PositiveSmallIntegerField(verbose_name='Hour')),
+                ('sales_count', models.IntegerField(default=0, verbose_name='Sales Count')),
+                ('revenue_ttc', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Revenue TTC')),
+                ('returns_count', models.IntegerField(default=0, verbose_name='Returns Count')),
+                ('returns_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Returns Amount')),
+            ],
+            options={
+                'verbose_name': 'Hourly Sales Rollup',
+                'verbose_name_plural': 'Hourly Sales Rollups',
+                'ordering': ['-day', 'hour'],
+                'unique_together': {('day', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('barcode', models.CharField(blank=True, max_length=50, verbose_name='Barcode')),
+                ('product_name', models.CharField(max_length=200, verbose_name='Product Name')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantity')),
+                ('revenue_ht', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Revenue HT')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Cost')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'ordering': ['-day'],
+                'unique_together': {('day', 'barcode')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0003_hourlysalesrollup_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dailysalesrollup',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='hourlysalesrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dailysalesrollup',
+            name='store',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Store'),
+        ),
+        migrations.AddField(
+            model_name='hourlysalesrollup',
+            name='store',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Store'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysalesrollup',
+            unique_together={('day', 'store', 'barcode')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='hourlysalesrollup',
+            unique_together={('day', 'store', 'hour')},
+        ),
+    ]
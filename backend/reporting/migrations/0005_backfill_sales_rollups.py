@@ -0,0 +1,83 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Remplit les agrégats à partir des ventes et retours existants : les
+    rapports ne lisent plus que les agrégats. Même calcul que
+    reporting.rollups (heure locale, partition par magasin, coût figé).
+    """
+    Sale = apps.get_model('sales', 'Sale')
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    Return = apps.get_model('sales', 'Return')
+    Product = apps.get_model('inventory', 'Product')
+    DailySalesRollup = apps.get_model('reporting', 'DailySalesRollup')
+    HourlySalesRollup = apps.get_model('reporting', 'HourlySalesRollup')
+
+    if not Sale.objects.exists() or DailySalesRollup.objects.exists() or HourlySalesRollup.objects.exists():
+        return
+
+    def day_hour(dt):
+        local = timezone.localtime(dt)
+        return local.date(), local.hour
+
+    hourly = defaultdict(lambda: defaultdict(Decimal))
+    sale_slots = {}
+    for pk, created_at, store, total_ttc in Sale.objects.order_by('pk').values_list(
+        'pk', 'created_at', 'source_store', 'total_ttc'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        day, hour = day_hour(created_at)
+        sale_slots[pk] = (day, store)
+        hourly[(day, store, hour)]['sales_count'] += 1
+        hourly[(day, store, hour)]['revenue_ttc'] += total_ttc
+
+    for created_at, store, refund_amount in Return.objects.filter(status='COMPLETED').values_list(
+        'created_at', 'source_store', 'refund_amount'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        day, hour = day_hour(created_at)
+        hourly[(day, store, hour)]['returns_count'] += 1
+        hourly[(day, store, hour)]['returns_amount'] += refund_amount or Decimal('0')
+
+    barcodes = dict(Product.objects.values_list('pk', 'barcode').iterator(chunk_size=CHUNK_SIZE))
+    daily = {}
+    for sale_id, product_id, name, quantity, unit_price_ht, unit_cost in SaleItem.objects.order_by('pk').values_list(
+        'sale_id', 'product_id', 'product_name', 'quantity', 'unit_price_ht', 'unit_cost'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        key = (*sale_slots[sale_id], barcodes.get(product_id) or '')
+        row = daily.get(key)
+        if row is None:
+            row = daily[key] = DailySalesRollup(
+                day=key[0], store=key[1], barcode=key[2], product_id=product_id, product_name=name,
+                quantity=0, revenue_ht=Decimal('0'), cost=Decimal('0')
+            )
+        row.quantity += quantity
+        row.revenue_ht += unit_price_ht * quantity
+        row.cost += unit_cost * quantity
+
+    DailySalesRollup.objects.bulk_create(daily.values(), batch_size=500)
+    HourlySalesRollup.objects.bulk_create([
+        HourlySalesRollup(
+            day=day, store=store, hour=hour,
+            sales_count=int(values['sales_count']), revenue_ttc=values['revenue_ttc'],
+            returns_count=int(values['returns_count']), returns_amount=values['returns_amount'],
+        )
+        for (day, store, hour), values in hourly.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0004_rollup_store'),
+        ('sales', '0008_sale_source_store_created_at_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
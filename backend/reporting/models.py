@@ -123,3 +123,50 @@ class ReportLog(models.Model):
     
     def __str__(self):
         return f"{self.get_report_type_display()} - {self.period_start} to {self.period_end}"
+
+
+class DailySalesRollup(models.Model):
+    """Agrégat des ventes par jour, magasin et produit (maintenu à chaque vente)"""
+    day = models.DateField(_('Day'))
+    store = models.CharField(_('Store'), max_length=50, blank=True, default='')
+    product = models.ForeignKey(
+        'inventory.Product',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    barcode = models.CharField(_('Barcode'), max_length=50, blank=True)
+    product_name = models.CharField(_('Product Name'), max_length=200)
+    quantity = models.IntegerField(_('Quantity'), default=0)
+    revenue_ht = models.DecimalField(_('Revenue HT'), max_digits=12, decimal_places=2, default=0)
+    cost = models.DecimalField(_('Cost'), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('Daily Sales Rollup')
+        verbose_name_plural = _('Daily Sales Rollups')
+        ordering = ['-day']
+        unique_together = ['day', 'store', 'barcode']
+
+    def __str__(self):
+        return f"{self.day} - {self.product_name} ({self.quantity})"
+
+
+class HourlySalesRollup(models.Model):
+    """Agrégat des ventes et retours par jour, magasin et heure (heure locale)"""
+    day = models.DateField(_('Day'))
+    store = models.CharField(_('Store'), max_length=50, blank=True, default='')
+    hour = models.PositiveSmallIntegerField(_('Hour'))
+    sales_count = models.IntegerField(_('Sales Count'), default=0)
+    revenue_ttc = models.DecimalField(_('Revenue TTC'), max_digits=12, decimal_places=2, default=0)
+    returns_count = models.IntegerField(_('Returns Count'), default=0)
+    returns_amount = models.DecimalField(_('Returns Amount'), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('Hourly Sales Rollup')
+        verbose_name_plural = _('Hourly Sales Rollups')
+        ordering = ['-day', 'hour']
+        unique_together = ['day', 'store', 'hour']
+
+    def __str__(self):
+        return f"{self.day} {self.hour}h - {self.sales_count} ventes"
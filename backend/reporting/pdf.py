@@ -0,0 +1,257 @@
+"""
+Rendu PDF des rapports de ventes (ReportLab), partagé par le
+téléchargement (/reporting/export_pdf/) et les rapports envoyés par email.
+
+Les PDF terminés sont conservés dans le stockage de fichiers
+(default_storage) sous une clé : type de rapport, période, magasin et
+empreinte des données (`data_version`). Une vente ou un retour arrivé en
+retard sur la période change l'empreinte, donc le fichier ; une période
+close n'est rendue qu'une fois.
+"""
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import DailySalesRollup, HourlySalesRollup
+from .tasks import get_report_data
+
+# À incrémenter à chaque changement de mise en page (invalide les PDF conservés)
+LAYOUT_VERSION = 1
+
+CACHE_DIR = 'reports/pdf'
+
+TYPE_LABELS = {
+    'DAILY': 'Journalier',
+    'WEEKLY': 'Hebdomadaire',
+    'MONTHLY': 'Mensuel',
+    'QUARTERLY': 'Trimestriel',
+    'YEARLY': 'Annuel',
+}
+
+
+def data_version(start_date, end_date, store=None):
+    """
+    Empreinte des agrégats de la période : change dès qu'une vente ou un
+    retour y est ajouté (ou qu'un backfill modifie les montants).
+    """
+    partition = {'store': store} if store is not None else {}
+    hourly = HourlySalesRollup.objects.filter(
+        day__gte=start_date, day__lte=end_date, **partition
+    ).aggregate(
+        sales=Sum('sales_count'), revenue=Sum('revenue_ttc'),
+        returns=Sum('returns_count'), refunds=Sum('returns_amount')
+    )
+    daily = DailySalesRollup.objects.filter(
+        day__gte=start_date, day__lte=end_date, **partition
+    ).aggregate(rows=Count('pk'), quantity=Sum('quantity'), cost=Sum('cost'))
+    stamp = repr((LAYOUT_VERSION, sorted(hourly.items()), sorted(daily.items())))
+    return hashlib.sha1(stamp.encode('utf-8')).hexdigest()[:16]
+
+
+def item_count(start_date, end_date, store=None):
+    """Nombre de lignes d'agrégat de la période (taille du tableau des produits)."""
+    partition = {'store': store} if store is not None else {}
+    return DailySalesRollup.objects.filter(
+        day__gte=start_date, day__lte=end_date, **partition
+    ).count()
+
+
+def _store_key(store):
+    return 'all' if store is None else f'store-{store}'
+
+
+def cache_path(report_type, start_date, end_date, store, version):
+    return posixpath.join(
+        CACHE_DIR, report_type.lower(), f'{start_date}_{end_date}',
+        f'{_store_key(store)}-{version}.pdf'
+    )
+
+
+def filename(report_type, start_date):
+    return f"rapport_{report_type.lower()}_{start_date}.pdf"
+
+
+def _purge_older_versions(path):
+    """Supprime les versions précédentes du même rapport."""
+    directory, name = posixpath.split(path)
+    prefix = name.rsplit('-', 1)[0] + '-'
+    try:
+        _, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for other in files:
+        if other != name and other.startswith(prefix) and other[len(prefix):].count('-') == 0:
+            default_storage.delete(posixpath.join(directory, other))
+
+
+def cached_path(report_type, start_date, end_date, store=None):
+    """(chemin du PDF pour les données actuelles, déjà rendu ?)"""
+    path = cache_path(report_type, start_date, end_date, store, data_version(start_date, end_date, store))
+    return path, default_storage.exists(path)
+
+
+def render_to_storage(report_type, start_date, end_date, store=None):
+    """Rend le PDF s'il n'est pas déjà conservé ; retourne son chemin."""
+    # Empreinte calculée avant les données : une vente arrivée entre les deux
+    # produit au pire un nouveau rendu, jamais un PDF périmé sous la nouvelle clé
+    path, exists = cached_path(report_type, start_date, end_date, store)
+    if exists:
+        return path
+    data = get_report_data(start_date, end_date, store=store)
+    content = render(report_type, start_date, end_date, data)
+    if default_storage.exists(path):
+        # Rendu concurrent terminé entre-temps
+        return path
+    default_storage.save(path, ContentFile(content))
+    _purge_older_versions(path)
+    return path
+
+
+def get_pdf(report_type, start_date, end_date, store=None):
+    """Contenu du PDF (conservé ou rendu à la demande)."""
+    with default_storage.open(render_to_storage(report_type, start_date, end_date, store), 'rb') as f:
+        return f.read()
+
+
+def render(report_type, start_date, end_date, data):
+    """Construit le document ReportLab et retourne le PDF (bytes)."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Titre
+    title_style = ParagraphStyle(
+        'Title',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1e40af'),
+        spaceAfter=20,
+        alignment=1 # Center
+    )
+    label = TYPE_LABELS.get(report_type.upper(), report_type.capitalize())
+    elements.append(Paragraph(f"Rapport {label}", title_style))
+
+    # Sous-titre Période
+    period_style = ParagraphStyle(
+        'Period',
+        parent=styles['Normal'],
+        fontSize=12,
+        textColor=colors.gray,
+        alignment=1,
+        spaceAfter=30
+    )
+    period_str = f"Période du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}"
+    elements.append(Paragraph(period_str, period_style))
+
+    # Résumé (Tableau stats)
+    summary_data = [
+        ['Ventes', "CA", "Bénéfice Net"],
+        [str(data['total_sales']), f"{data['total_revenue']:.2f} DH", f"{data['total_profit']:.2f} DH"]
+    ]
+
+    summary_table = Table(summary_data, colWidths=[5*cm, 5*cm, 5*cm])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, 1), colors.white),
+        ('TEXTCOLOR', (0, 1), (1, 1), colors.black),
+        ('TEXTCOLOR', (2, 1), (2, 1), colors.green), # Profit en vert
+        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 1), (-1, 1), 14),
+        ('TOPPADDING', (0, 1), (-1, 1), 12),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 20))
+
+    # Détail des ventes
+    elements.append(Paragraph("Détail des produits vendus", styles['Heading2']))
+    elements.append(Spacer(1, 10))
+
+    # En-têtes tableau produits
+    table_data = [['Produit', 'Prix Unit.', 'Qté', 'Total', 'Marge']]
+
+    for item in data['items_sold']:
+        table_data.append([
+            item['name'][:35] + ('...' if len(item['name']) > 35 else ''), # Tronquer noms longs
+            f"{item.get('unit_price', 0):.2f}",
+            str(item['quantity']),
+            f"{item['revenue']:.2f}",
+            f"{item['profit']:.2f}"
+        ])
+
+    # repeatRows : en-tête répété sur chaque page des longs rapports
+    product_table = Table(table_data, colWidths=[7*cm, 2.5*cm, 1.5*cm, 3*cm, 3*cm], repeatRows=1)
+
+    product_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'), # Produit aligné gauche
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'), # Chiffres alignés droite
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('TOPPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
+        ('TEXTCOLOR', (-1, 1), (-1, -1), colors.green), # Colonne Marge en vert
+    ]))
+
+    elements.append(product_table)
+    elements.append(Spacer(1, 20))
+
+    # Section Retours (en bas, après le tableau produits)
+    if data.get('returns_count', 0) > 0:
+        returns_data = [
+            ['CA Brut', 'Retours', 'CA Net'],
+            [f"{data.get('gross_revenue', 0):.2f} DH",
+             f"-{data.get('total_returns', 0):.2f} DH ({data.get('returns_count', 0)})",
+             f"{data['total_revenue']:.2f} DH"]
+        ]
+
+        returns_table = Table(returns_data, colWidths=[5*cm, 5*cm, 5*cm])
+        returns_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#fef2f2')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#dc2626')),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, 1), colors.white),
+            ('TEXTCOLOR', (0, 1), (0, 1), colors.black),
+            ('TEXTCOLOR', (1, 1), (1, 1), colors.red),  # Retours en rouge
+            ('TEXTCOLOR', (2, 1), (2, 1), colors.HexColor('#1e40af')),  # CA Net en bleu
+            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 1), (-1, 1), 12),
+            ('TOPPADDING', (0, 1), (-1, 1), 8),
+            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#fecaca')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#fecaca')),
+        ]))
+        elements.append(returns_table)
+        elements.append(Spacer(1, 20))
+
+    # Footer
+    elements.append(Spacer(1, 20))
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.gray, alignment=1)
+    local_time = timezone.localtime(timezone.now())
+    elements.append(Paragraph(f"Généré automatiquement par Librairie App le {local_time.strftime('%d/%m/%Y à %H:%M')}", footer_style))
+
+    doc.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,135 @@
+"""
+Maintenance incrémentale des agrégats de ventes (DailySalesRollup, HourlySalesRollup).
+
+Les agrégats sont partitionnés par magasin (Sale.source_store, vide pour
+les ventes du serveur local) ; les rapports consolidés les additionnent.
+
+Les agrégats sont mis à jour après le commit de chaque vente / retour
+(signaux sales_committed et returns_completed) et peuvent être reconstruits
+sur une période avec la commande `backfill_sales_rollup`.
+Le coût d'une mise à jour ne dépend que du nombre de lignes concernées.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.timeranges import range_filter
+from inventory.models import Product
+from sales.models import Sale, SaleItem, Return
+from .models import DailySalesRollup, HourlySalesRollup
+
+CHUNK_SIZE = 2000
+
+
+def _local_day_hour(dt):
+    local = timezone.localtime(dt)
+    return local.date(), local.hour
+
+
+def _apply_increments(model, key_fields, increments, defaults=None):
+    """
+    Ajoute `increments` ({clé: {champ: valeur}}) aux lignes d'agrégat.
+    Les lignes manquantes sont créées à zéro, puis verrouillées et mises à jour.
+    """
+    if not increments:
+        return
+    defaults = defaults or {}
+    sum_fields = sorted({f for values in increments.values() for f in values})
+
+    with transaction.atomic():
+        model.objects.bulk_create([
+            model(**dict(zip(key_fields, key)), **defaults.get(key, {}))
+            for key in increments
+        ], ignore_conflicts=True)
+
+        lookup = {
+            f'{field}__in': {key[i] for key in increments}
+            for i, field in enumerate(key_fields)
+        }
+        rows = []
+        for row in model.objects.select_for_update().filter(**lookup):
+            key = tuple(getattr(row, field) for field in key_fields)
+            values = increments.get(key)
+            if values is None:
+                continue
+            for field, value in values.items():
+                setattr(row, field, getattr(row, field) + value)
+            rows.append(row)
+
+        model.objects.bulk_update(rows, sum_fields, batch_size=500)
+
+
+def rollup_sales(sale_ids):
+    """Ajoute les ventes données aux agrégats (à appeler une seule fois par vente)."""
+    sale_ids = list(sale_ids)
+    for start in range(0, len(sale_ids), CHUNK_SIZE):
+        _rollup_sales_chunk(sale_ids[start:start + CHUNK_SIZE])
+
+
+def _rollup_sales_chunk(sale_ids):
+    sale_slots = {}
+    hourly = defaultdict(lambda: {'sales_count': 0, 'revenue_ttc': Decimal('0')})
+    for sale_id, created_at, store, total_ttc in Sale.objects.filter(pk__in=sale_ids).values_list(
+        'id', 'created_at', 'source_store', 'total_ttc'
+    ):
+        day, hour = _local_day_hour(created_at)
+        sale_slots[sale_id] = (day, store)
+        hourly[(day, store, hour)]['sales_count'] += 1
+        hourly[(day, store, hour)]['revenue_ttc'] += total_ttc
+
+    # Coût figé sur la ligne (unit_cost) : pas de jointure sur inventory_product
+    items = list(SaleItem.objects.filter(sale_id__in=sale_ids).values_list(
+        'sale_id', 'product_id', 'product_name', 'quantity', 'unit_price_ht', 'unit_cost'
+    ))
+    barcodes = dict(Product.objects.filter(
+        pk__in={item[1] for item in items if item[1]}
+    ).values_list('pk', 'barcode'))
+
+    daily = defaultdict(lambda: {'quantity': 0, 'revenue_ht': Decimal('0'), 'cost': Decimal('0')})
+    names = {}
+    for sale_id, product_id, name, quantity, unit_price_ht, unit_cost in items:
+        key = (*sale_slots[sale_id], barcodes.get(product_id) or '')
+        daily[key]['quantity'] += quantity
+        daily[key]['revenue_ht'] += unit_price_ht * quantity
+        daily[key]['cost'] += unit_cost * quantity
+        names[key] = {'product_id': product_id, 'product_name': name}
+
+    with transaction.atomic():
+        _apply_increments(DailySalesRollup, ('day', 'store', 'barcode'), daily, defaults=names)
+        _apply_increments(HourlySalesRollup, ('day', 'store', 'hour'), hourly)
+
+
+def rollup_returns(return_ids):
+    """Ajoute les retours COMPLÉTÉS donnés aux agrégats horaires."""
+    hourly = defaultdict(lambda: {'returns_count': 0, 'returns_amount': Decimal('0')})
+    completed = Return.objects.filter(
+        pk__in=list(return_ids),
+        status=Return.ReturnStatus.COMPLETED
+    ).values_list('created_at', 'source_store', 'refund_amount')
+    for created_at, store, refund_amount in completed:
+        day, hour = _local_day_hour(created_at)
+        hourly[(day, store, hour)]['returns_count'] += 1
+        hourly[(day, store, hour)]['returns_amount'] += refund_amount or Decimal('0')
+
+    _apply_increments(HourlySalesRollup, ('day', 'store', 'hour'), hourly)
+
+
+def rebuild_rollups(start_date, end_date):
+    """Recalcule entièrement les agrégats des jours [start_date, end_date]."""
+    window = range_filter('created_at', start_date, end_date)
+
+    with transaction.atomic():
+        DailySalesRollup.objects.filter(day__gte=start_date, day__lte=end_date).delete()
+        HourlySalesRollup.objects.filter(day__gte=start_date, day__lte=end_date).delete()
+
+        sale_ids = list(Sale.objects.filter(**window).order_by('pk').values_list('pk', flat=True))
+        rollup_sales(sale_ids)
+
+        return_ids = list(Return.objects.filter(
+            status=Return.ReturnStatus.COMPLETED, **window
+        ).values_list('pk', flat=True))
+        rollup_returns(return_ids)
+
+    return len(sale_ids), len(return_ids)
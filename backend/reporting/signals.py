@@ -0,0 +1,29 @@
+"""
+Mise à jour des agrégats de ventes et du cache des statistiques
+à partir des signaux de l'application sales ; alertes de stock bas
+à partir de ceux de l'inventaire.
+"""
+from django.dispatch import receiver
+
+from inventory.signals import low_stock_reached
+from sales.signals import sales_committed, returns_completed
+
+
+@receiver(sales_committed)
+def rollup_committed_sales(sender, sale_ids, **kwargs):
+    from .rollups import rollup_sales
+    from .stats import invalidate_stats
+    rollup_sales(sale_ids)
+    invalidate_stats()
+
+
+@receiver(returns_completed)
+def rollup_completed_returns(sender, return_ids, **kwargs):
+    from .rollups import rollup_returns
+    rollup_returns(return_ids)
+
+
+@receiver(low_stock_reached)
+def alert_low_stock(sender, product_ids, **kwargs):
+    from .alerts import notify_low_stock
+    notify_low_stock(product_ids)
@@ -0,0 +1,116 @@
+"""
+Statistiques du tableau de bord.
+
+Les compteurs jour / semaine / mois / hier sont calculés en une seule
+requête d'agrégation conditionnelle sur Sale ; les meilleurs produits
+viennent des agrégats DailySalesRollup. Le résultat est mis en cache
+quelques secondes (clé = jour du magasin) et invalidé à chaque vente.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum, Count, Max, Q
+from django.utils import timezone
+
+from core.timeranges import day_start
+from inventory.models import Product
+from sales.models import Sale
+from .models import DailySalesRollup
+
+CACHE_PREFIX = 'reporting:stats:'
+
+
+def _cache_key(day):
+    return f'{CACHE_PREFIX}{day.isoformat()}'
+
+
+def compute_stats(today=None):
+    """Calcule les statistiques du tableau de bord (3 requêtes)."""
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    yesterday = today - timedelta(days=1)
+
+    today_from = day_start(today)
+    week_from = day_start(week_start)
+    month_from = day_start(month_start)
+    yesterday_from = day_start(yesterday)
+
+    windows = {
+        'today': Q(created_at__gte=today_from),
+        'week': Q(created_at__gte=week_from),
+        'month': Q(created_at__gte=month_from),
+        'yesterday': Q(created_at__gte=yesterday_from, created_at__lt=today_from),
+    }
+    aggregates = {}
+    for name, window in windows.items():
+        aggregates[f'{name}_count'] = Count('id', filter=window)
+        aggregates[f'{name}_revenue'] = Sum('total_ttc', filter=window)
+
+    totals = Sale.objects.filter(
+        created_at__gte=min(week_from, month_from, yesterday_from)
+    ).aggregate(**aggregates)
+
+    today_revenue = totals['today_revenue'] or Decimal('0')
+    yesterday_revenue = totals['yesterday_revenue'] or Decimal('0')
+    revenue_change = 0
+    if yesterday_revenue > 0:
+        revenue_change = ((today_revenue - yesterday_revenue) / yesterday_revenue) * 100
+
+    # Top produits du mois
+    top_products = DailySalesRollup.objects.filter(
+        day__gte=month_start, day__lte=today
+    ).values('barcode').annotate(
+        name=Max('product_name'),
+        total_qty=Sum('quantity'),
+        total_revenue=Sum('revenue_ht')
+    ).order_by('-total_qty', 'barcode')[:5]
+
+    # Produits en stock bas (index partiel is_low_stock)
+    low_stock = Product.objects.filter(
+        is_low_stock=True,
+        active=True
+    ).order_by('stock').values('id', 'name', 'stock', 'min_stock')[:10]
+
+    return {
+        'today': {
+            'sales_count': totals['today_count'],
+            'revenue': float(today_revenue),
+            'revenue_change': float(revenue_change)
+        },
+        'week': {
+            'sales_count': totals['week_count'],
+            'revenue': float(totals['week_revenue'] or 0)
+        },
+        'month': {
+            'sales_count': totals['month_count'],
+            'revenue': float(totals['month_revenue'] or 0)
+        },
+        'top_products': [
+            {
+                'product__name': item['name'],
+                'product__barcode': item['barcode'] or None,
+                'total_qty': item['total_qty'],
+                'total_revenue': item['total_revenue'],
+            }
+            for item in top_products
+        ],
+        'low_stock': list(low_stock)
+    }
+
+
+def get_stats():
+    """Statistiques du jour, servies depuis le cache si possible."""
+    today = timezone.localdate()
+    key = _cache_key(today)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(today)
+        cache.set(key, stats, getattr(settings, 'STATS_CACHE_TTL', 10))
+    return stats
+
+
+def invalidate_stats():
+    cache.delete(_cache_key(timezone.localdate()))
@@ -1,40 +1,45 @@
+import logging
+import threading
+
 from celery import shared_task
-from django.core.mail import send_mail, get_connection
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, send_mail, get_connection
+from django.db import connection as db_connection
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.db.models import Sum, F, Count
+from django.db.models import Sum, Max
 from django.conf import settings
-from datetime import timedelta
+from datetime import date, timedelta
 from decimal import Decimal
 
-from sales.models import Sale, SaleItem
-from .models import ReportSettings, ReportLog
+from .models import ReportSettings, ReportLog, DailySalesRollup, HourlySalesRollup
 
+logger = logging.getLogger(__name__)
 
-def get_report_data(start_date, end_date):
-    """Calcule les données du rapport pour une période"""
-    from sales.models import Return, ReturnItem
-    
-    # Ventes de la période
-    sales = Sale.objects.filter(
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date
-    )
-    
-    # Totaux
-    total_sales = sales.count()
-    
-    # Articles vendus groupés - utiliser le prix HT (sans TVA)
-    items = SaleItem.objects.filter(
-        sale__in=sales
-    ).values(
-        'product__name', 'product__barcode'
-    ).annotate(
+# Durée maximale d'un rendu PDF en arrière-plan (verrou anti-doublon)
+PDF_RENDER_LOCK_TTL = 600
+
+
+def get_report_data(start_date, end_date, store=None):
+    """
+    Calcule les données du rapport pour une période.
+
+    Lit uniquement les agrégats DailySalesRollup / HourlySalesRollup
+    (voir reporting.rollups) : le coût ne dépend pas du volume de ventes.
+    `store` limite le rapport à un magasin ; sans lui, le rapport consolide
+    les agrégats de tous les magasins.
+    """
+    partition = {'store': store} if store is not None else {}
+
+    daily = DailySalesRollup.objects.filter(day__gte=start_date, day__lte=end_date, **partition)
+
+    # Articles vendus groupés - prix HT (sans TVA)
+    items = daily.values('barcode').annotate(
+        name=Max('product_name'),
         total_qty=Sum('quantity'),
-        total_revenue=Sum(F('unit_price_ht') * F('quantity')),
-        total_cost=Sum(F('quantity') * F('product__purchase_price')),
-        avg_unit_price=Sum(F('unit_price_ht') * F('quantity')) / Sum('quantity')
-    ).order_by('-total_qty')
+        total_revenue=Sum('revenue_ht'),
+        total_cost=Sum('cost')
+    ).order_by('-total_qty', 'barcode')
     
     # Calcul du bénéfice
     items_sold = []
@@ -45,14 +50,14 @@ def get_report_data(start_date, end_date):
         cost = item['total_cost'] or Decimal('0')
         revenue = item['total_revenue'] or Decimal('0')
         profit = revenue - cost
-        unit_price = item['avg_unit_price'] or Decimal('0')
+        unit_price = revenue / item['total_qty'] if item['total_qty'] else Decimal('0')
         
         total_revenue += revenue
         total_profit += profit
         
         items_sold.append({
-            'name': item['product__name'],
-            'barcode': item['product__barcode'],
+            'name': item['name'],
+            'barcode': item['barcode'] or None,
             'quantity': item['total_qty'],
             'unit_price': float(unit_price),
             'revenue': float(revenue),
@@ -60,64 +65,46 @@ def get_report_data(start_date, end_date):
             'profit': float(profit)
         })
     
-    # Calcul des retours COMPLÉTÉS de la période
-    completed_returns = Return.objects.filter(
-        status='COMPLETED',
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date
+    hourly = HourlySalesRollup.objects.filter(day__gte=start_date, day__lte=end_date, **partition)
+    totals = hourly.aggregate(
+        sales=Sum('sales_count'),
+        returns=Sum('returns_count'),
+        returns_amount=Sum('returns_amount')
     )
-    
-    total_returns = Decimal('0')
-    returns_count = completed_returns.count()
-    
-    for ret in completed_returns:
-        total_returns += ret.refund_amount or Decimal('0')
+    total_sales = totals['sales'] or 0
+    returns_count = totals['returns'] or 0
+    total_returns = totals['returns_amount'] or Decimal('0')
     
     # Soustraire les retours du CA et du bénéfice
     net_revenue = float(total_revenue) - float(total_returns)
     net_profit = float(total_profit) - float(total_returns)
     
     # Données pour le graphique
-    from django.db.models.functions import TruncHour, TruncDay
-    
     chart_data = []
     
     if start_date == end_date:
-        # Vue journalière : par heure
-        hourly_sales = sales.annotate(
-            hour=TruncHour('created_at')
-        ).values('hour').annotate(
-            revenue=Sum('total_ttc'),
-            count=Count('id')
-        ).order_by('hour')
-        
-        # Remplir les trous d'heures (8h à minuit)
-        sales_by_hour = {item['hour'].hour: item for item in hourly_sales}
-        for hour in range(8, 24): # De 8h à 23h
-            data_point = sales_by_hour.get(hour, {'revenue': 0, 'count': 0})
+        # Vue journalière : par heure (8h à minuit)
+        sales_by_hour = {
+            row['hour']: row for row in hourly.values('hour').annotate(
+                revenue_ttc=Sum('revenue_ttc'),
+                sales_count=Sum('sales_count')
+            ).order_by('hour')
+        }
+        for hour in list(range(8, 24)) + [0]:
+            data_point = sales_by_hour.get(hour, {'revenue_ttc': 0, 'sales_count': 0})
             chart_data.append({
-                'label': f"{hour}h",
-                'revenue': float(data_point['revenue'] or 0),
-                'count': data_point['count'] or 0
+                'label': "00h" if hour == 0 else f"{hour}h",
+                'revenue': float(data_point['revenue_ttc'] or 0),
+                'count': data_point['sales_count'] or 0
             })
-        # Ajouter minuit (00h)
-        data_point = sales_by_hour.get(0, {'revenue': 0, 'count': 0})
-        chart_data.append({
-            'label': "00h",
-            'revenue': float(data_point['revenue'] or 0),
-            'count': data_point['count'] or 0
-        })
             
     else:
         # Vue période : par jour
-        daily_sales = sales.annotate(
-            day=TruncDay('created_at')
-        ).values('day').annotate(
-            revenue=Sum('total_ttc'),
-            count=Count('id')
-        ).order_by('day')
+        daily_sales = hourly.values('day').annotate(
+            revenue=Sum('revenue_ttc'),
+            count=Sum('sales_count')
+        ).filter(count__gt=0).order_by('day')
         
-        # Convertir en liste
         for item in daily_sales:
             chart_data.append({
                 'label': item['day'].strftime('%d/%m'),
@@ -133,6 +120,26 @@ def get_report_data(start_date, end_date):
         'chart_data': chart_data
     }
     
+    # Détail par magasin pour un rapport consolidé multi-magasins
+    if store is None:
+        stores = {
+            row['store']: row for row in hourly.values('store').annotate(
+                sales=Sum('sales_count'), returns=Sum('returns_amount')
+            ).order_by()
+        }
+        if len(stores) > 1:
+            result['by_store'] = []
+            for row in daily.values('store').annotate(
+                revenue=Sum('revenue_ht'), cost=Sum('cost')
+            ).order_by('store'):
+                counts = stores.get(row['store'], {'sales': 0, 'returns': Decimal('0')})
+                result['by_store'].append({
+                    'store': row['store'],
+                    'total_sales': counts['sales'],
+                    'total_revenue': float(row['revenue'] - counts['returns']),
+                    'total_profit': float(row['revenue'] - row['cost'] - counts['returns']),
+                })
+
     # Ajouter les retours seulement s'il y en a
     if returns_count > 0:
         result['returns_count'] = returns_count
@@ -142,6 +149,44 @@ def get_report_data(start_date, end_date):
     return result
 
 
+@shared_task
+def render_report_pdf(report_type, start_date, end_date, store=None):
+    """Rend et conserve un rapport PDF (voir reporting.pdf)."""
+    from . import pdf
+    start_date, end_date = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    try:
+        return pdf.render_to_storage(report_type, start_date, end_date, store)
+    finally:
+        cache.delete(_render_lock_key(report_type, start_date, end_date, store))
+
+
+def _render_lock_key(report_type, start_date, end_date, store):
+    return f'report-pdf:{report_type.lower()}:{start_date}:{end_date}:{store}'
+
+
+def _render_in_thread(*args):
+    try:
+        render_report_pdf(*args)
+    except Exception:
+        logger.exception("Rendu PDF échoué")
+    finally:
+        db_connection.close()
+
+
+def enqueue_report_pdf(report_type, start_date, end_date, store=None):
+    """
+    Lance le rendu hors du worker web : par Celery si un broker est
+    configuré, sinon dans un thread. Un seul rendu à la fois par rapport.
+    """
+    if not cache.add(_render_lock_key(report_type, start_date, end_date, store), 1, PDF_RENDER_LOCK_TTL):
+        return False
+    args = (report_type, start_date.isoformat(), end_date.isoformat(), store)
+    if getattr(settings, 'CELERY_BROKER_URL', ''):
+        render_report_pdf.delay(*args)
+    else:
+        threading.Thread(target=_render_in_thread, args=args, daemon=True).start()
+    return True
+
 
 def send_report_email(report_type, start_date, end_date, data, recipients):
     """Envoie le rapport par email avec configuration SMTP dynamique"""
@@ -251,15 +296,22 @@ def send_report_email(report_type, start_date, end_date, data, recipients):
             )
             from_email = settings_obj.sender_email
         
-        send_mail(
+        # Même PDF conservé que celui du téléchargement
+        from . import pdf
+        message = EmailMultiAlternatives(
             subject=subject,
-            message=f"Rapport {report_type} - CA: {data['total_revenue']:.2f} DH, Bénéfice: {data['total_profit']:.2f} DH",
+            body=f"Rapport {report_type} - CA: {data['total_revenue']:.2f} DH, Bénéfice: {data['total_profit']:.2f} DH",
             from_email=from_email,
-            recipient_list=recipients,
-            html_message=html_message,
-            fail_silently=False,
+            to=recipients,
             connection=connection
         )
+        message.attach_alternative(html_message, 'text/html')
+        message.attach(
+            pdf.filename(report_type, start_date),
+            pdf.get_pdf(report_type, start_date, end_date),
+            'application/pdf'
+        )
+        message.send(fail_silently=False)
         return True, ""
     except Exception as e:
         return False, str(e)
@@ -441,177 +493,103 @@ def send_yearly_report():
     return f"Yearly report sent: {success}"
 
 
-@shared_task
-def send_low_stock_alert():
-    """Alerte stock bas - tous les jours à 9h"""
-    from inventory.models import Product
-    
+def _send_low_stock_email(products, subject, intro=None):
+    """Envoie la liste de produits en stock bas aux destinataires des rapports."""
+    from .alerts import low_stock_html
+
     report_settings = ReportSettings.get_settings()
-    
     recipients = report_settings.get_recipients_list()
     if not recipients:
         return "No recipients configured"
-    
-    # Trouver les produits en stock bas
-    low_stock_products = Product.objects.filter(
-        stock__lte=models.F('min_stock'),
-        active=True
-    ).order_by('stock')
-    
-    if not low_stock_products.exists():
-        return "No low stock products"
-    
-    # Construire le message HTML
-    html_message = """
-    <html>
-    <head>
-        <style>
-            body { font-family: Arial, sans-serif; }
-            .header { background: #dc2626; color: white; padding: 20px; }
-            .content { padding: 20px; }
-            table { width: 100%; border-collapse: collapse; margin: 20px 0; }
-            th, td { padding: 12px; text-align: left; border-bottom: 1px solid #e5e7eb; }
-            th { background: #fef2f2; color: #dc2626; }
-            .critical { background: #fee2e2; color: #dc2626; font-weight: bold; }
-            .warning { background: #fef3c7; color: #d97706; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>⚠️ Alerte Stock Bas</h1>
-            <p>Librairie Attaquaddoum</p>
-        </div>
-        <div class="content">
-            <p>Les produits suivants nécessitent un réapprovisionnement :</p>
-            
-            <table>
-                <thead>
-                    <tr>
-                        <th>Produit</th>
-                        <th>Code-barres</th>
-                        <th>Stock Actuel</th>
-                        <th>Stock Minimum</th>
-                    </tr>
-                </thead>
-                <tbody>
-    """
-    
-    for product in low_stock_products:
-        row_class = 'critical' if product.stock == 0 else 'warning' if product.stock <= product.min_stock / 2 else ''
-        html_message += f"""
-                    <tr class="{row_class}">
-                        <td>{product.name}</td>
-                        <td>{product.barcode}</td>
-                        <td>{product.stock}</td>
-                        <td>{product.min_stock}</td>
-                    </tr>
-        """
-    
-    html_message += """
-                </tbody>
-            </table>
-            
-            <p style="color: #6b7280; font-size: 12px;">
-                Cette alerte a été générée automatiquement.
-                Connectez-vous à l'application pour gérer votre stock.
-            </p>
-        </div>
-    </body>
-    </html>
-    """
-    
-    # Envoi
-    try:
-        settings_obj = ReportSettings.get_settings()
-        connection = None
-        from_email = settings.DEFAULT_FROM_EMAIL
 
-        if settings_obj.sender_email and settings_obj.sender_password:
-            connection = get_connection(
-                host=settings_obj.smtp_host,
-                port=settings_obj.smtp_port,
-                username=settings_obj.sender_email,
-                password=settings_obj.sender_password,
-                use_tls=True
-            )
-            from_email = settings_obj.sender_email
-        
+    connection = None
+    from_email = settings.DEFAULT_FROM_EMAIL
+    if report_settings.sender_email and report_settings.sender_password:
+        connection = get_connection(
+            host=report_settings.smtp_host,
+            port=report_settings.smtp_port,
+            username=report_settings.sender_email,
+            password=report_settings.sender_password,
+            use_tls=True
+        )
+        from_email = report_settings.sender_email
+
+    html_message = low_stock_html(products, intro)
+    try:
         send_mail(
-            subject=f"⚠️ [Librairie] Alerte Stock Bas - {low_stock_products.count()} produits",
-            message=f"{low_stock_products.count()} produits sont en stock bas.",
+            subject=subject,
+            message=f"{len(products)} produits sont en stock bas.",
             from_email=from_email,
             recipient_list=recipients,
             html_message=html_message,
             fail_silently=False,
             connection=connection
         )
-        return f"Low stock alert sent for {low_stock_products.count()} products"
+        return f"Low stock alert sent for {len(products)} products"
     except Exception as e:
         return f"Error sending low stock alert: {str(e)}"
 
 
+@shared_task
+def send_low_stock_alert():
+    """Récapitulatif stock bas - tous les jours à 9h (lecture de l'index partiel is_low_stock)"""
+    from .alerts import low_stock_products
+
+    products = low_stock_products()
+    if not products:
+        return "No low stock products"
+    return _send_low_stock_email(
+        products, f"⚠️ [Librairie] Alerte Stock Bas - {len(products)} produits"
+    )
+
+
+@shared_task
+def send_low_stock_digest():
+    """Email des produits passés sous leur seuil depuis le dernier envoi (voir reporting.alerts)."""
+    from .alerts import pop_digest, low_stock_products
+
+    # Relu au moment de l'envoi : un produit réapprovisionné entre-temps n'y figure plus
+    products = low_stock_products(pop_digest())
+    if not products:
+        return "No low stock products"
+    return _send_low_stock_email(
+        products,
+        f"⚠️ [Librairie] Stock bas - {len(products)} nouveaux produits",
+        intro="Les produits suivants viennent de passer sous leur seuil d'alerte :"
+    )
+
+
+def _digest_in_thread():
+    try:
+        send_low_stock_digest()
+    except Exception:
+        logger.exception("Envoi de l'alerte stock bas échoué")
+    finally:
+        db_connection.close()
+
+
+def enqueue_low_stock_digest(delay):
+    """Programme l'email récapitulatif : Celery si un broker est configuré, sinon un minuteur."""
+    if getattr(settings, 'CELERY_BROKER_URL', ''):
+        send_low_stock_digest.apply_async(countdown=delay)
+    else:
+        timer = threading.Timer(delay, _digest_in_thread)
+        timer.daemon = True
+        timer.start()
+
+
 @shared_task
 def daily_database_backup():
     """
-    Daily database backup task - runs at 18:00 each day.
-    Saves backup with timestamp, never deletes old backups.
+    Sauvegarde quotidienne - tous les jours à 18h.
+    Incrémentale, complète une fois par semaine (voir core.backups).
     """
-    import os
-    import json
-    from django.core import serializers
-    from inventory.models import Product, Category, Supplier
-    from sales.models import Sale, SaleItem
-    from core.models import User
-    
-    now = timezone.now()
-    backup_dir = os.path.join(settings.BASE_DIR, 'backups')
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    # Create timestamped backup filename
-    timestamp = now.strftime('%Y-%m-%d_%H-%M-%S')
-    backup_file = os.path.join(backup_dir, f'backup_{timestamp}.json')
-    
+    from core.backups import run_backup
+
     try:
-        backup_data = {
-            'timestamp': now.isoformat(),
-            'models': {}
-        }
-        
-        # Backup each model
-        models_to_backup = [
-            ('products', Product),
-            ('categories', Category),
-            ('suppliers', Supplier),
-            ('sales', Sale),
-            ('sale_items', SaleItem),
-            ('users', User),
-        ]
-        
-        for name, model in models_to_backup:
-            try:
-                data = serializers.serialize('json', model.objects.all())
-                backup_data['models'][name] = json.loads(data)
-            except Exception as e:
-                backup_data['models'][name] = {'error': str(e)}
-        
-        # Write backup file
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=2)
-        
-        # Log the backup
-        ReportLog.objects.create(
-            type='BACKUP',
-            recipients='local',
-            success=True
-        )
-        
-        return f"Backup created: {backup_file}"
-        
+        manifest = run_backup()
     except Exception as e:
-        ReportLog.objects.create(
-            type='BACKUP',
-            recipients='local',
-            success=False,
-            error_message=str(e)
-        )
+        logger.exception("Sauvegarde de la base échouée")
         return f"Backup failed: {str(e)}"
+    rows = sum(table['rows'] for table in manifest['tables'].values())
+    return f"Backup created: {manifest['path']} ({manifest['kind']}, {rows} rows)"
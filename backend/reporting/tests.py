@@ -4,11 +4,29 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from decimal import Decimal
 from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+import posixpath
+import shutil
+import tempfile
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from inventory.models import Product
 from sales.models import Sale, SaleItem
-from .models import ReportSettings, ReportLog
-from .tasks import get_report_data
+from sales.checkout import create_sale
+from .models import ReportSettings, ReportLog, DailySalesRollup, HourlySalesRollup
+from . import alerts, pdf
+from .rollups import rollup_sales
+from .stats import get_stats
+from .tasks import get_report_data, render_report_pdf, send_report_email, send_low_stock_alert, send_low_stock_digest
 
 User = get_user_model()
 
@@ -83,14 +101,101 @@ class ReportDataTest(TestCase):
             total_price_ht=Decimal('20.00'),
             tva_rate=Decimal('20.00')
         )
+        rollup_sales([sale.id])
         
-        today = date.today()
+        today = timezone.localdate()
         data = get_report_data(today, today)
         
         self.assertEqual(data['total_sales'], 1)
-        self.assertEqual(data['total_revenue'], 24.0)
+        self.assertEqual(data['total_revenue'], 20.0)  # CA HT
         self.assertGreater(data['total_profit'], 0)
         self.assertEqual(len(data['items_sold']), 1)
+    
+    def test_rollup_updated_on_commit(self):
+        """Les agrégats sont mis à jour après le commit de la vente"""
+        with self.captureOnCommitCallbacks(execute=True):
+            create_sale(self.user, [{'product_id': self.product.id, 'quantity': 3}])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_sale(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+        
+        today = timezone.localdate()
+        row = DailySalesRollup.objects.get(day=today, barcode=self.product.barcode)
+        self.assertEqual(row.quantity, 4)
+        self.assertEqual(row.revenue_ht, Decimal('40.00'))
+        self.assertEqual(row.cost, Decimal('24.00'))
+        
+        data = get_report_data(today, today)
+        self.assertEqual(data['total_sales'], 2)
+        self.assertEqual(data['total_revenue'], 40.0)
+        self.assertEqual(data['total_profit'], 16.0)
+        # Agrégats horaires plutôt que chart_data (heures d'ouverture seulement)
+        hourly = HourlySalesRollup.objects.filter(day=today).aggregate(n=Sum('sales_count'))
+        self.assertEqual(hourly['n'], 2)
+    
+    def test_profit_uses_cost_snapshot(self):
+        """Le bénéfice utilise le coût figé à la vente, pas le prix d'achat actuel"""
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = create_sale(self.user, [{'product_id': self.product.id, 'quantity': 2}])
+        self.assertEqual(sale.items.get().unit_cost, Decimal('6.00'))
+        
+        self.product.purchase_price = Decimal('9.00')
+        self.product.save()
+        
+        today = timezone.localdate()
+        call_command('backfill_sales_rollup', '--from', str(today), '--to', str(today), stdout=StringIO())
+        data = get_report_data(today, today)
+        self.assertEqual(data['total_profit'], 8.0)
+    
+    def test_report_per_store(self):
+        """Les agrégats sont partitionnés par magasin ; le rapport consolidé les détaille"""
+        with self.captureOnCommitCallbacks(execute=True):
+            create_sale(self.user, [{'product_id': self.product.id, 'quantity': 3}])
+            sale = create_sale(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+        Sale.objects.filter(pk=sale.pk).update(source_store='rabat')
+        today = timezone.localdate()
+        call_command('backfill_sales_rollup', '--from', str(today), '--to', str(today), stdout=StringIO())
+        
+        data = get_report_data(today, today, store='rabat')
+        self.assertEqual(data['total_sales'], 1)
+        self.assertEqual(data['total_revenue'], 10.0)
+        self.assertNotIn('by_store', data)
+        
+        data = get_report_data(today, today)
+        self.assertEqual(data['total_sales'], 2)
+        self.assertEqual(data['total_revenue'], 40.0)
+        self.assertEqual(
+            [(row['store'], row['total_sales'], row['total_revenue']) for row in data['by_store']],
+            [('', 1, 30.0), ('rabat', 1, 10.0)]
+        )
+    
+    def test_backfill_command(self):
+        """La commande de backfill reconstruit les agrégats sans doublons"""
+        for _ in range(2):
+            sale = Sale.objects.create(
+                user=self.user,
+                total_ht=Decimal('10.00'),
+                total_tva=Decimal('2.00'),
+                total_ttc=Decimal('12.00'),
+                payment_method='CASH'
+            )
+            SaleItem.objects.create(
+                sale=sale,
+                product=self.product,
+                product_name=self.product.name,
+                quantity=1,
+                unit_price_ht=Decimal('10.00'),
+                total_price_ht=Decimal('10.00'),
+                tva_rate=Decimal('20.00')
+            )
+        
+        today = timezone.localdate()
+        call_command('backfill_sales_rollup', '--from', str(today), '--to', str(today), stdout=StringIO())
+        call_command('backfill_sales_rollup', '--from', str(today), '--to', str(today), stdout=StringIO())
+        
+        data = get_report_data(today, today)
+        self.assertEqual(data['total_sales'], 2)
+        self.assertEqual(data['items_sold'][0]['quantity'], 2)
+        self.assertEqual(data['total_revenue'], 20.0)
 
 
 class ReportLogTest(TestCase):
@@ -152,6 +257,28 @@ class ReportingAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('today', response.data)
     
+    def test_stats_cached_and_invalidated_on_sale(self):
+        """Les statistiques sont servies du cache et invalidées à chaque vente"""
+        cache.clear()
+        product = Product.objects.create(
+            name='Stylo', barcode='555', sale_price_ht=Decimal('10.00'),
+            purchase_price=Decimal('5.00'), tva=Decimal('20.00'), stock=10
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(get_stats()['today']['sales_count'], 0)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+        
+        with self.assertNumQueries(0):
+            get_stats()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            create_sale(self.admin, [{'product_id': product.id, 'quantity': 2}])
+        
+        stats = get_stats()
+        self.assertEqual(stats['today']['sales_count'], 1)
+        self.assertEqual(stats['today']['revenue'], 24.0)
+        self.assertEqual(stats['top_products'][0]['total_qty'], 2)
+    
     def test_report_settings(self):
         """Test endpoint paramètres rapports"""
         response = self.client.get('/api/reporting/settings/')
@@ -171,3 +298,143 @@ class ReportingAPITest(APITestCase):
         """Test liste des logs de rapports"""
         response = self.client.get('/api/reporting/logs/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ReportPdfTest(APITestCase):
+    """Tests pour le rendu PDF partagé et conservé"""
+    
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        self.admin = User.objects.create_user(username='admin', password='admin123', role='ADMIN')
+        self.client.force_authenticate(self.admin)
+        self.product = Product.objects.create(
+            name='Cahier', barcode='123', sale_price_ht=Decimal('10.00'),
+            purchase_price=Decimal('6.00'), stock=100
+        )
+        self.today = timezone.localdate()
+        self.url = f'/api/reporting/export_pdf/?type=daily&date={self.today}'
+        self._sell()
+    
+    def _sell(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_sale(self.admin, [{'product_id': self.product.id, 'quantity': 1}])
+    
+    def _download(self):
+        response = self.client.get(self.url)
+        return response, b''.join(response.streaming_content) if response.status_code == 200 else None
+    
+    def test_pdf_cached_until_period_changes(self):
+        """Un rapport inchangé n'est rendu qu'une fois ; une vente tardive le renouvelle"""
+        with mock.patch('reporting.pdf.render', wraps=pdf.render) as render:
+            response, first = self._download()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(first.startswith(b'%PDF'))
+            _, second = self._download()
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(first, second)
+            
+            self._sell()
+            self._download()
+            self.assertEqual(render.call_count, 2)
+        
+        _, files = default_storage.listdir(f'reports/pdf/daily/{self.today}_{self.today}')
+        self.assertEqual(files, [posixpath.basename(pdf.cached_path('daily', self.today, self.today)[0])])
+    
+    def test_large_report_rendered_in_background(self):
+        """Au-delà du seuil, 202 puis le PDF rendu par la tâche"""
+        def run_now(*args):
+            render_report_pdf(*args)
+        
+        with self.settings(REPORT_PDF_ASYNC_ROWS=1, CELERY_BROKER_URL='memory://'), \
+                mock.patch('reporting.tasks.render_report_pdf.delay', side_effect=run_now) as delay:
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data['download_url'], self.url)
+            delay.assert_called_once_with('daily', str(self.today), str(self.today), None)
+            
+            response, content = self._download()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(content.startswith(b'%PDF'))
+    
+    def test_email_attaches_cached_pdf(self):
+        """L'email joint le même PDF que le téléchargement"""
+        data = get_report_data(self.today, self.today)
+        success, error = send_report_email('DAILY', self.today, self.today, data, ['gerant@example.com'])
+        self.assertTrue(success, error)
+        
+        [(name, content, mimetype)] = mail.outbox[0].attachments
+        self.assertEqual(mimetype, 'application/pdf')
+        path, ready = pdf.cached_path('DAILY', self.today, self.today)
+        self.assertTrue(ready)
+        with default_storage.open(path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+
+class LowStockAlertTest(TestCase):
+    """Tests pour les alertes de stock bas"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alerte', password='test123')
+        settings = ReportSettings.get_settings()
+        settings.email_recipients = 'gerant@example.com'
+        settings.save()
+        self.product = Product.objects.create(
+            name='Stylo', barcode='7770000000001', sale_price_ht=Decimal('3.00'), stock=6, min_stock=5
+        )
+    
+    def _sell(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_sale(self.user, [{'product_id': self.product.id, 'quantity': quantity}])
+    
+    def test_digest_scheduled_once(self):
+        """Les alertes rapprochées partent dans un seul email"""
+        other = Product.objects.create(
+            name='Crayon', barcode='7770000000002', sale_price_ht=Decimal('1.00'), stock=2, min_stock=1
+        )
+        with mock.patch('reporting.tasks.enqueue_low_stock_digest') as enqueue, \
+                mock.patch('reporting.alerts.broadcast_low_stock') as broadcast:
+            self._sell(1)
+            with self.captureOnCommitCallbacks(execute=True):
+                create_sale(self.user, [{'product_id': other.id, 'quantity': 1}])
+        enqueue.assert_called_once()
+        self.assertEqual(broadcast.call_count, 2)
+        
+        send_low_stock_digest()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Stylo', mail.outbox[0].alternatives[0][0])
+        self.assertIn('Crayon', mail.outbox[0].alternatives[0][0])
+        self.assertEqual(alerts.pop_digest(), [])
+    
+    def test_pending_ids_are_not_overwritten(self):
+        """Des alertes de deux workers s'ajoutent sans relecture de la liste ; seul le stock bas actuel est envoyé"""
+        other = Product.objects.create(
+            name='Gomme', barcode='7770000000003', sale_price_ht=Decimal('1.00'), stock=0, min_stock=1
+        )
+        self.product.stock = 1
+        self.product.save(update_fields=['stock'])
+        with mock.patch('reporting.tasks.enqueue_low_stock_digest') as enqueue:
+            alerts.queue_digest([self.product.id])
+            alerts.queue_digest([other.id])
+        enqueue.assert_called_once()
+        
+        other.stock = 10
+        other.save(update_fields=['stock'])
+        self.assertEqual(alerts.pop_digest(), [self.product.id])
+        self.assertEqual(alerts.pop_digest(), [])
+    
+    def test_daily_alert_reads_flag(self):
+        """Le récapitulatif quotidien liste les produits marqués"""
+        self.assertEqual(send_low_stock_alert(), "No low stock products")
+        self.product.stock = 2
+        self.product.save(update_fields=['stock'])
+        with self.assertNumQueries(1):
+            products = alerts.low_stock_products()
+        self.assertEqual([p['id'] for p in products], [self.product.id])
+        send_low_stock_alert()
+        self.assertEqual(len(mail.outbox), 1)
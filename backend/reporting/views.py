@@ -3,26 +3,22 @@ from rest_framework import generics, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, F
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse
 from django.utils import timezone
 from datetime import timedelta, datetime
-from decimal import Decimal
 
-from sales.models import Sale, SaleItem
-from inventory.models import Product
 from core.permissions import IsAdminRole, CanAccessReports
-from django.http import HttpResponse
+from . import pdf
 from .models import ReportSettings, ReportLog
 from .serializers import ReportSettingsSerializer, ReportLogSerializer
-from .tasks import get_report_data
+from .tasks import get_report_data, enqueue_report_pdf
+from .stats import get_stats
 import logging
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from io import BytesIO
+logger = logging.getLogger(__name__)
+
 
 class ExportReportView(APIView):
     """Générer un PDF du rapport (Via ReportLab pour compatibilité Windows)"""
@@ -49,152 +45,32 @@ class ExportReportView(APIView):
             else:
                 end_date = start_date.replace(month=month+1, day=1) - timedelta(days=1)
         
-        # Données
-        data = get_report_data(start_date, end_date)
+        store = request.query_params.get('store')
 
         try:
-            # Création du PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
-            
-            elements = []
-            styles = getSampleStyleSheet()
-            
-            # Titre
-            title_style = ParagraphStyle(
-                'Title',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor=colors.HexColor('#1e40af'),
-                spaceAfter=20,
-                alignment=1 # Center
-            )
-            elements.append(Paragraph(f"Rapport {report_type.capitalize()}", title_style))
-            
-            # Sous-titre Période
-            period_style = ParagraphStyle(
-                'Period',
-                parent=styles['Normal'],
-                fontSize=12,
-                textColor=colors.gray,
-                alignment=1,
-                spaceAfter=30
+            # PDF conservé tant que les données de la période ne changent pas
+            path, ready = pdf.cached_path(report_type, start_date, end_date, store)
+            if not ready:
+                if pdf.item_count(start_date, end_date, store) >= settings.REPORT_PDF_ASYNC_ROWS:
+                    # Gros rapport : rendu en arrière-plan, le client rappelle la même URL
+                    enqueue_report_pdf(report_type, start_date, end_date, store)
+                    response = Response(
+                        {'status': 'pending', 'download_url': request.get_full_path()},
+                        status=202
+                    )
+                    response['Retry-After'] = '2'
+                    return response
+                path = pdf.render_to_storage(report_type, start_date, end_date, store)
+
+            return FileResponse(
+                default_storage.open(path, 'rb'),
+                as_attachment=True,
+                filename=pdf.filename(report_type, start_date),
+                content_type='application/pdf'
             )
-            period_str = f"Période du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}"
-            elements.append(Paragraph(period_str, period_style))
-
-            # Résumé (Tableau stats)
-            summary_data = [
-                ['Ventes', "CA", "Bénéfice Net"],
-                [str(data['total_sales']), f"{data['total_revenue']:.2f} DH", f"{data['total_profit']:.2f} DH"]
-            ]
-            
-            summary_table = Table(summary_data, colWidths=[5*cm, 5*cm, 5*cm])
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, 1), colors.white),
-                ('TEXTCOLOR', (0, 1), (1, 1), colors.black),
-                ('TEXTCOLOR', (2, 1), (2, 1), colors.green), # Profit en vert
-                ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 1), (-1, 1), 14),
-                ('TOPPADDING', (0, 1), (-1, 1), 12),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-            ]))
-            elements.append(summary_table)
-            elements.append(Spacer(1, 20))
-
-            # Détail des ventes
-            elements.append(Paragraph("Détail des produits vendus", styles['Heading2']))
-            elements.append(Spacer(1, 10))
-
-            # En-têtes tableau produits
-            table_data = [['Produit', 'Prix Unit.', 'Qté', 'Total', 'Marge']]
-            
-            for item in data['items_sold']:
-                table_data.append([
-                    item['name'][:35] + ('...' if len(item['name']) > 35 else ''), # Tronquer noms longs
-                    f"{item.get('unit_price', 0):.2f}",
-                    str(item['quantity']),
-                    f"{item['revenue']:.2f}",
-                    f"{item['profit']:.2f}"
-                ])
-                
-            # Création tableau produits
-            row_count = len(table_data)
-            product_table = Table(table_data, colWidths=[7*cm, 2.5*cm, 1.5*cm, 3*cm, 3*cm])
-            
-            product_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'), # Produit aligné gauche
-                ('ALIGN', (1, 0), (-1, -1), 'RIGHT'), # Chiffres alignés droite
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('TOPPADDING', (0, 0), (-1, 0), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-                ('TEXTCOLOR', (-1, 1), (-1, -1), colors.green), # Colonne Marge en vert
-            ]))
-            
-            elements.append(product_table)
-            elements.append(Spacer(1, 20))
-            
-            # Section Retours (en bas, après le tableau produits)
-            if data.get('returns_count', 0) > 0:
-                returns_data = [
-                    ['CA Brut', 'Retours', 'CA Net'],
-                    [f"{data.get('gross_revenue', 0):.2f} DH", 
-                     f"-{data.get('total_returns', 0):.2f} DH ({data.get('returns_count', 0)})", 
-                     f"{data['total_revenue']:.2f} DH"]
-                ]
-                
-                returns_table = Table(returns_data, colWidths=[5*cm, 5*cm, 5*cm])
-                returns_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#fef2f2')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#dc2626')),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                    ('BACKGROUND', (0, 1), (-1, 1), colors.white),
-                    ('TEXTCOLOR', (0, 1), (0, 1), colors.black),
-                    ('TEXTCOLOR', (1, 1), (1, 1), colors.red),  # Retours en rouge
-                    ('TEXTCOLOR', (2, 1), (2, 1), colors.HexColor('#1e40af')),  # CA Net en bleu
-                    ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 1), (-1, 1), 12),
-                    ('TOPPADDING', (0, 1), (-1, 1), 8),
-                    ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#fecaca')),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#fecaca')),
-                ]))
-                elements.append(returns_table)
-                elements.append(Spacer(1, 20))
-            
-            # Footer
-            elements.append(Spacer(1, 20))
-            footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.gray, alignment=1)
-            local_time = timezone.localtime(timezone.now())
-            elements.append(Paragraph(f"Généré automatiquement par Librairie App le {local_time.strftime('%d/%m/%Y à %H:%M')}", footer_style))
-
-            # Build
-            doc.build(elements)
-            pdf = buffer.getvalue()
-            buffer.close()
-
-            response = HttpResponse(content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="rapport_{report_type}_{start_date}.pdf"'
-            response.write(pdf)
-            
-            return response
 
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Erreur PDF")
             return Response({'detail': f"Erreur PDF: {str(e)}"}, status=500)
 
 
@@ -210,7 +86,7 @@ class DailyReportView(APIView):
         else:
             date = timezone.now().date()
         
-        data = get_report_data(date, date)
+        data = get_report_data(date, date, store=request.query_params.get('store'))
         data['date'] = date
         
         return Response(data)
@@ -228,7 +104,7 @@ class WeeklyReportView(APIView):
         end_date = today - timedelta(days=7 * week_offset)
         start_date = end_date - timedelta(days=6)
         
-        data = get_report_data(start_date, end_date)
+        data = get_report_data(start_date, end_date, store=request.query_params.get('store'))
         data['period_start'] = start_date
         data['period_end'] = end_date
         
@@ -253,7 +129,7 @@ class MonthlyReportView(APIView):
         else:
             end_date = start_date.replace(month=month+1, day=1) - timedelta(days=1)
         
-        data = get_report_data(start_date, end_date)
+        data = get_report_data(start_date, end_date, store=request.query_params.get('store'))
         data['period_start'] = start_date
         data['period_end'] = end_date
         data['month'] = month
@@ -263,69 +139,11 @@ class MonthlyReportView(APIView):
 
 
 class StatsView(APIView):
-    """Statistiques générales"""
+    """Statistiques générales (voir reporting.stats)"""
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        today = timezone.now().date()
-        
-        # Ventes du jour
-        today_sales = Sale.objects.filter(created_at__date=today)
-        today_revenue = today_sales.aggregate(Sum('total_ttc'))['total_ttc__sum'] or 0
-        
-        # Ventes de la semaine
-        week_start = today - timedelta(days=today.weekday())
-        week_sales = Sale.objects.filter(created_at__date__gte=week_start)
-        week_revenue = week_sales.aggregate(Sum('total_ttc'))['total_ttc__sum'] or 0
-        
-        # Ventes du mois
-        month_start = today.replace(day=1)
-        month_sales = Sale.objects.filter(created_at__date__gte=month_start)
-        month_revenue = month_sales.aggregate(Sum('total_ttc'))['total_ttc__sum'] or 0
-        
-        # Top produits
-        top_products = SaleItem.objects.filter(
-            sale__created_at__date__gte=month_start
-        ).values(
-            'product__name', 'product__barcode'
-        ).annotate(
-            total_qty=Sum('quantity'),
-            total_revenue=Sum('total_price_ht')
-        ).order_by('-total_qty')[:5]
-        
-        # Produits en stock bas
-        low_stock = Product.objects.filter(
-            stock__lte=F('min_stock'),
-            active=True
-        ).values('id', 'name', 'stock', 'min_stock')[:10]
-        
-        # Comparaison avec hier
-        yesterday = today - timedelta(days=1)
-        yesterday_revenue = Sale.objects.filter(
-            created_at__date=yesterday
-        ).aggregate(Sum('total_ttc'))['total_ttc__sum'] or Decimal('0')
-        
-        revenue_change = 0
-        if yesterday_revenue > 0:
-            revenue_change = ((today_revenue - yesterday_revenue) / yesterday_revenue) * 100
-        
-        return Response({
-            'today': {
-                'sales_count': today_sales.count(),
-                'revenue': float(today_revenue),
-                'revenue_change': float(revenue_change)
-            },
-            'week': {
-                'sales_count': week_sales.count(),
-                'revenue': float(week_revenue)
-            },
-            'month': {
-                'sales_count': month_sales.count(),
-                'revenue': float(month_revenue)
-            },
-            'top_products': list(top_products),
-            'low_stock': list(low_stock)
-        })
+        return Response(get_stats())
 
 
 class ReportSettingsView(generics.RetrieveUpdateAPIView):
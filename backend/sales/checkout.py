@@ -0,0 +1,115 @@
+"""
+Moteur d'encaissement : création d'une vente en une seule transaction.
+
+Le nombre de requêtes reste constant quelle que soit la taille du panier :
+- un SELECT ... FOR UPDATE sur les produits concernés,
+- un INSERT pour la vente et un bulk INSERT pour les lignes,
+- un seul UPDATE conditionnel via le registre de stock, suivi d'un bulk
+  INSERT des mouvements de sortie.
+L'événement temps réel est publié une seule fois, après le commit.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+
+from inventory.models import Product, StockMovement
+from inventory.stock_ledger import record_movements, InsufficientStock
+from .models import Sale, SaleItem
+from .signals import sales_committed
+
+
+class CheckoutError(Exception):
+    """Erreur métier lors de l'encaissement (produit introuvable, stock insuffisant)"""
+
+
+def _requested_quantities(items_data):
+    """Quantités demandées par produit (les lignes en double sont cumulées)."""
+    quantities = OrderedDict()
+    for item in items_data:
+        product_id = item['product_id']
+        quantities[product_id] = quantities.get(product_id, 0) + item['quantity']
+    return quantities
+
+
+def create_sale(user, items_data, **sale_fields):
+    """
+    Crée une vente et ses lignes, et décrémente le stock de manière atomique.
+
+    `items_data` est une liste de dicts {'product_id': int, 'quantity': int}.
+    Lève CheckoutError si un produit est introuvable ou en stock insuffisant.
+    """
+    quantities = _requested_quantities(items_data)
+
+    with transaction.atomic():
+        # Verrouiller les produits dans un ordre stable pour éviter les interblocages
+        products = {
+            p.pk: p for p in Product.objects.select_for_update().filter(
+                pk__in=quantities.keys()
+            ).order_by('pk')
+        }
+
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                raise CheckoutError(f"Produit introuvable: {product_id}")
+            if product.stock < quantity:
+                raise CheckoutError(
+                    f"Stock insuffisant pour {product.name}. Disponible: {product.stock}"
+                )
+
+        total_ht = Decimal('0')
+        total_tva = Decimal('0')
+        lines = []
+
+        for item in items_data:
+            product = products[item['product_id']]
+            quantity = item['quantity']
+
+            unit_price_ht = product.sale_price_ht
+            tva_rate = product.tva
+            line_ht = unit_price_ht * quantity
+            line_tva = line_ht * (tva_rate / 100)
+
+            total_ht += line_ht
+            total_tva += line_tva
+
+            lines.append(SaleItem(
+                product=product,
+                product_name=product.name,
+                quantity=quantity,
+                unit_price_ht=unit_price_ht,
+                total_price_ht=line_ht,
+                tva_rate=tva_rate,
+                unit_cost=product.purchase_price
+            ))
+
+        sale = Sale.objects.create(
+            user=user,
+            total_ht=total_ht,
+            total_tva=total_tva,
+            total_ttc=total_ht + total_tva,
+            **sale_fields
+        )
+
+        for line in lines:
+            line.sale = sale
+        SaleItem.objects.bulk_create(lines)
+
+        try:
+            record_movements([
+                StockMovement(
+                    product=products[product_id],
+                    movement_type=StockMovement.MovementType.OUT,
+                    quantity=quantity,
+                    reference=f"Vente #{sale.id}",
+                    created_by=user
+                )
+                for product_id, quantity in quantities.items()
+            ], allow_negative=False)
+        except InsufficientStock as e:
+            raise CheckoutError(str(e))
+
+        transaction.on_commit(lambda: sales_committed.send(sender=Sale, sale_ids=[sale.id]))
+
+    return sale
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_return_synced_sale_synced_sale_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Unit Cost'),
+        ),
+    ]
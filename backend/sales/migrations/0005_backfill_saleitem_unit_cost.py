@@ -0,0 +1,55 @@
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def backfill_unit_cost(apps, schema_editor):
+    """
+    Renseigne unit_cost pour les lignes existantes : prix d'achat en vigueur
+    à la date de la vente, reconstitué à partir de PriceHistory
+    (old_purchase_price du premier changement postérieur à la vente,
+    sinon prix d'achat actuel du produit).
+    """
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    Product = apps.get_model('inventory', 'Product')
+    PriceHistory = apps.get_model('inventory', 'PriceHistory')
+
+    current = dict(Product.objects.values_list('id', 'purchase_price'))
+    dates = defaultdict(list)
+    prices = defaultdict(list)
+    for product_id, changed_at, old_price in PriceHistory.objects.order_by(
+        'product_id', 'changed_at'
+    ).values_list('product_id', 'changed_at', 'old_purchase_price'):
+        dates[product_id].append(changed_at)
+        prices[product_id].append(old_price)
+
+    batch = []
+    items = SaleItem.objects.filter(product__isnull=False).select_related('sale').only(
+        'id', 'product_id', 'unit_cost', 'sale__created_at'
+    )
+    for item in items.iterator(chunk_size=2000):
+        history = dates.get(item.product_id, [])
+        idx = bisect_right(history, item.sale.created_at)
+        if idx < len(history):
+            item.unit_cost = prices[item.product_id][idx]
+        else:
+            item.unit_cost = current.get(item.product_id) or 0
+        batch.append(item)
+        if len(batch) >= 2000:
+            SaleItem.objects.bulk_update(batch, ['unit_cost'])
+            batch = []
+    if batch:
+        SaleItem.objects.bulk_update(batch, ['unit_cost'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_saleitem_unit_cost'),
+        ('inventory', '0004_pricehistory'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unit_cost, migrations.RunPython.noop),
+    ]
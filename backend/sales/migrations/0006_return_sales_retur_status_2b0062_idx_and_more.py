@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_backfill_saleitem_unit_cost'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='return',
+            index=models.Index(fields=['status', 'created_at'], name='sales_retur_status_2b0062_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['created_at'], name='sales_sale_created_e208b3_idx'),
+        ),
+    ]
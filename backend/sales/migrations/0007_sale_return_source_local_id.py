@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_return_sales_retur_status_2b0062_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='return',
+            name='local_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Local ID'),
+        ),
+        migrations.AddField(
+            model_name='return',
+            name='source_store',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Source Store'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='local_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Local ID'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='source_store',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Source Store'),
+        ),
+        migrations.AddConstraint(
+            model_name='return',
+            constraint=models.UniqueConstraint(condition=models.Q(('local_id__isnull', False)), fields=('source_store', 'local_id'), name='unique_return_source_local_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='sale',
+            constraint=models.UniqueConstraint(condition=models.Q(('local_id__isnull', False)), fields=('source_store', 'local_id'), name='unique_sale_source_local_id'),
+        ),
+    ]
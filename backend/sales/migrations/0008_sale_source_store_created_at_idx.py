@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_sale_return_source_local_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['source_store', 'created_at'], name='sales_sale_source__36d161_idx'),
+        ),
+    ]
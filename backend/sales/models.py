@@ -17,9 +17,23 @@ class Sale(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     synced = models.BooleanField(_('Synced to cloud'), default=False)
+    # Origine d'une vente reçue par synchronisation (côté cloud)
+    source_store = models.CharField(_('Source Store'), max_length=50, blank=True, default='')
+    local_id = models.BigIntegerField(_('Local ID'), null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['source_store', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_store', 'local_id'],
+                condition=models.Q(local_id__isnull=False),
+                name='unique_sale_source_local_id'
+            ),
+        ]
 
     def __str__(self):
         return f"Sale #{self.id} - {self.total_ttc} €"
@@ -32,6 +46,8 @@ class SaleItem(models.Model):
     unit_price_ht = models.DecimalField(max_digits=10, decimal_places=2)
     total_price_ht = models.DecimalField(max_digits=10, decimal_places=2)
     tva_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    # Prix d'achat unitaire au moment de la vente (marges historiques exactes)
+    unit_cost = models.DecimalField(_('Unit Cost'), max_digits=10, decimal_places=2, default=0)
 
     def __str__(self):
         return f"{self.quantity}x {self.product_name}"
@@ -129,11 +145,24 @@ class Return(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     synced = models.BooleanField(_('Synced to cloud'), default=False)
+    # Origine d'un retour reçu par synchronisation (côté cloud)
+    source_store = models.CharField(_('Source Store'), max_length=50, blank=True, default='')
+    local_id = models.BigIntegerField(_('Local ID'), null=True, blank=True)
 
     class Meta:
         verbose_name = _('Return')
         verbose_name_plural = _('Returns')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_store', 'local_id'],
+                condition=models.Q(local_id__isnull=False),
+                name='unique_return_source_local_id'
+            ),
+        ]
 
     def __str__(self):
         return f"Return #{self.id} for Sale #{self.sale_id}"
@@ -1,13 +1,16 @@
 from rest_framework import serializers
+from django.db import transaction
+from inventory.models import StockMovement
+from inventory.stock_ledger import record_movements
 from .models import Sale, SaleItem, Discount, Return, ReturnItem
-from inventory.models import Product
+from .signals import returns_completed
+from .checkout import create_sale, CheckoutError
 
 
 class SaleItemSerializer(serializers.ModelSerializer):
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(), 
-        source='product'
-    )
+    # Les produits sont chargés (et verrouillés) en une seule requête par le moteur d'encaissement
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
     
     class Meta:
         model = SaleItem
@@ -47,82 +50,11 @@ class SaleSerializer(serializers.ModelSerializer):
         items_data = validated_data.pop('items')
         # Eviter duplication si 'user' est passé par save() et context
         user = validated_data.pop('user', None) or self.context['request'].user
-        
-        # Calculate totals
-        total_ht = 0
-        total_tva = 0
-        total_cost = 0  # Pour calculer le bénéfice
-        
-        # Prepare items and check stock
-        prepared_items = []
-        
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            
-            if product.stock < quantity:
-                raise serializers.ValidationError(
-                    f"Stock insuffisant pour {product.name}. Disponible: {product.stock}"
-                )
-            
-            # Utiliser sale_price_ht au lieu de price_ht
-            unit_price_ht = product.sale_price_ht
-            tva_rate = product.tva
-            line_ht = unit_price_ht * quantity
-            line_tva = line_ht * (tva_rate / 100)
-            
-            total_ht += line_ht
-            total_tva += line_tva
-            total_cost += product.purchase_price * quantity
-            
-            prepared_items.append({
-                'product': product,
-                'quantity': quantity,
-                'unit_price_ht': unit_price_ht,
-                'total_price_ht': line_ht,
-                'tva_rate': tva_rate,
-                'product_name': product.name
-            })
-
-        total_ttc = total_ht + total_tva
-
-        sale = Sale.objects.create(
-            user=user,
-            total_ht=total_ht,
-            total_tva=total_tva,
-            total_ttc=total_ttc,
-            **validated_data
-        )
-
-        for item in prepared_items:
-            SaleItem.objects.create(sale=sale, **item)
-            
-            # Decrement stock
-            product = item['product']
-            product.stock -= item['quantity']
-            product.save()
-            
-            # Send real-time update (avec gestion d'erreur si Redis non dispo)
-            try:
-                from channels.layers import get_channel_layer
-                from asgiref.sync import async_to_sync
-                
-                channel_layer = get_channel_layer()
-                if channel_layer:
-                    async_to_sync(channel_layer.group_send)(
-                        'stock_updates',
-                        {
-                            'type': 'stock_update',
-                            'message': {
-                                'product_id': product.id,
-                                'new_stock': product.stock
-                            }
-                        }
-                    )
-            except Exception:
-                pass  # Ignorer si Redis/Channels non disponible
 
-        return sale
+        try:
+            return create_sale(user, items_data, **validated_data)
+        except CheckoutError as e:
+            raise serializers.ValidationError(str(e))
 
 
 class SaleDetailSerializer(serializers.ModelSerializer):
@@ -244,16 +176,30 @@ class ReturnSerializer(serializers.ModelSerializer):
         validated_data['refund_amount'] = refund_amount
         validated_data['processed_by'] = user
         
-        return_order = Return.objects.create(**validated_data)
-        
-        for item_data in items_data:
-            ReturnItem.objects.create(return_order=return_order, **item_data)
+        with transaction.atomic():
+            return_order = Return.objects.create(**validated_data)
+            
+            ReturnItem.objects.bulk_create([
+                ReturnItem(return_order=return_order, **item_data)
+                for item_data in items_data
+            ])
             
             # Restore stock
-            sale_item = item_data['sale_item']
-            if sale_item.product:
-                sale_item.product.stock += item_data['quantity']
-                sale_item.product.save()
+            record_movements([
+                StockMovement(
+                    product_id=item_data['sale_item'].product_id,
+                    movement_type=StockMovement.MovementType.RETURN,
+                    quantity=item_data['quantity'],
+                    reference=f"Retour #{return_order.id}",
+                    created_by=user
+                )
+                for item_data in items_data
+                if item_data['sale_item'].product_id
+            ])
+            
+            if return_order.status == Return.ReturnStatus.COMPLETED:
+                transaction.on_commit(
+                    lambda: returns_completed.send(sender=Return, return_ids=[return_order.id])
+                )
         
         return return_order
-
@@ -0,0 +1,10 @@
+"""
+Signaux des ventes, émis après le commit de la transaction.
+
+sales_committed(sale_ids)      : nouvelles ventes enregistrées
+returns_completed(return_ids)  : retours passés au statut COMPLETED
+"""
+from django.dispatch import Signal
+
+sales_committed = Signal()
+returns_completed = Signal()
@@ -162,6 +162,57 @@ class SalesAPITest(APITestCase):
         response = self.client.post('/api/sales/sales/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
     
+    def test_sale_with_duplicate_lines(self):
+        """Test lignes en double pour un même produit: stock cumulé"""
+        data = {
+            'items': [
+                {'product_id': self.product.id, 'quantity': 60},
+                {'product_id': self.product.id, 'quantity': 60}
+            ],
+            'payment_method': 'CASH'
+        }
+        response = self.client.post('/api/sales/sales/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 100)
+    
+    def test_unknown_product(self):
+        """Test vente avec produit inexistant"""
+        data = {
+            'items': [{'product_id': 999999, 'quantity': 1}],
+            'payment_method': 'CASH'
+        }
+        response = self.client.post('/api/sales/sales/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Sale.objects.count(), 0)
+    
+    def test_checkout_query_count_is_flat(self):
+        """Test nombre de requêtes indépendant de la taille du panier"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .checkout import create_sale
+        
+        products = [
+            Product.objects.create(
+                name=f'Article {i}',
+                barcode=f'99000000000{i:02d}',
+                sale_price_ht=Decimal('3.00'),
+                stock=50
+            )
+            for i in range(40)
+        ]
+        
+        with CaptureQueriesContext(connection) as small:
+            create_sale(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+        with CaptureQueriesContext(connection) as large:
+            sale = create_sale(self.user, [{'product_id': p.id, 'quantity': 2} for p in products])
+        
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(sale.items.count(), 40)
+        self.assertEqual(sale.total_ttc, Decimal('288.00'))  # 40 * 2 * 3.00 * 1.20
+        products[0].refresh_from_db()
+        self.assertEqual(products[0].stock, 48)
+    
     def test_list_sales(self):
         """Test liste des ventes"""
         response = self.client.get('/api/sales/sales/')
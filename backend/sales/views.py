@@ -2,7 +2,11 @@ from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from inventory.models import StockMovement
+from inventory.stock_ledger import record_movements
 from .models import Sale, Discount, Return
+from .signals import returns_completed
 from .serializers import (
     SaleSerializer, SaleDetailSerializer,
     DiscountSerializer, DiscountApplySerializer,
@@ -108,14 +112,22 @@ class ReturnViewSet(viewsets.ModelViewSet):
                 {'error': 'Only pending returns can be rejected.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        return_order.status = Return.ReturnStatus.REJECTED
-        return_order.save()
-        
-        # Restore stock was already done on create, so we need to reverse it
-        for item in return_order.items.all():
-            if item.sale_item.product:
-                item.sale_item.product.stock -= item.quantity
-                item.sale_item.product.save()
+        with transaction.atomic():
+            return_order.status = Return.ReturnStatus.REJECTED
+            return_order.save()
+            
+            # Restore stock was already done on create, so we need to reverse it
+            record_movements([
+                StockMovement(
+                    product_id=item.sale_item.product_id,
+                    movement_type=StockMovement.MovementType.OUT,
+                    quantity=item.quantity,
+                    reference=f"Retour rejeté #{return_order.id}",
+                    created_by=request.user
+                )
+                for item in return_order.items.select_related('sale_item')
+                if item.sale_item.product_id
+            ])
         
         return Response(ReturnSerializer(return_order).data)
     
@@ -128,7 +140,11 @@ class ReturnViewSet(viewsets.ModelViewSet):
                 {'error': 'Only approved returns can be completed.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        return_order.status = Return.ReturnStatus.COMPLETED
-        return_order.save()
+        with transaction.atomic():
+            return_order.status = Return.ReturnStatus.COMPLETED
+            return_order.save()
+            transaction.on_commit(
+                lambda: returns_completed.send(sender=Return, return_ids=[return_order.id])
+            )
         return Response(ReturnSerializer(return_order).data)
 
@@ -22,16 +22,18 @@ django.setup()
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.utils import timezone
+from core.timeranges import range_filter
 from sales.models import Sale
 from inventory.models import Product
 
 
 def get_daily_stats():
     """Calculate daily statistics."""
-    today = datetime.now().date()
+    today = timezone.localdate()
     
     # Today's sales
-    today_sales = Sale.objects.filter(created_at__date=today)
+    today_sales = Sale.objects.filter(**range_filter('created_at', today, today))
     
     total_sales = today_sales.count()
     total_revenue = sum(s.total_ttc for s in today_sales) or Decimal('0')
@@ -21,7 +21,6 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 from datetime import datetime, timedelta
-from io import BytesIO
 from decimal import Decimal
 
 # Configuration Django
@@ -32,181 +31,29 @@ import django
 django.setup()
 
 from django.utils import timezone
-from django.db.models import Sum, F
 from reporting.models import ReportSettings, ReportLog
-from sales.models import Sale, SaleItem, Return
+from reporting.tasks import get_report_data as shared_report_data
+from reporting import pdf as report_pdf
 from inventory.models import Product
 
-# ReportLab imports for PDF generation
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-
 
 def get_report_data(start_date, end_date):
-    """Récupère les données du rapport pour une période donnée."""
-    sales = Sale.objects.filter(
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date
-    )
-    
-    returns = Return.objects.filter(
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date
-    )
-    
-    total_sales = sales.count()
-    gross_revenue = float(sales.aggregate(total=Sum('total_ttc'))['total'] or 0)
-    returns_amount = float(returns.aggregate(total=Sum('refund_amount'))['total'] or 0)
-    total_revenue = gross_revenue - returns_amount
-    
-    # Calcul du profit
-    total_profit = 0
-    items_sold = []
-    
-    sale_items = SaleItem.objects.filter(sale__in=sales).select_related('product')
-    for item in sale_items:
-        if item.product:
-            cost = float(item.product.purchase_price) * item.quantity
-            revenue = float(item.unit_price) * item.quantity
-            profit = revenue - cost
-            total_profit += profit
-            
-            items_sold.append({
-                'name': item.product.name,
-                'barcode': item.product.barcode,
-                'quantity': item.quantity,
-                'unit_price': float(item.unit_price),
-                'revenue': revenue,
-                'profit': profit
-            })
+    """Récupère les données du rapport pour une période donnée (agrégats de ventes)."""
+    data = shared_report_data(start_date, end_date)
+    gross_revenue = data.get('gross_revenue', data['total_revenue'])
     
     return {
         'period_start': start_date,
         'period_end': end_date,
-        'total_sales': total_sales,
+        'total_sales': data['total_sales'],
         'gross_revenue': gross_revenue,
-        'returns_amount': returns_amount,
-        'total_revenue': total_revenue,
-        'total_profit': total_profit,
-        'items_sold': items_sold
+        'returns_amount': data.get('total_returns', 0.0),
+        'total_revenue': data['total_revenue'],
+        'total_profit': data['total_profit'],
+        'items_sold': data['items_sold']
     }
 
 
-def generate_pdf_report(data, report_type):
-    """Génère un PDF du rapport."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=2*cm, rightMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Titre
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#6366f1'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    type_labels = {
-        'DAILY': 'Journalier',
-        'WEEKLY': 'Hebdomadaire',
-        'MONTHLY': 'Mensuel',
-        'QUARTERLY': 'Trimestriel',
-        'YEARLY': 'Annuel'
-    }
-    
-    title = f"Rapport {type_labels.get(report_type, report_type)}"
-    elements.append(Paragraph(title, title_style))
-    
-    # Période
-    period_style = ParagraphStyle(
-        'Period',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.gray,
-        alignment=TA_CENTER,
-        spaceAfter=20
-    )
-    period_text = f"Du {data['period_start'].strftime('%d/%m/%Y')} au {data['period_end'].strftime('%d/%m/%Y')}"
-    elements.append(Paragraph(period_text, period_style))
-    elements.append(Spacer(1, 20))
-    
-    # Résumé
-    summary_data = [
-        ['Indicateur', 'Valeur'],
-        ['Nombre de ventes', str(data['total_sales'])],
-        ['Chiffre d\'affaires brut', f"{data['gross_revenue']:.2f} MAD"],
-        ['Retours', f"-{data['returns_amount']:.2f} MAD"],
-        ['Chiffre d\'affaires net', f"{data['total_revenue']:.2f} MAD"],
-        ['Bénéfice total', f"{data['total_profit']:.2f} MAD"],
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[10*cm, 6*cm])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 30))
-    
-    # Top 10 produits vendus
-    if data['items_sold']:
-        elements.append(Paragraph("Top 10 Produits Vendus", styles['Heading2']))
-        elements.append(Spacer(1, 10))
-        
-        # Agréger par produit
-        product_summary = {}
-        for item in data['items_sold']:
-            name = item['name']
-            if name not in product_summary:
-                product_summary[name] = {'quantity': 0, 'revenue': 0, 'profit': 0}
-            product_summary[name]['quantity'] += item['quantity']
-            product_summary[name]['revenue'] += item['revenue']
-            product_summary[name]['profit'] += item['profit']
-        
-        # Trier par quantité et prendre top 10
-        sorted_products = sorted(product_summary.items(), key=lambda x: x[1]['quantity'], reverse=True)[:10]
-        
-        product_data = [['Produit', 'Quantité', 'CA', 'Bénéfice']]
-        for name, stats in sorted_products:
-            product_data.append([
-                name[:30],  # Tronquer les noms longs
-                str(stats['quantity']),
-                f"{stats['revenue']:.2f} MAD",
-                f"{stats['profit']:.2f} MAD"
-            ])
-        
-        product_table = Table(product_data, colWidths=[8*cm, 2.5*cm, 3*cm, 3*cm])
-        product_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8b5cf6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-        ]))
-        elements.append(product_table)
-    
-    # Générer le PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
-
-
 def send_email(settings, subject, body, attachments=None):
     """Envoie un email avec les pièces jointes."""
     if not settings.sender_email or not settings.sender_password:
@@ -370,7 +217,8 @@ def main():
         data = get_report_data(start_date, end_date)
         
         print(f"📈 Génération du rapport {report_type}...")
-        pdf_buffer = generate_pdf_report(data, report_type)
+        # PDF partagé avec le téléchargement (conservé tant que la période ne change pas)
+        pdf_content = report_pdf.get_pdf(report_type, start_date, end_date)
         
         type_labels = {
             'DAILY': 'Journalier',
@@ -380,7 +228,7 @@ def main():
             'YEARLY': 'Annuel'
         }
         filename = f"Rapport_{type_labels[report_type]}_{today.strftime('%Y%m%d')}.pdf"
-        attachments.append((filename, pdf_buffer))
+        attachments.append((filename, pdf_content))
         
         # Log dans la base de données
         ReportLog.objects.create(
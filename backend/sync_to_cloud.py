@@ -9,9 +9,7 @@ Usage: python sync_to_cloud.py
 
 import os
 import sys
-import json
-import requests
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Configuration Django
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,227 +19,65 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 import django
 django.setup()
 
-from django.utils import timezone
-from django.conf import settings
-from sales.models import Sale, SaleItem, Return, ReturnItem
-from inventory.models import Product
-from core.models import SyncLog
+from core.models import SyncOutbox
+from core.sync_service import SyncService
 
 # Configuration
 CLOUD_URL = "https://dido22.pythonanywhere.com/api"
 SYNC_TOKEN = os.environ.get('SYNC_TOKEN', 'libtak-sync-token-2025')
 
 
-def get_unsynced_sales():
-    """Récupère les ventes non synchronisées."""
-    return Sale.objects.filter(synced=False).select_related('user').prefetch_related('items__product')
-
-
-def get_unsynced_returns():
-    """Récupère les retours non synchronisés."""
-    return Return.objects.filter(synced=False).select_related('sale', 'processed_by').prefetch_related('items__product')
-
-
-def serialize_sale(sale):
-    """Sérialise une vente pour l'envoi."""
-    items = []
-    for item in sale.items.all():
-        items.append({
-            'product_barcode': item.product.barcode if item.product else None,
-            'product_name': item.product.name if item.product else item.product_name,
-            'quantity': item.quantity,
-            'unit_price': str(item.unit_price),
-        })
-    
-    return {
-        'id': sale.id,
-        'created_at': sale.created_at.isoformat(),
-        'user_username': sale.user.username if sale.user else None,
-        'payment_method': sale.payment_method,
-        'total_ht': str(sale.total_ht),
-        'total_tva': str(sale.total_tva),
-        'total_ttc': str(sale.total_ttc),
-        'items': items,
-    }
-
-
-def serialize_return(return_obj):
-    """Sérialise un retour pour l'envoi."""
-    items = []
-    for item in return_obj.items.all():
-        items.append({
-            'product_barcode': item.product.barcode if item.product else None,
-            'quantity': item.quantity,
-            'refund_amount': str(item.refund_amount),
-        })
-    
-    return {
-        'id': return_obj.id,
-        'sale_id': return_obj.sale_id,
-        'created_at': return_obj.created_at.isoformat(),
-        'reason': return_obj.reason,
-        'refund_amount': str(return_obj.refund_amount),
-        'status': return_obj.status,
-        'processed_by_username': return_obj.processed_by.username if return_obj.processed_by else None,
-        'items': items,
-    }
-
-
-def get_stock_data():
-    """Récupère les données de stock actuelles."""
-    products = Product.objects.all()
-    return [
-        {
-            'barcode': p.barcode,
-            'stock': p.stock,
-        }
-        for p in products
-    ]
+def get_sync_service():
+    """Service de synchronisation, avec la configuration de ce script par défaut."""
+    service = SyncService()
+    service.cloud_url = service.cloud_url or CLOUD_URL
+    service.sync_token = service.sync_token or SYNC_TOKEN
+    return service
 
 
 def sync_to_cloud():
-    """Effectue la synchronisation vers le cloud."""
+    """Envoie au cloud les changements en attente dans l'outbox."""
     print(f"\n{'='*60}")
     print(f"🔄 SYNCHRONISATION LOCAL → CLOUD")
     print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*60}\n")
     
-    # Récupérer les données non synchronisées
-    sales = get_unsynced_sales()
-    returns = get_unsynced_returns()
-    
-    print(f"📊 Ventes à synchroniser: {sales.count()}")
-    print(f"📊 Retours à synchroniser: {returns.count()}")
+    pending = SyncOutbox.objects.count()
+    print(f"📊 Changements à synchroniser: {pending}")
     
-    if sales.count() == 0 and returns.count() == 0:
+    if pending == 0:
         print("\n✅ Rien à synchroniser, tout est à jour!")
         return True
     
-    # Préparer les données
-    payload = {
-        'sales': [serialize_sale(s) for s in sales],
-        'returns': [serialize_return(r) for r in returns],
-        'stock_data': get_stock_data(),
-        'sync_timestamp': timezone.now().isoformat(),
-    }
+    service = get_sync_service()
+    print(f"\n📤 Envoi vers {service.cloud_url}/sync/receive/...")
+    # Envoi par lots acquittés ; le résultat est journalisé dans SyncLog
+    result = service.push_to_cloud()
     
-    # Envoyer au cloud
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Sync-Token': SYNC_TOKEN,
-    }
+    if result['status'] == 'success':
+        print(f"\n✅ Synchronisation réussie!")
+        print(f"   - Ventes synchronisées: {result['synced_sales']}")
+        print(f"   - Retours synchronisés: {result['synced_returns']}")
+        print(f"   - Stocks synchronisés: {result['synced_stock_updates']}")
+        return True
     
-    try:
-        print(f"\n📤 Envoi vers {CLOUD_URL}/sync/receive/...")
-        response = requests.post(
-            f"{CLOUD_URL}/sync/receive/",
-            json=payload,
-            headers=headers,
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Marquer comme synchronisé
-            sales_synced = sales.update(synced=True)
-            returns_synced = returns.update(synced=True)
-            
-            # Log de synchronisation
-            SyncLog.objects.create(
-                sync_type='PUSH',
-                records_synced=sales_synced + returns_synced,
-                success=True,
-                details=json.dumps({
-                    'sales_synced': sales_synced,
-                    'returns_synced': returns_synced,
-                })
-            )
-            
-            print(f"\n✅ Synchronisation réussie!")
-            print(f"   - Ventes synchronisées: {sales_synced}")
-            print(f"   - Retours synchronisés: {returns_synced}")
-            return True
-            
-        else:
-            error_msg = f"Erreur HTTP {response.status_code}: {response.text}"
-            print(f"\n❌ {error_msg}")
-            
-            SyncLog.objects.create(
-                sync_type='PUSH',
-                records_synced=0,
-                success=False,
-                error_message=error_msg
-            )
-            return False
-            
-    except requests.exceptions.ConnectionError:
-        error_msg = "Impossible de se connecter au serveur cloud. Vérifiez votre connexion internet."
-        print(f"\n❌ {error_msg}")
-        
-        SyncLog.objects.create(
-            sync_type='PUSH',
-            records_synced=0,
-            success=False,
-            error_message=error_msg
-        )
-        return False
-        
-    except Exception as e:
-        error_msg = f"Erreur: {str(e)}"
-        print(f"\n❌ {error_msg}")
-        
-        SyncLog.objects.create(
-            sync_type='PUSH',
-            records_synced=0,
-            success=False,
-            error_message=error_msg
-        )
-        return False
+    print(f"\n❌ {result['message']}")
+    return False
 
 
 def pull_master_data():
-    """Récupère les données maîtres depuis le cloud (produits, catégories, etc.)."""
+    """Récupère les données maîtres modifiées depuis le dernier passage (produits, catégories, etc.)."""
     print(f"\n📥 Récupération des données maîtres depuis le cloud...")
     
-    headers = {
-        'X-Sync-Token': SYNC_TOKEN,
-    }
+    result = get_sync_service().pull_from_cloud()
+    
+    if result['status'] == 'success':
+        print(f"✅ {result['imported_categories']} catégories, {result['imported_suppliers']} fournisseurs "
+              f"et {result['imported_products']} produits mis à jour depuis le cloud")
+        return True
     
-    try:
-        response = requests.get(
-            f"{CLOUD_URL}/sync/master-data/",
-            headers=headers,
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Mettre à jour les produits locaux
-            products_updated = 0
-            for prod_data in data.get('products', []):
-                Product.objects.update_or_create(
-                    barcode=prod_data['barcode'],
-                    defaults={
-                        'name': prod_data['name'],
-                        'purchase_price': prod_data['purchase_price'],
-                        'selling_price': prod_data['selling_price'],
-                        'stock': prod_data.get('stock', 0),
-                        'min_stock': prod_data.get('min_stock', 5),
-                    }
-                )
-                products_updated += 1
-            
-            print(f"✅ {products_updated} produits mis à jour depuis le cloud")
-            return True
-        else:
-            print(f"❌ Erreur lors de la récupération: {response.status_code}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Erreur: {str(e)}")
-        return False
+    print(f"❌ Erreur lors de la récupération: {result['message']}")
+    return False
 
 
 if __name__ == '__main__':
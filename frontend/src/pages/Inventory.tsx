@@ -159,16 +159,26 @@ export default function Inventory() {
     const importExcelFileRef = useRef<HTMLInputElement | null>(null);
 
     const importMutation = useMutation({
-        mutationFn: (file: File) => {
+        mutationFn: async (file: File) => {
             const formData = new FormData();
             formData.append('file', file);
-            return client.post('/inventory/products/import_excel/', formData, {
+            const { data: job } = await client.post('/inventory/products/import_excel/', formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
+            // L'import est traité en arrière-plan : suivre l'avancement du job
+            let current = job;
+            while (current.status === 'PENDING' || current.status === 'RUNNING') {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                current = (await client.get(`/inventory/import-jobs/${job.id}/`)).data;
+            }
+            if (current.status === 'FAILED') {
+                throw new Error(current.message || 'Import échoué');
+            }
+            return current;
         },
-        onSuccess: (data: any) => {
+        onSuccess: (job: any) => {
             queryClient.invalidateQueries({ queryKey: ['products'] });
-            toast.success(`Import terminé ! ${data.data.created} produits créés. ${data.data.errors.length} erreurs.`);
+            toast.success(`Import terminé ! ${job.created_count} produits créés. ${job.error_count} erreurs.`);
         },
         onError: (error: any) => {
             console.error("Import Error Details:", error);
@@ -22,7 +22,7 @@ interface Product {
     id: number;
     name: string;
     barcode: string;
-    sale_price_ht: number;
+    sale_price_ht?: number;
     price_ttc: number;
     stock: number;
     image_url?: string;
@@ -66,7 +66,10 @@ export default function POS() {
     // Fetch products
     const { data: products = [] } = useQuery<Product[]>({
         queryKey: ['products', searchTerm],
-        queryFn: () => client.get(`/inventory/products/?search=${searchTerm}`).then(res => res.data.results || res.data)
+        // Saisie : suggestions servies par l'index en mémoire (sans pagination)
+        queryFn: () => searchTerm
+            ? client.get('/inventory/products/autocomplete/', { params: { q: searchTerm, limit: 24 } }).then(res => res.data)
+            : client.get('/inventory/products/').then(res => res.data.results || res.data)
     });
 
     const handleProductAction = (product: Product) => {
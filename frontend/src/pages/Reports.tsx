@@ -77,13 +77,17 @@ export default function Reports() {
 
     const handleDownloadPDF = async () => {
         try {
-            const response = await client.get(`/reporting/export_pdf/${getQueryParams()}&type=${reportType}`, {
-                responseType: 'blob'
-            });
+            const url = `/reporting/export_pdf/${getQueryParams()}&type=${reportType}`;
+            let response = await client.get(url, { responseType: 'blob' });
+            // 202 : gros rapport rendu en arrière-plan, on rappelle la même URL
+            while (response.status === 202) {
+                await new Promise(resolve => setTimeout(resolve, 2000));
+                response = await client.get(url, { responseType: 'blob' });
+            }
 
-            const url = window.URL.createObjectURL(new Blob([response.data]));
+            const blobUrl = window.URL.createObjectURL(new Blob([response.data]));
             const link = document.createElement('a');
-            link.href = url;
+            link.href = blobUrl;
             link.setAttribute('download', `Rapport_${reportType}_${new Date().toISOString().split('T')[0]}.pdf`);
             document.body.appendChild(link);
             link.click();